@@ -0,0 +1,160 @@
+"""Helpers shared by the benchmark scripts: a throwaway database, gunicorn
+lifecycle, HTTP login and a threaded load generator with latency and
+query-count stats."""
+import os
+import re
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from pathlib import Path
+
+import requests
+
+BASE_DIR = Path(__file__).resolve().parent.parent
+SERVER_TIMING_QUERIES = re.compile(r'\bdb;[^,]*desc="(\d+) queries"')
+USERNAME = 'bench'
+PASSWORD = 'bench-pass'
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+def manage(env, *args):
+    subprocess.run([sys.executable, 'manage.py', *args], cwd=BASE_DIR, env=env, check=True,
+                   stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+
+
+@contextmanager
+def bench_environment(seed_script='', seed_command=(), database=None):
+    """Yield an environment pointing at a migrated database with a superuser
+    ``bench`` and whatever ``seed_script`` (Python run in ``manage.py
+    shell``) and ``seed_command`` (``manage.py`` arguments) create.
+
+    The database is temporary unless ``database`` names a SQLite file; an
+    existing file is reused without seeding, so a large dataset only has to
+    be built once."""
+    with tempfile.TemporaryDirectory() as tmp:
+        path = Path(database) if database else Path(tmp) / 'bench.sqlite3'
+        env = dict(os.environ, DEBUG='False', SESSION_COOKIE_SECURE='False',
+                   SQLITE_PATH=str(path), LOG_FILE=str(Path(tmp) / 'bench.log'))
+        seeded = path.exists()
+        manage(env, 'migrate')
+        if not seeded:
+            try:
+                manage(env, 'shell', '-c',
+                       "from django.contrib.auth.models import User; "
+                       f"User.objects.create_superuser('{USERNAME}', '{USERNAME}@example.com', '{PASSWORD}')\n" + seed_script)
+                if seed_command:
+                    manage(env, *seed_command)
+            except BaseException:
+                # A half-seeded file must not be mistaken for a reusable one.
+                path.unlink(missing_ok=True)
+                raise
+        yield env
+
+
+@contextmanager
+def gunicorn(env, workers, app='customer_order_api.wsgi', extra_args=()):
+    """Run gunicorn on a free port and yield its base URL."""
+    port = free_port()
+    base_url = f"http://127.0.0.1:{port}"
+    server = subprocess.Popen(
+        [sys.executable, '-m', 'gunicorn', app, '-b', f"127.0.0.1:{port}",
+         '-w', str(workers), '--log-level', 'warning', *extra_args],
+        cwd=BASE_DIR, env=env,
+    )
+    try:
+        deadline = time.monotonic() + 30
+        while True:
+            try:
+                requests.get(base_url, timeout=5, allow_redirects=False)
+                break
+            except requests.RequestException:
+                if time.monotonic() > deadline:
+                    raise RuntimeError(f"gunicorn did not start at {base_url}")
+                time.sleep(0.2)
+        yield base_url
+    finally:
+        server.terminate()
+        server.wait()
+
+
+def login(base_url, username=USERNAME, password=PASSWORD):
+    """Log in through the admin form and return the resulting cookies."""
+    session = requests.Session()
+    page = session.get(f"{base_url}/admin/login/")
+    token = re.search(r'name="csrfmiddlewaretoken" value="([^"]+)"', page.text).group(1)
+    response = session.post(
+        f"{base_url}/admin/login/",
+        data={'username': username, 'password': password, 'csrfmiddlewaretoken': token, 'next': '/admin/'},
+        allow_redirects=False,
+    )
+    if response.status_code != 302:
+        raise RuntimeError("login failed")
+    return session.cookies.get_dict()
+
+
+def query_count(response):
+    """Database queries the server reported in its ``Server-Timing`` header."""
+    match = SERVER_TIMING_QUERIES.search(response.headers.get('Server-Timing', ''))
+    return int(match.group(1)) if match else None
+
+
+def summarize(samples, elapsed, queries=()):
+    samples = sorted(samples)
+    if len(samples) < 2:
+        samples = samples * 2
+    quantiles = statistics.quantiles(samples, n=100)
+    summary = {
+        'requests': len(samples),
+        'requests_per_sec': round(len(samples) / elapsed, 1),
+        'p50_ms': round(quantiles[49] * 1000, 2),
+        'p95_ms': round(quantiles[94] * 1000, 2),
+        'p99_ms': round(quantiles[98] * 1000, 2),
+    }
+    queries = [count for count in queries if count is not None]
+    if queries:
+        summary['queries_per_request'] = round(statistics.fmean(queries), 2)
+        summary['max_queries'] = max(queries)
+    return summary
+
+
+def run_load(request_fn, total, concurrency, cookies=None):
+    """Call ``request_fn(session, i)`` ``total`` times from ``concurrency``
+    threads. It returns ``(label, response)``; a 4xx/5xx response aborts the
+    run. Returns latency (and, with ``SERVER_TIMING``, query-count) stats
+    overall and per label, and the responses."""
+    def worker(indices):
+        session = requests.Session()
+        session.cookies.update(cookies or {})
+        samples = []
+        for i in indices:
+            started = time.perf_counter()
+            label, response = request_fn(session, i)
+            elapsed = time.perf_counter() - started
+            if response.status_code >= 400:
+                raise RuntimeError(f"{response.request.method} {response.url} returned {response.status_code}")
+            samples.append((label, elapsed, response))
+        return samples
+
+    chunks = [range(start, total, concurrency) for start in range(concurrency)]
+    started = time.perf_counter()
+    with ThreadPoolExecutor(concurrency) as pool:
+        results = [sample for chunk in pool.map(worker, chunks) for sample in chunk]
+    elapsed = time.perf_counter() - started
+
+    def stats(samples):
+        return summarize([s[1] for s in samples], elapsed, [query_count(s[2]) for s in samples])
+
+    report = {'all': stats(results)}
+    for label in sorted({s[0] for s in results}):
+        report[label] = stats([s for s in results if s[0] == label])
+    return report, [s[2] for s in results]
@@ -0,0 +1,198 @@
+"""Order API latency and throughput against a large synthetic dataset.
+
+Seeds a database with ``manage.py seed_benchmark`` (customers, a deep
+category tree, products and orders), then starts gunicorn with SMS, email
+and OIDC pointed at local stubs (FakeSMSServer, FakeSMTPServer,
+FakeOIDCProvider) and drives a weighted mix of reads and order creation
+from concurrent clients. API requests authenticate with OIDC bearer tokens,
+HTML pages with a session. Prints JSON with p50/p95/p99 latency,
+requests/sec and queries per request (from the Server-Timing header) for
+each scenario, meant to be kept and diffed between releases.
+
+    python benchmarks/order_api.py --orders 100000 --requests 3000 --output before.json
+    python benchmarks/order_api.py --orders 2000000 --database /tmp/orders-2m.sqlite3 --worker
+    python benchmarks/order_api.py --asgi   # needs uvicorn installed
+
+With ``--database`` the seeded file is kept and reused by later runs, which
+then skip seeding (the dataset options are ignored). The stubs and the
+client threads share this process, so give the machine spare cores.
+"""
+import argparse
+import json
+import random
+import sqlite3
+import subprocess
+import sys
+import time
+
+from harness import BASE_DIR, USERNAME, bench_environment, gunicorn, login, run_load
+
+sys.path.insert(0, str(BASE_DIR))
+from core.utils.fake_oidc import FakeOIDCProvider  # noqa: E402
+from core.utils.fake_sms import FakeSMSServer  # noqa: E402
+from core.utils.fake_smtp import FakeSMTPServer  # noqa: E402
+
+DEFAULT_MIX = {
+    'api-orders': 30, 'html-orders': 15, 'category-average-price': 25,
+    'api-create': 15, 'form-create': 10, 'async-create': 5,
+}
+SCENARIOS = tuple(DEFAULT_MIX)
+
+
+def mix_entry(value):
+    name, _, weight = value.partition('=')
+    if name not in SCENARIOS or not weight.isdigit():
+        raise argparse.ArgumentTypeError(f"expected name=weight with a name from {', '.join(SCENARIOS)}")
+    return name, int(weight)
+
+
+def load_dataset(path):
+    """Row counts and the ids the scenarios pick from."""
+    with sqlite3.connect(path) as db:
+        def count(table):
+            return db.execute(f'SELECT COUNT(*) FROM {table}').fetchone()[0]
+
+        dataset = {
+            'customers': count('core_customer'),
+            'categories': count('core_category'),
+            'products': count('core_product'),
+            'orders': count('core_order'),
+            'order_items': count('core_orderitem'),
+        }
+        ids = {
+            'customers': [row[0] for row in db.execute('SELECT id FROM core_customer')],
+            'categories': [row[0] for row in db.execute('SELECT id FROM core_category')],
+            'products': [(row[0], str(row[1])) for row in db.execute('SELECT id, price FROM core_product')],
+        }
+    return dataset, ids
+
+
+def make_request(base_url, schedule, ids, token, csrf_token):
+    bearer = {'Authorization': f'Bearer {token}'}
+
+    def order_items(rng):
+        return rng.sample(ids['products'], rng.randint(1, min(3, len(ids['products']))))
+
+    def request(session, i):
+        label = schedule[i % len(schedule)]
+        rng = random.Random(i)
+        if label == 'api-orders':
+            return label, session.get(f"{base_url}/api/orders/", headers=bearer)
+        if label == 'html-orders':
+            return label, session.get(f"{base_url}/orders/", params={'page': rng.randint(1, 20)})
+        if label == 'category-average-price':
+            category_id = rng.choice(ids['categories'])
+            return label, session.get(f"{base_url}/api/orders/category-average-price/{category_id}/", headers=bearer)
+        if label == 'form-create':
+            items = order_items(rng)
+            data = {'customer': rng.choice(ids['customers']), 'products': [product_id for product_id, _ in items]}
+            data.update({f'quantity_{product_id}': rng.randint(1, 5) for product_id, _ in items})
+            return label, session.post(f"{base_url}/orders/add/", data=data, headers={'X-CSRFToken': csrf_token},
+                                       allow_redirects=False)
+        order = {
+            'customer': rng.choice(ids['customers']),
+            'order_items': [{'product': product_id, 'quantity': rng.randint(1, 5), 'price': price}
+                            for product_id, price in order_items(rng)],
+        }
+        path = '/api/orders/' if label == 'api-create' else '/api/orders/async/'
+        return label, session.post(f"{base_url}{path}", json=order, headers=bearer)
+
+    return request
+
+
+def git_revision():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=BASE_DIR, capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    dataset_group = parser.add_argument_group('dataset (passed to manage.py seed_benchmark)')
+    dataset_group.add_argument('--customers', type=int, default=1000)
+    dataset_group.add_argument('--category-depth', type=int, default=6)
+    dataset_group.add_argument('--category-branching', type=int, default=3)
+    dataset_group.add_argument('--products', type=int, default=5000)
+    dataset_group.add_argument('--orders', type=int, default=100000)
+    dataset_group.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--database', help="SQLite file to seed once and reuse; default: a temporary one.")
+    parser.add_argument('--workers', type=int, default=4)
+    parser.add_argument('--concurrency', type=int, default=16)
+    parser.add_argument('--requests', type=int, default=3000)
+    parser.add_argument('--warmup', type=int, default=200, help="Unreported requests sent first.")
+    parser.add_argument('--mix', nargs='+', type=mix_entry, metavar='NAME=WEIGHT',
+                        help=f"Scenario weights; default: {' '.join(f'{k}={v}' for k, v in DEFAULT_MIX.items())}")
+    parser.add_argument('--asgi', action='store_true', help="Serve the ASGI app with uvicorn workers.")
+    parser.add_argument('--worker', action='store_true',
+                        help="Run process_notifications alongside, delivering the outbox to the stubs.")
+    parser.add_argument('--output', help="Write the JSON report here instead of stdout.")
+    args = parser.parse_args()
+    mix = dict(args.mix) if args.mix else DEFAULT_MIX
+    schedule = [name for name, weight in mix.items() for _ in range(weight)]
+    random.Random(args.seed).shuffle(schedule)
+
+    seed_command = (
+        'seed_benchmark', '--customers', str(args.customers), '--category-depth', str(args.category_depth),
+        '--category-branching', str(args.category_branching), '--products', str(args.products),
+        '--orders', str(args.orders), '--seed', str(args.seed),
+    )
+    with bench_environment(seed_command=seed_command, database=args.database) as env, \
+            FakeSMSServer() as sms, FakeSMTPServer() as smtp, FakeOIDCProvider() as idp:
+        dataset, ids = load_dataset(env['SQLITE_PATH'])
+        server_env = dict(
+            env, SERVER_TIMING='True', AFRICASTALKING_API_URL=sms.url, ADMIN_EMAIL='admin@example.com',
+            **{name: str(value) for name, value in dict(smtp.settings(), **idp.settings()).items()},
+        )
+        app, server_args = 'customer_order_api.wsgi', ()
+        if args.asgi:
+            app, server_args = 'customer_order_api.asgi', ('-k', 'uvicorn.workers.UvicornWorker')
+        token = idp.issue_token({'email': f'{USERNAME}@example.com'})
+
+        notifier = None
+        if args.worker:
+            notifier = subprocess.Popen(
+                [sys.executable, 'manage.py', 'process_notifications', '--poll-interval', '0.5'],
+                cwd=BASE_DIR, env=server_env, stdout=subprocess.DEVNULL,
+            )
+        try:
+            with gunicorn(server_env, args.workers, app=app, extra_args=server_args) as base_url:
+                cookies = login(base_url)
+                request = make_request(base_url, schedule, ids, token, cookies['csrftoken'])
+                if args.warmup:
+                    run_load(request, args.warmup, args.concurrency, cookies)
+                started = time.time()
+                results, _ = run_load(request, args.requests, args.concurrency, cookies)
+        finally:
+            if notifier is not None:
+                notifier.terminate()
+                notifier.wait()
+
+        report = {
+            'revision': git_revision(),
+            'started_at': int(started),
+            'server': 'gunicorn+uvicorn (asgi)' if args.asgi else 'gunicorn (wsgi)',
+            'workers': args.workers,
+            'concurrency': args.concurrency,
+            'notification_worker': args.worker,
+            'mix': mix,
+            'dataset': dataset,
+            'results': results,
+            'stubs': {
+                'sms_requests': len(sms.requests),
+                'emails': len(smtp.messages),
+                'oidc_requests': sum(idp.hits.values()),
+            },
+        }
+
+    output = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, 'w') as f:
+            f.write(output + '\n')
+    else:
+        print(output)
+
+
+if __name__ == '__main__':
+    main()
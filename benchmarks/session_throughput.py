@@ -0,0 +1,56 @@
+"""Session engine throughput under concurrent gunicorn workers.
+
+Starts gunicorn once per session configuration against a throwaway SQLite
+database, logs in over HTTP and hammers an authenticated page from a pool of
+client threads. Prints requests/sec, latency percentiles and how many
+responses re-sent the session cookie, as JSON.
+
+    python benchmarks/session_throughput.py --workers 4 --concurrency 16 --requests 2000
+"""
+import argparse
+import json
+
+from harness import bench_environment, gunicorn, login, run_load
+
+CONFIGURATIONS = {
+    'db-save-every-request': {
+        'SESSION_ENGINE': 'django.contrib.sessions.backends.db',
+        'SESSION_SAVE_EVERY_REQUEST': 'True',
+    },
+    'coalescing-db': {
+        'SESSION_ENGINE': 'core.session_backends.db',
+        'SESSION_SAVE_EVERY_REQUEST': 'False',
+    },
+    'coalescing-signed-cookies': {
+        'SESSION_ENGINE': 'core.session_backends.signed_cookies',
+        'SESSION_SAVE_EVERY_REQUEST': 'False',
+    },
+}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--workers', type=int, default=4)
+    parser.add_argument('--concurrency', type=int, default=16)
+    parser.add_argument('--requests', type=int, default=2000)
+    parser.add_argument('--path', default='/customers/')
+    parser.add_argument('--configs', nargs='+', default=list(CONFIGURATIONS), choices=list(CONFIGURATIONS))
+    args = parser.parse_args()
+
+    report = {'workers': args.workers, 'concurrency': args.concurrency, 'path': args.path, 'results': {}}
+    with bench_environment() as env:
+        for name in args.configs:
+            with gunicorn(dict(env, **CONFIGURATIONS[name]), args.workers) as base_url:
+                url = base_url + args.path
+                stats, responses = run_load(
+                    lambda session, i: ('all', session.get(url, allow_redirects=False)),
+                    args.requests, args.concurrency, login(base_url),
+                )
+                stats['all']['session_cookie_writes'] = sum('sessionid' in r.cookies for r in responses)
+                report['results'][name] = stats['all']
+
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,60 @@
+"""Mixed read/write API throughput with and without the SQLite tuning layer.
+
+Runs gunicorn against a seeded throwaway database twice: once with a bare
+SQLite connection per request (``SQLITE_TUNING=False``) and once with WAL,
+the tuned pragmas, persistent connections and the read-only alias. Client
+threads interleave order creation with order list reads. Prints JSON.
+
+    python benchmarks/sqlite_throughput.py --workers 4 --concurrency 16 --requests 2000 --write-ratio 0.2
+"""
+import argparse
+import json
+
+from harness import bench_environment, gunicorn, login, run_load
+
+SEED = """
+from core.models import Category, Customer, Product, Order, OrderItem
+category = Category.objects.create(name='Bench')
+customers = Customer.objects.bulk_create([Customer(name=f'Customer {i}', code=f'B{i:05d}') for i in range(200)])
+products = [Product.objects.create(name=f'Product {i}', category=category, price=i % 50 + 1) for i in range(200)]
+for i in range(2000):
+    order = Order.objects.create(customer=customers[i % 200], total_amount=10)
+    OrderItem.objects.create(order=order, product=products[i % 200], quantity=1, price=10)
+"""
+
+CONFIGURATIONS = {
+    'untuned': {'SQLITE_TUNING': 'False'},
+    'tuned': {'SQLITE_TUNING': 'True'},
+}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--workers', type=int, default=4)
+    parser.add_argument('--concurrency', type=int, default=16)
+    parser.add_argument('--requests', type=int, default=2000)
+    parser.add_argument('--write-ratio', type=float, default=0.2)
+    args = parser.parse_args()
+    write_every = max(int(round(1 / args.write_ratio)), 1) if args.write_ratio else 0
+
+    report = {'workers': args.workers, 'concurrency': args.concurrency,
+              'write_ratio': args.write_ratio, 'results': {}}
+    with bench_environment(SEED) as env:
+        for name, overrides in CONFIGURATIONS.items():
+            with gunicorn(dict(env, **overrides), args.workers) as base_url:
+                cookies = login(base_url)
+                headers = {'X-CSRFToken': cookies['csrftoken']}
+                order = {'customer': 1, 'order_items': [{'product': 1, 'quantity': 2, 'price': '1.00'}]}
+
+                def request(session, i):
+                    if write_every and i % write_every == 0:
+                        return 'create', session.post(f"{base_url}/api/orders/", json=order, headers=headers)
+                    return 'list', session.get(f"{base_url}/api/orders/")
+
+                report['results'][name], _ = run_load(request, args.requests, args.concurrency, cookies)
+
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,123 @@
+from base64 import urlsafe_b64decode
+from django.conf import settings
+from django.core.cache import caches
+from django.core.exceptions import SuspiciousOperation
+from django.utils.encoding import force_bytes, smart_str
+from josepy.jws import JWS, Header
+from mozilla_django_oidc.auth import OIDCAuthenticationBackend
+from .instrumentation import track_external
+import hashlib
+import json
+import logging
+import requests
+import time
+
+logger = logging.getLogger(__name__)
+
+def _token_cache_key(access_token):
+    return 'oidc:claims:' + hashlib.sha256(force_bytes(access_token)).hexdigest()
+
+def _unverified_payload(access_token):
+    """Decode a JWT payload without checking it; None for opaque tokens."""
+    try:
+        payload = access_token.split('.')[1]
+        return json.loads(urlsafe_b64decode(payload + '=' * (-len(payload) % 4)))
+    except (IndexError, ValueError, TypeError):
+        return None
+
+class CachedOIDCBackend(OIDCAuthenticationBackend):
+    """OIDC backend for DRF that avoids calling the provider on every request.
+
+    Claims for a bearer token are cached (``OIDC_CACHE_ALIAS``) for at most
+    ``OIDC_TOKEN_CACHE_TTL`` seconds and never beyond the token's ``exp``.
+    With ``OIDC_LOCAL_JWT_VALIDATION`` the token is verified against the
+    cached JWKS instead, and the userinfo endpoint is only consulted when the
+    token lacks the claims ``verify_claims`` needs.
+    """
+
+    @property
+    def cache(self):
+        return caches[settings.OIDC_CACHE_ALIAS]
+
+    def get_userinfo(self, access_token, id_token, payload):
+        cache_key = _token_cache_key(access_token)
+        claims = self.cache.get(cache_key)
+        if claims is not None:
+            return claims
+
+        token_payload = None
+        if settings.OIDC_LOCAL_JWT_VALIDATION:
+            token_payload = self.verify_access_token(access_token)
+            claims = token_payload if self.verify_claims(token_payload) else None
+        if claims is None:
+            with track_external('oidc'):
+                claims = super().get_userinfo(access_token, id_token, payload)
+
+        ttl = settings.OIDC_TOKEN_CACHE_TTL
+        expires_at = (token_payload or _unverified_payload(access_token) or {}).get('exp')
+        if isinstance(expires_at, (int, float)):
+            ttl = min(ttl, int(expires_at - time.time()))
+        if ttl > 0:
+            self.cache.set(cache_key, claims, ttl)
+        return claims
+
+    def verify_access_token(self, access_token):
+        """Check a JWT access token's signature, expiry, issuer and audience.
+
+        Without a configured issuer and audience every token is rejected: any
+        token the tenant signed would pass, including ID tokens issued to
+        other clients (see also ``core.checks``).
+        """
+        issuer, audience = settings.OIDC_OP_ISSUER, settings.OIDC_API_AUDIENCE
+        if not issuer or not audience:
+            logger.error("Local JWT validation needs OIDC_OP_ISSUER and OIDC_API_AUDIENCE; rejecting token")
+            raise SuspiciousOperation('Access token issuer or audience is not configured.')
+        token = force_bytes(access_token)
+        try:
+            payload = json.loads(self._verify_jws(token, self.retrieve_matching_jwk(token)))
+        except (ValueError, TypeError) as e:
+            raise SuspiciousOperation(f"Malformed access token: {e}")
+
+        if not isinstance(payload.get('exp'), (int, float)) or payload['exp'] <= time.time():
+            raise SuspiciousOperation('Access token has expired.')
+        if payload.get('iss') != issuer:
+            raise SuspiciousOperation('Access token issuer mismatch.')
+        token_audience = payload.get('aud')
+        if isinstance(token_audience, str):
+            token_audience = [token_audience]
+        if audience not in (token_audience or []):
+            raise SuspiciousOperation('Access token audience mismatch.')
+        return payload
+
+    def get_jwks(self, refresh=False):
+        """Return the provider's JWKS, cached for ``OIDC_JWKS_CACHE_TTL``."""
+        cache_key = 'oidc:jwks:' + self.OIDC_OP_JWKS_ENDPOINT
+        jwks = None if refresh else self.cache.get(cache_key)
+        if jwks is None:
+            with track_external('oidc'):
+                response = requests.get(
+                    self.OIDC_OP_JWKS_ENDPOINT,
+                    verify=self.get_settings('OIDC_VERIFY_SSL', True),
+                    timeout=self.get_settings('OIDC_TIMEOUT', None),
+                    proxies=self.get_settings('OIDC_PROXY', None)
+                )
+            response.raise_for_status()
+            jwks = response.json()
+            self.cache.set(cache_key, jwks, settings.OIDC_JWKS_CACHE_TTL)
+        return jwks
+
+    def retrieve_matching_jwk(self, token):
+        """Find the signing key in the cached JWKS, refetching once on a miss
+        so that provider key rotation is picked up."""
+        try:
+            header = Header.json_loads(JWS.from_compact(token).signature.protected)
+        except Exception as e:
+            raise SuspiciousOperation(f"Malformed token header: {e}")
+        for refresh in (False, True):
+            for jwk in self.get_jwks(refresh=refresh)['keys']:
+                if self.get_settings('OIDC_VERIFY_KID', True) and jwk.get('kid') != smart_str(header.kid):
+                    continue
+                if 'alg' in jwk and jwk['alg'] != smart_str(header.alg):
+                    continue
+                return jwk
+        raise SuspiciousOperation('Could not find a valid JWKS.')
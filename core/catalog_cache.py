@@ -0,0 +1,101 @@
+"""Read-through cache for catalog data (customers, categories, products).
+
+Entries are keyed by the current generation of every table they were built
+from. Saving or deleting a row bumps its table's generation (see the
+receivers in ``core.models``), so stale entries are never read again and
+simply expire. The cache alias is ``CATALOG_CACHE_ALIAS``; with several
+processes it needs a shared backend (file or Redis) for the bumps to be seen
+everywhere.
+"""
+from collections import Counter
+from django.conf import settings
+from django.core.cache import caches
+from django.db import transaction
+import hashlib
+import logging
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+CATALOG_TABLES = ('customer', 'category', 'product')
+
+_stats = Counter()
+_stats_lock = threading.Lock()
+
+def _cache():
+    return caches[settings.CATALOG_CACHE_ALIAS]
+
+def _generation_key(table):
+    return f'catalog:generation:{table}'
+
+def _record(table_names, outcome):
+    with _stats_lock:
+        for table in table_names:
+            _stats[(table, outcome)] += 1
+
+def generations(*tables):
+    """Current generation of each table; a missing one is started from the
+    clock so an evicted counter can never repeat an earlier value."""
+    cache = _cache()
+    keys = {table: _generation_key(table) for table in tables}
+    found = cache.get_many(keys.values())
+    result = {}
+    for table, key in keys.items():
+        if key not in found:
+            cache.add(key, time.time_ns(), timeout=None)
+            found[key] = cache.get(key)
+        result[table] = found[key]
+    return result
+
+def _bump(table):
+    cache = _cache()
+    key = _generation_key(table)
+    current = cache.get(key) or 0
+    cache.set(key, max(time.time_ns(), current + 1), timeout=None)
+
+def bump_generation(table):
+    """Invalidate everything cached from ``table``.
+
+    Bumped now and again on commit, so a reader that cached the old rows
+    while the transaction was open is invalidated too.
+    """
+    _bump(table)
+    transaction.on_commit(lambda: _bump(table))
+
+def cached_catalog(tables, key, build, timeout=None, version=None):
+    """Return ``build()``, cached until one of ``tables`` changes.
+
+    ``version`` keys the entry on a value the caller read from the database
+    (a ``CatalogVersion``) instead of the cached generations, for responses
+    whose validators come from that same value: a generation bumped in
+    another process's local cache would go unseen here.
+    """
+    tables = (tables,) if isinstance(tables, str) else tuple(tables)
+    versions = generations(*tables) if version is None else dict.fromkeys(tables, version)
+    cache_key = 'catalog:{}:{}'.format(
+        ':'.join(f'{table}.{versions[table]}' for table in tables),
+        hashlib.sha1(key.encode()).hexdigest(),
+    )
+    cache = _cache()
+    value = cache.get(cache_key)
+    if value is not None:
+        _record(tables, 'hit')
+        return value
+    _record(tables, 'miss')
+    logger.debug("Catalog cache miss for %s", key)
+    value = build()
+    cache.set(cache_key, value, settings.CATALOG_CACHE_TIMEOUT if timeout is None else timeout)
+    return value
+
+def catalog_cache_stats():
+    """Hit/miss counts of this process, per table."""
+    with _stats_lock:
+        return {
+            table: {'hits': _stats[(table, 'hit')], 'misses': _stats[(table, 'miss')]}
+            for table in CATALOG_TABLES
+        }
+
+def reset_catalog_cache_stats():
+    with _stats_lock:
+        _stats.clear()
@@ -0,0 +1,19 @@
+from django.conf import settings
+from django.core.checks import Error, Tags, register
+
+
+@register(Tags.security)
+def check_local_jwt_validation(app_configs, **kwargs):
+    """Local JWT validation must pin the issuer and audience; without them any
+    token the tenant signed would be accepted."""
+    if not settings.OIDC_LOCAL_JWT_VALIDATION:
+        return []
+    return [
+        Error(
+            f"{name} must be set when OIDC_LOCAL_JWT_VALIDATION is on.",
+            hint="Otherwise every bearer token is rejected.",
+            id='core.E001',
+        )
+        for name in ('OIDC_OP_ISSUER', 'OIDC_API_AUDIENCE')
+        if not getattr(settings, name)
+    ]
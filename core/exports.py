@@ -0,0 +1,74 @@
+from django.conf import settings
+from .models import OrderItem
+from customer_order_api.database import read_replica
+import csv
+import json
+
+CSV_COLUMNS = [
+    'order_id', 'time', 'customer_id', 'customer_code', 'customer_name', 'total_amount',
+    'product_id', 'product_name', 'quantity', 'price',
+]
+
+class _Echo:
+    """File-like object whose ``write`` hands the line back to csv.writer."""
+
+    def write(self, value):
+        return value
+
+def iter_orders(queryset, batch_size=None):
+    """Yield ``(order, items)`` for ``queryset`` in id order.
+
+    Orders are read in keyset batches of ``batch_size`` and each batch's items
+    are loaded with one query, so memory stays flat however many rows match.
+    """
+    batch_size = batch_size or settings.EXPORT_BATCH_SIZE
+    queryset = queryset.select_related('customer').order_by('id')
+    last_id = 0
+    while True:
+        with read_replica():
+            orders = list(queryset.filter(id__gt=last_id)[:batch_size])
+            if not orders:
+                return
+            items_by_order = {}
+            items = OrderItem.objects.filter(order__in=orders).select_related('product').order_by('order_id', 'id')
+            for item in items:
+                items_by_order.setdefault(item.order_id, []).append(item)
+        for order in orders:
+            yield order, items_by_order.get(order.id, [])
+        last_id = orders[-1].id
+
+def stream_csv(queryset):
+    writer = csv.writer(_Echo())
+    yield writer.writerow(CSV_COLUMNS)
+    for order, items in iter_orders(queryset):
+        order_fields = [
+            order.id, order.time.isoformat(), order.customer_id, order.customer.code,
+            order.customer.name, order.total_amount,
+        ]
+        if not items:
+            yield writer.writerow(order_fields + [''] * 4)
+        for item in items:
+            yield writer.writerow(order_fields + [item.product_id, item.product.name, item.quantity, item.price])
+
+def stream_ndjson(queryset):
+    for order, items in iter_orders(queryset):
+        yield json.dumps({
+            'id': order.id,
+            'time': order.time.isoformat(),
+            'customer': {'id': order.customer_id, 'code': order.customer.code, 'name': order.customer.name},
+            'total_amount': str(order.total_amount),
+            'order_items': [
+                {
+                    'product': item.product_id,
+                    'product_name': item.product.name,
+                    'quantity': item.quantity,
+                    'price': str(item.price),
+                }
+                for item in items
+            ],
+        }) + '\n'
+
+EXPORT_FORMATS = {
+    'csv': (stream_csv, 'text/csv', 'csv'),
+    'ndjson': (stream_ndjson, 'application/x-ndjson', 'ndjson'),
+}
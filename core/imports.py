@@ -0,0 +1,208 @@
+from django.conf import settings
+from django.db import transaction
+from rest_framework import serializers
+from .models import (
+    Customer, NotificationOutbox, Order, OrderItem, Product, add_to_daily_sales, credit_sales_categories,
+)
+import csv
+import json
+
+# Stateless DRF fields, reused to validate every value in a chunk with the
+# same rules (and error messages) as the single-order API.
+_quantity_field = serializers.IntegerField(min_value=1)
+_price_field = serializers.DecimalField(max_digits=10, decimal_places=2, min_value=0)
+_time_field = serializers.DateTimeField()
+
+def _normalize(line, record):
+    if not isinstance(record, dict):
+        return {'line': line, 'invalid': 'Each order must be an object.'}
+    customer = record.get('customer', record.get('customer_code'))
+    if isinstance(customer, dict):
+        # Accept the nested customer written by the NDJSON export.
+        customer = customer.get('code')
+    items = record.get('order_items')
+    return {
+        'line': line,
+        'customer': customer,
+        'time': record.get('time'),
+        'order_items': items if isinstance(items, list) else [],
+    }
+
+def parse_json(records):
+    """Records from an already decoded JSON list."""
+    for line, record in enumerate(records, start=1):
+        yield _normalize(line, record)
+
+def parse_ndjson(lines):
+    """One order object per line, in the shape the NDJSON export writes."""
+    for line, text in enumerate(lines, start=1):
+        if not text.strip():
+            continue
+        try:
+            record = json.loads(text)
+        except ValueError as e:
+            yield {'line': line, 'invalid': f'Invalid JSON: {e}'}
+            continue
+        yield _normalize(line, record)
+
+def parse_csv(lines):
+    """One row per order item, in the shape the CSV export writes.
+
+    Consecutive rows sharing an ``order_id`` form one order; the column is only
+    used for grouping; imported orders always get new ids.
+    """
+    reader = csv.DictReader(lines)
+    record = None
+    for row in reader:
+        ref = row.get('order_id') or None
+        if record is None or ref is None or ref != record['ref']:
+            if record is not None:
+                yield record
+            record = {
+                'line': reader.line_num,
+                'ref': ref,
+                'customer': row.get('customer_code'),
+                'time': row.get('time') or None,
+                'order_items': [],
+            }
+        if row.get('product_id'):
+            record['order_items'].append({
+                'product': row['product_id'],
+                'quantity': row.get('quantity'),
+                'price': row.get('price') or None,
+            })
+    if record is not None:
+        yield record
+
+IMPORT_FORMATS = {
+    'csv': parse_csv,
+    'ndjson': parse_ndjson,
+}
+
+def _chunks(records, size):
+    chunk = []
+    for record in records:
+        chunk.append(record)
+        if len(chunk) >= size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+def _as_int(value):
+    if isinstance(value, bool):
+        return None
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return None
+
+def _validate(record, customers, product_prices):
+    """Return ``(order, items, errors)`` for one normalized record."""
+    if 'invalid' in record:
+        return None, None, {'non_field_errors': [record['invalid']]}
+    errors = {}
+    customer = customers.get(record['customer']) if isinstance(record['customer'], str) else None
+    if customer is None:
+        errors['customer'] = [f"Customer with code {record['customer']!r} does not exist."]
+
+    order_time = None
+    if record['time']:
+        try:
+            order_time = _time_field.run_validation(record['time'])
+        except serializers.ValidationError as e:
+            errors['time'] = e.detail
+
+    items = []
+    item_errors = {}
+    total_amount = 0
+    if not record['order_items']:
+        errors['order_items'] = ['At least one order item is required.']
+    for index, data in enumerate(record['order_items']):
+        if not isinstance(data, dict):
+            item_errors[index] = {'non_field_errors': ['Each order item must be an object.']}
+            continue
+        errors_for_item = {}
+        product_id = _as_int(data.get('product'))
+        if product_id not in product_prices:
+            errors_for_item['product'] = [f"Invalid pk \"{data.get('product')}\" - object does not exist."]
+        try:
+            quantity = _quantity_field.run_validation(data.get('quantity', 1))
+        except serializers.ValidationError as e:
+            errors_for_item['quantity'] = e.detail
+        price = data.get('price')
+        if price is None:
+            # A missing price means "the product's current price".
+            price = product_prices.get(product_id)
+        if price is not None:
+            try:
+                price = _price_field.run_validation(price)
+            except serializers.ValidationError as e:
+                errors_for_item['price'] = e.detail
+        if errors_for_item:
+            item_errors[index] = errors_for_item
+            continue
+        items.append(OrderItem(product_id=product_id, quantity=quantity, price=price))
+        total_amount += quantity * price
+    if item_errors:
+        errors['order_items'] = item_errors
+    if errors:
+        return None, None, errors
+
+    order = Order(customer=customer, total_amount=total_amount)
+    if order_time is not None:
+        order.time = order_time
+    return order, items, None
+
+def _import_chunk(chunk, notify, result):
+    codes = {record['customer'] for record in chunk if isinstance(record.get('customer'), str)}
+    product_ids = {
+        product_id
+        for record in chunk
+        for item in record.get('order_items', [])
+        if isinstance(item, dict) and (product_id := _as_int(item.get('product'))) is not None
+    }
+    customers = Customer.objects.in_bulk(codes, field_name='code')
+    product_prices = dict(Product.objects.filter(id__in=product_ids).values_list('id', 'price'))
+
+    orders = []
+    order_items = []
+    for record in chunk:
+        order, items, errors = _validate(record, customers, product_prices)
+        if errors:
+            result['errors'].append({'line': record['line'], 'errors': errors})
+            continue
+        # Historical orders that should not notify anyone are marked as already
+        # notified, which also keeps them out of the unnotified-orders index.
+        order.notification_sent = not notify
+        orders.append(order)
+        order_items.append(items)
+    if not orders:
+        return
+
+    # bulk_create skips post_save, so the outbox and sales rollup are written here too.
+    with transaction.atomic():
+        Order.objects.bulk_create(orders)
+        for order, items in zip(orders, order_items):
+            for item in items:
+                item.order = order
+        items = [item for items in order_items for item in items]
+        credit_sales_categories(items)
+        items = OrderItem.objects.bulk_create(items)
+        add_to_daily_sales(items)
+        if notify:
+            NotificationOutbox.objects.bulk_create([NotificationOutbox(order=order) for order in orders])
+    result['created'] += len(orders)
+
+def import_orders(records, chunk_size=None, notify=True):
+    """Validate and insert orders from parsed ``records`` in chunks.
+
+    Each chunk resolves its customer codes and product ids with one query
+    apiece and is written in one transaction with ``bulk_create``. Invalid
+    records are skipped and reported by line; the rest are still imported.
+    Returns ``{'created': n, 'errors': [{'line': ..., 'errors': {...}}]}``.
+    """
+    result = {'created': 0, 'errors': []}
+    for chunk in _chunks(records, chunk_size or settings.IMPORT_CHUNK_SIZE):
+        _import_chunk(chunk, notify, result)
+    return result
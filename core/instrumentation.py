@@ -0,0 +1,234 @@
+"""Per-request timing, query and outbound-call accounting.
+
+``PerformanceMiddleware`` measures every request: wall time, the number and
+duration of database queries (through a cursor ``execute_wrapper`` on every
+connection) and the time spent in outbound calls wrapped in
+``track_external`` (SMS, email, OIDC provider). The figures go into
+in-process metrics that ``render_metrics`` formats for Prometheus, and out
+as a ``Server-Timing`` header with ``SERVER_TIMING`` on (the default under
+DEBUG) or for staff users. The middleware runs in both sync and async stacks,
+so async views under ASGI are not pinned to a thread.
+
+Metrics are per process; under gunicorn each worker reports its own.
+"""
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from contextlib import contextmanager
+from contextvars import ContextVar
+from django.conf import settings
+from django.core.mail import get_connection
+from django.core.mail.backends.base import BaseEmailBackend
+from django.db import connections
+from django.db.backends.signals import connection_created
+from django.utils.functional import SimpleLazyObject, empty
+from .catalog_cache import catalog_cache_stats
+import threading
+import time
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+_request_metrics = ContextVar('request_metrics', default=None)
+_lock = threading.Lock()
+_histograms = {}
+_counters = {}
+
+METRIC_HELP = {
+    'http_requests_total': ('counter', 'Requests handled, by view, method and status.'),
+    'http_request_duration_seconds': ('histogram', 'Wall time per request, by view.'),
+    'http_request_db_queries_total': ('counter', 'Database queries run while handling requests, by view.'),
+    'http_request_db_seconds_total': ('counter', 'Time spent in database queries, by view.'),
+    'http_request_external_seconds_total': ('counter', 'Time spent in outbound calls during requests, by view and target.'),
+    'external_call_duration_seconds': ('histogram', 'Duration of outbound calls (SMS, email, OIDC), by target.'),
+    'catalog_cache_requests_total': ('counter', 'Catalog cache lookups, by table and result.'),
+}
+
+class RequestMetrics:
+    def __init__(self):
+        self.db_queries = 0
+        self.db_time = 0.0
+        self.external = {}
+
+def _labels(labels):
+    return tuple(sorted(labels.items()))
+
+def inc(name, value=1, **labels):
+    key = (name, _labels(labels))
+    with _lock:
+        _counters[key] = _counters.get(key, 0) + value
+
+def observe(name, value, **labels):
+    key = (name, _labels(labels))
+    with _lock:
+        histogram = _histograms.get(key)
+        if histogram is None:
+            histogram = _histograms[key] = {'buckets': [0] * len(LATENCY_BUCKETS), 'sum': 0.0, 'count': 0}
+        for index, bound in enumerate(LATENCY_BUCKETS):
+            if value <= bound:
+                histogram['buckets'][index] += 1
+        histogram['sum'] += value
+        histogram['count'] += 1
+
+def reset_metrics():
+    with _lock:
+        _histograms.clear()
+        _counters.clear()
+
+def _format_labels(labels, **extra):
+    pairs = list(labels) + sorted(extra.items())
+    if not pairs:
+        return ''
+    escaped = (str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n') for _, value in pairs)
+    return '{' + ','.join(f'{name}="{value}"' for (name, _), value in zip(pairs, escaped)) + '}'
+
+def render_metrics():
+    """All metrics in the Prometheus text exposition format."""
+    with _lock:
+        counters = dict(_counters)
+        histograms = {key: dict(value, buckets=list(value['buckets'])) for key, value in _histograms.items()}
+    for table, stats in catalog_cache_stats().items():
+        counters[('catalog_cache_requests_total', _labels({'table': table, 'result': 'hit'}))] = stats['hits']
+        counters[('catalog_cache_requests_total', _labels({'table': table, 'result': 'miss'}))] = stats['misses']
+
+    lines = []
+    for name, (kind, help_text) in METRIC_HELP.items():
+        lines.append(f'# HELP {name} {help_text}')
+        lines.append(f'# TYPE {name} {kind}')
+        if kind == 'counter':
+            for (metric, labels), value in sorted(counters.items()):
+                if metric == name:
+                    lines.append(f'{name}{_format_labels(labels)} {value}')
+            continue
+        for (metric, labels), histogram in sorted(histograms.items()):
+            if metric != name:
+                continue
+            for bound, count in zip(LATENCY_BUCKETS, histogram['buckets']):
+                lines.append(f'{name}_bucket{_format_labels(labels, le=bound)} {count}')
+            lines.append(f'{name}_bucket{_format_labels(labels, le="+Inf")} {histogram["count"]}')
+            lines.append(f'{name}_sum{_format_labels(labels)} {histogram["sum"]}')
+            lines.append(f'{name}_count{_format_labels(labels)} {histogram["count"]}')
+    return '\n'.join(lines) + '\n'
+
+@contextmanager
+def track_external(target):
+    """Time an outbound call to ``target`` (e.g. ``'sms'``, ``'email'``)."""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        elapsed = time.perf_counter() - start
+        observe('external_call_duration_seconds', elapsed, target=target)
+        metrics = _request_metrics.get()
+        if metrics is not None:
+            metrics.external[target] = metrics.external.get(target, 0.0) + elapsed
+
+def _time_query(execute, sql, params, many, context):
+    start = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        metrics = _request_metrics.get()
+        if metrics is not None:
+            metrics.db_queries += 1
+            metrics.db_time += time.perf_counter() - start
+
+def _install_query_timer(connection, **kwargs):
+    # Installed once per connection rather than per request: under ASGI the
+    # queries run on sync_to_async threads with connections of their own.
+    if _time_query not in connection.execute_wrappers:
+        connection.execute_wrappers.append(_time_query)
+
+def _view_label(view_func):
+    view_class = getattr(view_func, 'cls', None) or getattr(view_func, 'view_class', None)
+    if view_class is None:
+        return f'{view_func.__module__}.{view_func.__name__}'
+    return view_class.__name__
+
+def _shows_server_timing(request):
+    if settings.SERVER_TIMING:
+        return True
+    user = getattr(request, 'user', None)
+    # Only a user already loaded by the view counts; loading it here would
+    # add a query (and is not allowed in async code).
+    if isinstance(user, SimpleLazyObject) and user._wrapped is empty:
+        return False
+    return bool(getattr(user, 'is_staff', False))
+
+class PerformanceMiddleware:
+    """Record timing, query and outbound-call figures for every request."""
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.is_async = iscoroutinefunction(get_response)
+        if self.is_async:
+            markcoroutinefunction(self)
+        connection_created.connect(_install_query_timer)
+        for connection in connections.all():
+            _install_query_timer(connection)
+
+    def __call__(self, request):
+        if self.is_async:
+            return self.__acall__(request)
+        if not settings.PERFORMANCE_INSTRUMENTATION:
+            return self.get_response(request)
+        metrics = RequestMetrics()
+        token = _request_metrics.set(metrics)
+        start = time.perf_counter()
+        try:
+            response = self.get_response(request)
+        finally:
+            _request_metrics.reset(token)
+        return self.finish(request, response, metrics, time.perf_counter() - start)
+
+    async def __acall__(self, request):
+        if not settings.PERFORMANCE_INSTRUMENTATION:
+            return await self.get_response(request)
+        metrics = RequestMetrics()
+        token = _request_metrics.set(metrics)
+        start = time.perf_counter()
+        try:
+            response = await self.get_response(request)
+        finally:
+            _request_metrics.reset(token)
+        return self.finish(request, response, metrics, time.perf_counter() - start)
+
+    def finish(self, request, response, metrics, elapsed):
+        view = getattr(request, '_performance_view', 'unresolved')
+        inc('http_requests_total', view=view, method=request.method, status=response.status_code)
+        observe('http_request_duration_seconds', elapsed, view=view)
+        inc('http_request_db_queries_total', metrics.db_queries, view=view)
+        inc('http_request_db_seconds_total', metrics.db_time, view=view)
+        for target, seconds in metrics.external.items():
+            inc('http_request_external_seconds_total', seconds, view=view, target=target)
+
+        if _shows_server_timing(request):
+            timings = [f'total;dur={elapsed * 1000:.1f}', f'db;dur={metrics.db_time * 1000:.1f};desc="{metrics.db_queries} queries"']
+            timings += [f'{target};dur={seconds * 1000:.1f}' for target, seconds in sorted(metrics.external.items())]
+            response['Server-Timing'] = ', '.join(timings)
+        return response
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        request._performance_view = _view_label(view_func)
+        actions = getattr(view_func, 'actions', None)
+        if actions and request.method.lower() in actions:
+            request._performance_view += f'.{actions[request.method.lower()]}'
+
+class TimedEmailBackend(BaseEmailBackend):
+    """Email backend that times the backend in ``EMAIL_DELIVERY_BACKEND``."""
+
+    def __init__(self, fail_silently=False, **kwargs):
+        super().__init__(fail_silently=fail_silently)
+        self.backend = get_connection(settings.EMAIL_DELIVERY_BACKEND, fail_silently=fail_silently, **kwargs)
+
+    def open(self):
+        with track_external('email'):
+            return self.backend.open()
+
+    def close(self):
+        with track_external('email'):
+            return self.backend.close()
+
+    def send_messages(self, email_messages):
+        with track_external('email'):
+            return self.backend.send_messages(email_messages)
@@ -0,0 +1,43 @@
+import codecs
+import json
+import os
+import sys
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from core.imports import IMPORT_FORMATS, import_orders
+
+
+class Command(BaseCommand):
+    help = "Bulk import orders from an NDJSON or CSV file (the formats written by the order export)."
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help="File to import, or - for stdin.")
+        parser.add_argument('--format', choices=list(IMPORT_FORMATS),
+                            help="Input format; defaults to the file extension.")
+        parser.add_argument('--chunk-size', type=int, default=settings.IMPORT_CHUNK_SIZE,
+                            help="Orders validated and written per transaction.")
+        parser.add_argument('--no-notify', action='store_true',
+                            help="Do not queue customer/admin notifications for the imported orders.")
+
+    def handle(self, *args, **options):
+        path = options['path']
+        input_format = options['format'] or os.path.splitext(path)[1].lstrip('.').lower()
+        if input_format not in IMPORT_FORMATS:
+            raise CommandError(f"Cannot tell the format of {path!r}; pass --format {'|'.join(IMPORT_FORMATS)}")
+
+        stream = codecs.getreader('utf-8')(sys.stdin.buffer) if path == '-' else open(path, encoding='utf-8', newline='')
+        try:
+            result = import_orders(
+                IMPORT_FORMATS[input_format](stream),
+                chunk_size=options['chunk_size'],
+                notify=not options['no_notify'],
+            )
+        finally:
+            if path != '-':
+                stream.close()
+
+        for error in result['errors']:
+            self.stderr.write(f"Line {error['line']}: {json.dumps(error['errors'])}")
+        self.stdout.write(self.style.SUCCESS(
+            f"Imported {result['created']} orders, skipped {len(result['errors'])}"
+        ))
@@ -0,0 +1,50 @@
+import logging
+import time
+from django.conf import settings
+from django.core.mail import get_connection
+from django.core.management.base import BaseCommand
+from django.db import DatabaseError, close_old_connections
+from core.notifications import flush_email_digest, process_outbox
+
+logger = logging.getLogger(__name__)
+
+
+class Command(BaseCommand):
+    help = "Deliver queued order notifications (SMS and admin email) from the outbox."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=settings.NOTIFICATION_BATCH_SIZE)
+        parser.add_argument('--poll-interval', type=float, default=settings.NOTIFICATION_POLL_INTERVAL,
+                            help="Seconds to sleep when the outbox is empty.")
+        parser.add_argument('--once', action='store_true', help="Drain the due entries and exit.")
+        parser.add_argument('--flush-digest', action='store_true',
+                            help="With --once, send any waiting digest email before exiting.")
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+        total = 0
+        # One SMTP session is reused for every email this worker sends.
+        connection = get_connection(fail_silently=False)
+        try:
+            while True:
+                try:
+                    processed = process_outbox(batch_size, connection)
+                except DatabaseError as e:
+                    # E.g. "database is locked" or a dropped connection: the
+                    # leases lapse on their own, so wait and poll again.
+                    logger.error("Processing the notification outbox failed: %s", e)
+                    close_old_connections()
+                    time.sleep(options['poll_interval'])
+                    continue
+                total += processed
+                if processed:
+                    continue
+                if options['once']:
+                    if options['flush_digest'] and settings.NOTIFICATION_EMAIL_DIGEST:
+                        # Its orders were counted when their entries were claimed.
+                        flush_email_digest(connection, force=True)
+                    break
+                time.sleep(options['poll_interval'])
+        finally:
+            connection.close()
+        self.stdout.write(self.style.SUCCESS(f"Processed {total} notifications"))
@@ -0,0 +1,33 @@
+from datetime import datetime, time, timedelta
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+from django.utils.dateparse import parse_date
+from core.models import Category, rebuild_daily_sales, refresh_category_stats
+
+
+class Command(BaseCommand):
+    help = "Rebuild the DailySales and CategoryPriceStats rollups from orders and products."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--since', help="First day (YYYY-MM-DD) of sales to rebuild; default: all.")
+        parser.add_argument('--until', help="Last day (YYYY-MM-DD, inclusive) of sales to rebuild; default: all.")
+        parser.add_argument('--skip-price-stats', action='store_true',
+                            help="Only rebuild DailySales.")
+
+    def _day_start(self, value, option, offset=0):
+        if value is None:
+            return None
+        day = parse_date(value)
+        if day is None:
+            raise CommandError(f"--{option} must be a date (YYYY-MM-DD)")
+        return timezone.make_aware(datetime.combine(day, time.min)) + timedelta(days=offset)
+
+    def handle(self, *args, **options):
+        start = self._day_start(options['since'], 'since')
+        end = self._day_start(options['until'], 'until', offset=1)
+        rows = rebuild_daily_sales(start, end)
+        self.stdout.write(self.style.SUCCESS(f"Rebuilt {rows} daily sales rows"))
+        if not options['skip_price_stats']:
+            category_ids = list(Category.objects.values_list('id', flat=True))
+            refresh_category_stats(category_ids)
+            self.stdout.write(self.style.SUCCESS(f"Rebuilt price stats for {len(category_ids)} categories"))
@@ -0,0 +1,40 @@
+# Generated by Django 5.0.6 on 2026-10-17 21:00
+
+import django.db.models.deletion
+from django.db import migrations, models
+from django.db.models import Count, Max, Min, Sum
+
+
+def backfill_category_stats(apps, schema_editor):
+    Category = apps.get_model('core', 'Category')
+    Product = apps.get_model('core', 'Product')
+    CategoryPriceStats = apps.get_model('core', 'CategoryPriceStats')
+    for category in Category.objects.all():
+        totals = Product.objects.filter(
+            category__tree_id=category.tree_id,
+            category__lft__gte=category.lft,
+            category__rght__lte=category.rght,
+        ).aggregate(product_count=Count('id'), price_sum=Sum('price'), min_price=Min('price'), max_price=Max('price'))
+        totals['price_sum'] = totals['price_sum'] or 0
+        CategoryPriceStats.objects.create(category=category, **totals)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0008_notificationoutbox'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CategoryPriceStats',
+            fields=[
+                ('category', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='price_stats', serialize=False, to='core.category')),
+                ('product_count', models.PositiveIntegerField(default=0)),
+                ('price_sum', models.DecimalField(decimal_places=2, default=0, max_digits=16)),
+                ('min_price', models.DecimalField(blank=True, decimal_places=2, max_digits=10, null=True)),
+                ('max_price', models.DecimalField(blank=True, decimal_places=2, max_digits=10, null=True)),
+            ],
+        ),
+        migrations.RunPython(backfill_category_stats, migrations.RunPython.noop),
+    ]
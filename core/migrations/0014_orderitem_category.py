@@ -0,0 +1,30 @@
+# Generated by Django 5.0.6 on 2026-10-17 23:40
+
+import django.db.models.deletion
+from django.db import migrations, models
+from django.db.models import OuterRef, Subquery
+
+
+def backfill_credited_category(apps, schema_editor):
+    OrderItem = apps.get_model('core', 'OrderItem')
+    Product = apps.get_model('core', 'Product')
+    # Existing rollup rows were keyed by the products' categories as they are now.
+    OrderItem.objects.update(
+        category_id=Subquery(Product.objects.filter(pk=OuterRef('product_id')).values('category_id')[:1])
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0013_typeahead_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='orderitem',
+            name='category',
+            field=models.ForeignKey(blank=True, editable=False, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='order_items', to='core.category'),
+        ),
+        migrations.RunPython(backfill_credited_category, migrations.RunPython.noop),
+    ]
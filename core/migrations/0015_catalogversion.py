@@ -0,0 +1,30 @@
+# Generated by Django 5.0.6 on 2026-10-17 22:11
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+def create_versions(apps, schema_editor):
+    CatalogVersion = apps.get_model('core', 'CatalogVersion')
+    CatalogVersion.objects.bulk_create(
+        [CatalogVersion(table=table) for table in ('customer', 'category', 'product')], ignore_conflicts=True,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0014_orderitem_category'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CatalogVersion',
+            fields=[
+                ('table', models.CharField(max_length=20, primary_key=True, serialize=False)),
+                ('version', models.PositiveBigIntegerField(default=0)),
+                ('changed_at', models.DateTimeField(default=django.utils.timezone.now)),
+            ],
+        ),
+        migrations.RunPython(create_versions, migrations.RunPython.noop),
+    ]
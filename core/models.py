@@ -1,12 +1,14 @@
-from django.db import models
-from django.db.models.signals import post_save
+from bisect import bisect_left, bisect_right
+from decimal import Decimal
+from django.db import connection, models, transaction
+from django.db.models import Count, F, Max, Min, Sum, Value
+from django.db.models.functions import Coalesce, Greatest, Least, Lower, TruncDate
+from django.db.models.signals import post_delete, post_save, pre_delete, pre_save
 from django.dispatch import receiver
-from django.core.mail import send_mail
-from django.conf import settings
-from .utils.sms import send_sms
+from django.utils import timezone
 from mptt.models import MPTTModel, TreeForeignKey
+from .catalog_cache import bump_generation
 import logging
-from django.db import transaction
 
 logger = logging.getLogger(__name__)
 
@@ -16,6 +18,14 @@ class Customer(models.Model):
     phone = models.CharField(max_length=15, blank=True, null=True)
     email = models.EmailField(blank=True, null=True)
 
+    class Meta:
+        indexes = [
+            models.Index(fields=['name', 'id'], name='customer_name_idx'),
+            # Case-insensitive prefix search (typeahead)
+            models.Index(Lower('name'), name='customer_name_lower_idx'),
+            models.Index(Lower('code'), name='customer_code_lower_idx'),
+        ]
+
     def __str__(self):
         return self.name
 
@@ -32,16 +42,56 @@ class Product(models.Model):
     price = models.DecimalField(max_digits=10, decimal_places=2)
     description = models.TextField(blank=True, null=True)
 
+    class Meta:
+        indexes = [
+            models.Index(fields=['name', 'id'], name='product_name_idx'),
+            # Case-insensitive prefix search (typeahead)
+            models.Index(Lower('name'), name='product_name_lower_idx'),
+        ]
+
     def __str__(self):
         return self.name
 
+class CategoryPriceStats(models.Model):
+    """Product price rollup over a category and all of its descendants.
+
+    Kept current by the Product/Category signal handlers below, so reads are a
+    single primary-key lookup. ``refresh_category_stats`` rebuilds rows from
+    scratch for writes that bypass signals (``bulk_create``, ``update``).
+    """
+    category = models.OneToOneField(Category, on_delete=models.CASCADE, primary_key=True, related_name='price_stats')
+    product_count = models.PositiveIntegerField(default=0)
+    price_sum = models.DecimalField(max_digits=16, decimal_places=2, default=0)
+    min_price = models.DecimalField(max_digits=10, decimal_places=2, null=True, blank=True)
+    max_price = models.DecimalField(max_digits=10, decimal_places=2, null=True, blank=True)
+
+    @property
+    def average_price(self):
+        if not self.product_count:
+            return None
+        return (Decimal(self.price_sum) / self.product_count).quantize(Decimal('0.01'))
+
+    def __str__(self):
+        return f"Price stats for {self.category}"
+
 class Order(models.Model):
     customer = models.ForeignKey(Customer, on_delete=models.CASCADE, related_name='orders')
     products = models.ManyToManyField(Product, through='OrderItem')
-    time = models.DateTimeField(auto_now_add=True)
+    # Not auto_now_add, so imported historical orders can keep their own time
+    time = models.DateTimeField(default=timezone.now)
     total_amount = models.DecimalField(max_digits=10, decimal_places=2, default=0.00)
     notification_sent = models.BooleanField(default=False)
 
+    class Meta:
+        indexes = [
+            # Newest-first listings and cursor pagination
+            models.Index(fields=['-time', '-id'], name='order_time_idx'),
+            # "Orders for customer X in a date range"
+            models.Index(fields=['customer', '-time'], name='order_customer_time_idx'),
+            # Orders still waiting on a notification; stays small
+            models.Index(fields=['time'], condition=models.Q(notification_sent=False), name='order_unnotified_idx'),
+        ]
+
     def __str__(self):
         return f"Order by {self.customer.name} at {self.time}"
 
@@ -50,55 +100,401 @@ class OrderItem(models.Model):
     product = models.ForeignKey(Product, on_delete=models.CASCADE)
     quantity = models.PositiveIntegerField(default=1)
     price = models.DecimalField(max_digits=10, decimal_places=2)
+    # The DailySales category this item was credited to: its product's
+    # category when the item was written. Later changes to the item subtract
+    # from that row even if the product has since moved.
+    category = models.ForeignKey(Category, on_delete=models.SET_NULL, null=True, blank=True, editable=False,
+                                 related_name='order_items')
 
     def __str__(self):
         return f"{self.quantity} x {item.product.name} in Order {self.order.id}"
 
+class DailySales(models.Model):
+    """Sales per day, customer and product category (the product's own,
+    usually a leaf).
+
+    Kept current as order items are written (``add_to_daily_sales``), so
+    reports never aggregate ``Order``/``OrderItem``. Totals for an ancestor
+    category are the sum of the rows in its MPTT subtree.
+    ``rebuild_daily_sales`` recomputes a date range from scratch.
+    """
+    day = models.DateField()
+    customer = models.ForeignKey(Customer, on_delete=models.CASCADE, related_name='daily_sales')
+    category = models.ForeignKey(Category, on_delete=models.CASCADE, related_name='daily_sales')
+    # Orders with at least one item in this category
+    order_count = models.PositiveIntegerField(default=0)
+    quantity = models.PositiveIntegerField(default=0)
+    revenue = models.DecimalField(max_digits=16, decimal_places=2, default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['day', 'customer', 'category'], name='daily_sales_key'),
+        ]
+        indexes = [
+            models.Index(fields=['customer', 'day'], name='daily_sales_customer_idx'),
+            models.Index(fields=['category', 'day'], name='daily_sales_category_idx'),
+        ]
+
+    def __str__(self):
+        return f"Sales on {self.day} for {self.customer_id}/{self.category_id}"
+
+class NotificationOutbox(models.Model):
+    """Pending customer/admin notifications for an order, drained by the
+    ``process_notifications`` management command."""
+    STATUS_PENDING = 'pending'
+    STATUS_SENT = 'sent'
+    STATUS_FAILED = 'failed'
+    STATUS_CHOICES = [
+        (STATUS_PENDING, 'Pending'),
+        (STATUS_SENT, 'Sent'),
+        (STATUS_FAILED, 'Failed'),
+    ]
+
+    order = models.ForeignKey(Order, on_delete=models.CASCADE, related_name='notifications')
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default=STATUS_PENDING)
+    attempts = models.PositiveIntegerField(default=0)
+    sms_done = models.BooleanField(default=False)
+    email_done = models.BooleanField(default=False)
+    next_attempt_at = models.DateTimeField(default=timezone.now)
+    last_error = models.TextField(blank=True, default='')
+    created_at = models.DateTimeField(auto_now_add=True)
+    sent_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        indexes = [models.Index(fields=['status', 'next_attempt_at'])]
+
+    def __str__(self):
+        return f"Notification for Order {self.order_id} ({self.status})"
+
+class CatalogVersion(models.Model):
+    """Change counter per catalog table (customer, category, product).
+
+    The ETag/Last-Modified validators on catalog reads come from here rather
+    than from the catalog cache, so a write handled by one process is seen by
+    every other one, whatever the cache backend.
+    """
+    table = models.CharField(max_length=20, primary_key=True)
+    version = models.PositiveBigIntegerField(default=0)
+    changed_at = models.DateTimeField(default=timezone.now)
+
+    def __str__(self):
+        return f"{self.table} v{self.version}"
+
+def mark_catalog_changed(table):
+    """Invalidate the catalog cache for ``table`` and advance its
+    ``CatalogVersion``, as part of the writer's transaction."""
+    bump_generation(table)
+    versions = CatalogVersion.objects.filter(table=table)
+    if not versions.update(version=F('version') + 1, changed_at=timezone.now()):
+        CatalogVersion.objects.bulk_create([CatalogVersion(table=table)], ignore_conflicts=True)
+        versions.update(version=F('version') + 1, changed_at=timezone.now())
+
+def catalog_change_marker(table):
+    """``(etag, last_modified)`` validators for ``table``, one primary-key read."""
+    row = CatalogVersion.objects.filter(table=table).values_list('version', 'changed_at').first()
+    version, changed_at = row or (0, None)
+    stamp = int(changed_at.timestamp()) if changed_at else 0
+    return f'"{table}-{version}-{stamp}"', stamp
+
+def category_lineage_ids(category_id):
+    """Ids of a category and all of its ancestors, read fresh from the tree."""
+    category = Category.objects.filter(pk=category_id).values('tree_id', 'lft', 'rght').first()
+    if category is None:
+        return []
+    return list(Category.objects.filter(
+        tree_id=category['tree_id'], lft__lte=category['lft'], rght__gte=category['rght']
+    ).values_list('id', flat=True))
+
+def refresh_category_stats(category_ids):
+    """Recompute the price rollup of the given categories from their subtrees.
+
+    Products are aggregated per category in one query and the groups are
+    summed over each requested subtree here, so the number of queries does
+    not grow with the number of categories.
+    """
+    categories = sorted(
+        Category.objects.filter(id__in=list(category_ids)).values('id', 'tree_id', 'lft', 'rght'),
+        key=lambda category: (category['tree_id'], category['lft']),
+    )
+    if not categories:
+        return
+    # Only the outermost subtrees need to be read; nested ones are inside them.
+    outermost = []
+    for category in categories:
+        if not outermost or category['tree_id'] != outermost[-1]['tree_id'] or category['rght'] > outermost[-1]['rght']:
+            outermost.append(category)
+    subtrees = models.Q()
+    for category in outermost:
+        subtrees |= models.Q(category__tree_id=category['tree_id'], category__lft__gte=category['lft'],
+                             category__rght__lte=category['rght'])
+    groups = list(
+        Product.objects.filter(subtrees).values('category__tree_id', 'category__lft').annotate(
+            product_count=Count('id'), price_sum=Sum('price'), min_price=Min('price'), max_price=Max('price'),
+        ).order_by('category__tree_id', 'category__lft')
+    )
+    keys = [(group['category__tree_id'], group['category__lft']) for group in groups]
+
+    rows = []
+    for category in categories:
+        subtree = groups[
+            bisect_left(keys, (category['tree_id'], category['lft'])):
+            bisect_right(keys, (category['tree_id'], category['rght']))
+        ]
+        rows.append(CategoryPriceStats(
+            category_id=category['id'],
+            product_count=sum(group['product_count'] for group in subtree),
+            price_sum=sum((group['price_sum'] for group in subtree), Decimal(0)),
+            min_price=min((group['min_price'] for group in subtree), default=None),
+            max_price=max((group['max_price'] for group in subtree), default=None),
+        ))
+    CategoryPriceStats.objects.bulk_create(
+        rows, update_conflicts=True, unique_fields=['category'],
+        update_fields=['product_count', 'price_sum', 'min_price', 'max_price'],
+    )
+
+def refresh_category_lineage_stats(category_ids):
+    """Rebuild the rollups of the given categories and all their ancestors,
+    for product writes that bypass the signals below (``bulk_create``,
+    ``bulk_update``)."""
+    touched = Category.objects.filter(id__in=list(category_ids))
+    refresh_category_stats(
+        Category.objects.get_queryset_ancestors(touched, include_self=True).values_list('id', flat=True)
+    )
+
+def _add_to_category_stats(category_id, price):
+    price = Value(price, output_field=models.DecimalField())
+    CategoryPriceStats.objects.filter(category_id__in=category_lineage_ids(category_id)).update(
+        product_count=F('product_count') + 1,
+        price_sum=F('price_sum') + price,
+        min_price=Least(Coalesce('min_price', price), price),
+        max_price=Greatest(Coalesce('max_price', price), price),
+    )
+
+def _remove_from_category_stats(category_id, price):
+    lineage = category_lineage_ids(category_id)
+    CategoryPriceStats.objects.filter(category_id__in=lineage).update(
+        product_count=F('product_count') - 1,
+        price_sum=F('price_sum') - Value(price, output_field=models.DecimalField()),
+    )
+    # Min/max cannot be decremented; rebuild only the rows whose bound was this product.
+    stale = CategoryPriceStats.objects.filter(category_id__in=lineage).filter(
+        models.Q(min_price=price) | models.Q(max_price=price)
+    ).values_list('category_id', flat=True)
+    refresh_category_stats(stale)
+
+@receiver(pre_save, sender=Product)
+def remember_product_price(sender, instance, **kwargs):
+    instance._stats_previous = None
+    if instance.pk and not kwargs.get('raw'):
+        instance._stats_previous = Product.objects.filter(pk=instance.pk).values_list('category_id', 'price').first()
+
+@receiver(post_save, sender=Product)
+def update_stats_on_product_save(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    price = Decimal(str(instance.price))
+    previous = getattr(instance, '_stats_previous', None)
+    if previous == (instance.category_id, price):
+        return
+    if previous is not None:
+        _remove_from_category_stats(*previous)
+    _add_to_category_stats(instance.category_id, price)
+
+@receiver(post_delete, sender=Product)
+def update_stats_on_product_delete(sender, instance, **kwargs):
+    _remove_from_category_stats(instance.category_id, Decimal(str(instance.price)))
+
+@receiver(pre_save, sender=Category)
+def remember_category_parent(sender, instance, **kwargs):
+    instance._stats_previous_parent = None
+    if instance.pk and not kwargs.get('raw'):
+        instance._stats_previous_parent = Category.objects.filter(pk=instance.pk).values_list('parent_id', flat=True).first()
+
+@receiver(post_save, sender=Category)
+def update_stats_on_category_save(sender, instance, created, raw=False, **kwargs):
+    if raw:
+        return
+    if created:
+        CategoryPriceStats.objects.get_or_create(category=instance)
+        return
+    previous_parent = getattr(instance, '_stats_previous_parent', None)
+    if previous_parent != instance.parent_id:
+        # A moved subtree changes the rollups of both its old and new ancestors.
+        affected = set(category_lineage_ids(instance.pk))
+        if previous_parent:
+            affected.update(category_lineage_ids(previous_parent))
+        refresh_category_stats(affected)
+
 @receiver(post_save, sender=Order)
-def send_order_notifications(sender, instance, created, **kwargs):
+def queue_order_notification(sender, instance, created, **kwargs):
+    """Record the notification in the outbox; delivery happens in the worker."""
     if created and not instance.notification_sent:
-        logger.debug(f"Processing post_save signal for order {instance.id}. Created: {created}")
-        customer_phone = instance.customer.phone
-        admin_email = settings.ADMIN_EMAIL
-
-        # Ensure items are committed and visible
-        with transaction.atomic():
-            instance.refresh_from_db()
-            items = instance.order_items.all()
-            order_details = "\n".join(
-                f"{item.quantity} x {item.product.name} - {item.price}" for item in items
-            ) or "No items yet"
-            message = (
-                f"New order created!\nCustomer: {instance.customer.name}\n"
-                f"Total Amount: {instance.total_amount}\nTime: {instance.time}\nItems:\n{order_details}"
-            )
-
-        logger.debug(f"Order {instance.id} items count: {items.count()}, details: {order_details}")
-
-        if customer_phone:
-            try:
-                sms_response = send_sms(customer_phone, message)
-                logger.info(f"SMS sent to {customer_phone}: {sms_response}")
-                print(f"SMS sent successfully: {sms_response}")
-            except Exception as e:
-                logger.error(f"Failed to send SMS to {customer_phone}: {e}")
-                print(f"Failed to send SMS: {e}")
-
-        if admin_email:
-            try:
-                send_mail(
-                    subject=f"New Order #{instance.id} Placed",
-                    message=message,
-                    from_email=settings.DEFAULT_FROM_EMAIL,
-                    recipient_list=[admin_email],
-                    fail_silently=False,
-                )
-                logger.info(f"Email sent to admin: {admin_email}")
-                print(f"Email sent to admin: {admin_email}")
-            except Exception as e:
-                logger.error(f"Failed to send email to {admin_email}: {e}")
-                print(f"Failed to send email: {e}")
-
-        instance.notification_sent = True
-        instance.save(update_fields=['notification_sent'])
-        logger.debug(f"Order {instance.id} notification_sent set to True")
\ No newline at end of file
+        NotificationOutbox.objects.create(order=instance)
+        logger.debug("Queued notification for order %s", instance.id)
+
+def credit_sales_categories(items):
+    """Set ``category`` on new order items to their products' current
+    category, the ``DailySales`` row they will be counted in. Bulk paths call
+    this before ``bulk_create``; single saves get it from ``pre_save``."""
+    uncached = {item.product_id for item in items if not OrderItem.product.is_cached(item)}
+    categories = dict(Product.objects.filter(id__in=uncached).values_list('id', 'category_id')) if uncached else {}
+    for item in items:
+        item.category_id = item.product.category_id if OrderItem.product.is_cached(item) else categories[item.product_id]
+
+def add_to_daily_sales(items, sign=1, counted_elsewhere=()):
+    """Add (``sign=-1``: subtract) order items to the ``DailySales`` rollup.
+
+    ``items`` need their ``order`` loaded and their ``category`` credited
+    (``credit_sales_categories``); items whose category was deleted since are
+    skipped, as its rows went with it. Each (order, category) pair counts
+    once towards ``order_count``, except the ``(order_id, category_id)``
+    pairs in ``counted_elsewhere``, which other items of the order already
+    (or still) count. Runs a fixed number of queries however many items there
+    are: an insert of missing rows, a read of them and one update.
+    """
+    items = [item for item in items if item.category_id is not None]
+    if not items:
+        return
+    deltas = {}
+    orders_seen = set()
+    for item in items:
+        order = item.order
+        key = (timezone.localdate(order.time), order.customer_id, item.category_id)
+        delta = deltas.setdefault(key, [0, 0, Decimal(0)])
+        if (order.pk, key) not in orders_seen:
+            orders_seen.add((order.pk, key))
+            if (order.pk, item.category_id) not in counted_elsewhere:
+                delta[0] += 1
+        delta[1] += item.quantity
+        delta[2] += item.quantity * Decimal(str(item.price))
+
+    # Insert any missing rows first so the increments below can't race
+    # another writer creating the same row.
+    DailySales.objects.bulk_create(
+        [DailySales(day=day, customer_id=customer_id, category_id=category_id)
+         for day, customer_id, category_id in deltas],
+        ignore_conflicts=True,
+    )
+    rows = DailySales.objects.filter(
+        day__in={key[0] for key in deltas},
+        customer_id__in={key[1] for key in deltas},
+        category_id__in={key[2] for key in deltas},
+    ).only('id', 'day', 'customer_id', 'category_id')
+    updated = []
+    for row in rows:
+        delta = deltas.get((row.day, row.customer_id, row.category_id))
+        if delta is None:
+            continue
+        row.order_count = F('order_count') + sign * delta[0]
+        row.quantity = F('quantity') + sign * delta[1]
+        row.revenue = F('revenue') + Value(sign * delta[2], output_field=models.DecimalField())
+        updated.append(row)
+    DailySales.objects.bulk_update(updated, ['order_count', 'quantity', 'revenue'])
+
+def rebuild_daily_sales(start=None, end=None):
+    """Recompute ``DailySales`` for orders in ``[start, end)`` (datetimes;
+    ``None`` means unbounded) and return the number of rows written."""
+    orders = Order.objects.all()
+    if start is not None:
+        orders = orders.filter(time__gte=start)
+    if end is not None:
+        orders = orders.filter(time__lt=end)
+    # Items whose credited category was deleted have no rows, as in add_to_daily_sales.
+    totals = OrderItem.objects.filter(order__in=orders, category__isnull=False).annotate(
+        day=TruncDate('order__time'),
+        customer_ref=F('order__customer_id'),
+        category_ref=F('category_id'),
+    ).values('day', 'customer_ref', 'category_ref').annotate(
+        order_count=Count('order_id', distinct=True),
+        total_quantity=Sum('quantity'),
+        total_revenue=Sum(F('quantity') * F('price'), output_field=models.DecimalField()),
+    ).order_by()
+    stale = DailySales.objects.all()
+    if start is not None:
+        stale = stale.filter(day__gte=timezone.localdate(start))
+    if end is not None:
+        # Only whole days are rebuilt, so end is expected on a day boundary.
+        stale = stale.filter(day__lt=timezone.localdate(end))
+    # One INSERT ... SELECT: building a model instance per row dominated
+    # rebuilds over millions of order items.
+    quote = connection.ops.quote_name
+    select, params = totals.query.sql_with_params()
+    sql = 'INSERT INTO {} ({}) SELECT {} FROM ({}) totals'.format(
+        quote(DailySales._meta.db_table),
+        ', '.join(map(quote, ['day', 'customer_id', 'category_id', 'order_count', 'quantity', 'revenue'])),
+        ', '.join(map(quote, ['day', 'customer_ref', 'category_ref', 'order_count', 'total_quantity', 'total_revenue'])),
+        select,
+    )
+    with transaction.atomic(), connection.cursor() as cursor:
+        stale.delete()
+        cursor.execute(sql, params)
+        return cursor.rowcount
+
+def _counted_elsewhere(items, excluding):
+    """The (order, category) pairs of ``items`` that order items outside the
+    ``excluding`` queryset count."""
+    return set(OrderItem.objects.filter(
+        order_id__in={item.order_id for item in items},
+        category_id__in={item.category_id for item in items},
+    ).exclude(pk__in=excluding.values('pk')).values_list('order_id', 'category_id'))
+
+def _items_deleted_with(origin, instance):
+    """The order items a delete started from ``origin`` removes, or ``None``
+    when the same cascade removes their ``DailySales`` rows."""
+    is_queryset = isinstance(origin, models.QuerySet)
+    origin_model = origin.model if is_queryset else type(origin)
+    if origin_model in (Customer, Category):
+        return None
+    field = {OrderItem: 'pk', Order: 'order_id', Product: 'product_id'}.get(origin_model)
+    if field is None:
+        return OrderItem.objects.filter(pk=instance.pk)
+    if is_queryset:
+        return OrderItem.objects.filter(**{field + '__in': origin.values('pk')})
+    return OrderItem.objects.filter(**{field: origin.pk})
+
+@receiver(pre_save, sender=OrderItem)
+def remember_order_item(sender, instance, **kwargs):
+    instance._sales_previous = None
+    if kwargs.get('raw'):
+        return
+    if instance.pk:
+        instance._sales_previous = OrderItem.objects.select_related('order').filter(pk=instance.pk).first()
+    previous = instance._sales_previous
+    # A new item, or one switched to another product, is credited afresh.
+    if instance.category_id is None or (previous is not None and previous.product_id != instance.product_id):
+        instance.category_id = Product.objects.filter(pk=instance.product_id).values_list('category_id', flat=True).first()
+
+@receiver(post_save, sender=OrderItem)
+def update_sales_on_item_save(sender, instance, created, raw=False, **kwargs):
+    """Single item writes; bulk paths call ``add_to_daily_sales`` themselves."""
+    if raw:
+        return
+    previous = getattr(instance, '_sales_previous', None)
+    this = OrderItem.objects.filter(pk=instance.pk)
+    if previous is not None:
+        add_to_daily_sales([previous], sign=-1, counted_elsewhere=_counted_elsewhere([previous], this))
+    add_to_daily_sales([instance], counted_elsewhere=_counted_elsewhere([instance], this))
+
+@receiver(pre_delete, sender=OrderItem)
+def update_sales_on_item_delete(sender, instance, origin=None, **kwargs):
+    """Subtract everything a delete removes in one go, on its first item and
+    before any of them is gone; per item, an order's last items in a
+    category would each see the others and none would leave ``order_count``."""
+    if instance.pk in getattr(origin, '_sales_subtracted', ()):
+        return
+    deleted = _items_deleted_with(origin, instance)
+    if deleted is None:
+        return
+    items = list(deleted.select_related('order'))
+    if origin is not None:
+        origin._sales_subtracted = {item.pk for item in items}
+    add_to_daily_sales(items, sign=-1, counted_elsewhere=_counted_elsewhere(items, deleted))
+
+@receiver(post_save, sender=Customer)
+@receiver(post_delete, sender=Customer)
+@receiver(post_save, sender=Category)
+@receiver(post_delete, sender=Category)
+@receiver(post_save, sender=Product)
+@receiver(post_delete, sender=Product)
+def invalidate_catalog_cache(sender, **kwargs):
+    mark_catalog_changed(sender._meta.model_name)
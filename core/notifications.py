@@ -0,0 +1,381 @@
+from asgiref.sync import sync_to_async
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+import asyncio
+import smtplib
+import threading
+from django.conf import settings
+from django.core.mail import EmailMessage, get_connection
+from django.db import transaction
+from django.utils import timezone
+from .models import Order, NotificationOutbox
+from .utils.sms import send_sms
+import logging
+
+logger = logging.getLogger(__name__)
+
+def build_order_message(order):
+    """Render the notification text for an order and its items."""
+    order_details = "\n".join(
+        f"{item.quantity} x {item.product.name} - {item.price}" for item in order.order_items.all()
+    ) or "No items yet"
+    return (
+        f"New order created!\nCustomer: {order.customer.name}\n"
+        f"Total Amount: {order.total_amount}\nTime: {order.time}\nItems:\n{order_details}"
+    )
+
+def backoff_delay(attempts):
+    """Exponential backoff after ``attempts`` failed deliveries, capped."""
+    delay = settings.NOTIFICATION_BACKOFF_SECONDS * (2 ** max(attempts - 1, 0))
+    return timedelta(seconds=min(delay, settings.NOTIFICATION_MAX_BACKOFF_SECONDS))
+
+def send_admin_email(connection, subject, body):
+    """Send one admin email over an already-open backend connection."""
+    email = EmailMessage(
+        subject=subject,
+        body=body,
+        from_email=settings.DEFAULT_FROM_EMAIL,
+        to=[settings.ADMIN_EMAIL],
+        connection=connection,
+    )
+    try:
+        # Opens the session on first use; a no-op while it is alive.
+        connection.open()
+        try:
+            connection.send_messages([email])
+        except smtplib.SMTPServerDisconnected:
+            # The server dropped an idle session; reconnect once and resend.
+            connection.close()
+            connection.open()
+            connection.send_messages([email])
+    except Exception:
+        connection.close()
+        raise
+
+def deliver_notification(entry, connection, include_email=True):
+    """Send the outstanding SMS/email for one outbox entry.
+
+    Channels that already succeeded on a previous attempt are not resent.
+    With ``include_email=False`` the admin email is left for the digest.
+    Returns a list of error strings, empty when nothing failed.
+    """
+    order = entry.order
+    message = build_order_message(order)
+    errors = []
+
+    if not entry.sms_done:
+        customer_phone = order.customer.phone
+        if customer_phone:
+            try:
+                sms_response = send_sms(customer_phone, message)
+            except Exception as e:
+                sms_response = None
+                logger.error("Failed to send SMS to %s: %s", customer_phone, e)
+            if sms_response is None:
+                errors.append(f"SMS to {customer_phone} failed")
+            else:
+                entry.sms_done = True
+                logger.info("SMS sent to %s: %s", customer_phone, sms_response)
+        else:
+            entry.sms_done = True
+
+    if not entry.email_done:
+        admin_email = settings.ADMIN_EMAIL
+        if not admin_email:
+            entry.email_done = True
+        elif include_email:
+            try:
+                send_admin_email(connection, f"New Order #{order.id} Placed", message)
+                entry.email_done = True
+                logger.info("Email sent to admin: %s", admin_email)
+            except Exception as e:
+                errors.append(f"Email to {admin_email} failed: {e}")
+                logger.error("Failed to send email to %s: %s", admin_email, e)
+
+    return errors
+
+RECORD_FIELDS = ['status', 'attempts', 'sms_done', 'email_done', 'next_attempt_at', 'last_error', 'sent_at']
+
+def record_attempt(entry, errors, notes=()):
+    """Save the outcome of one delivery attempt; True once fully delivered."""
+    sent = apply_attempt(entry, errors, notes)
+    entry.save(update_fields=RECORD_FIELDS)
+    return sent
+
+def apply_attempt(entry, errors, notes=()):
+    """Set ``entry``'s fields for the outcome of one attempt without saving.
+
+    Failures back off exponentially until ``NOTIFICATION_MAX_ATTEMPTS``, then
+    the entry is marked failed. ``notes`` are kept in ``last_error`` without
+    causing a retry. Returns True once fully delivered.
+    """
+    entry.attempts += 1
+    sent = False
+    if errors:
+        entry.last_error = "; ".join([*errors, *notes])
+        if entry.attempts >= settings.NOTIFICATION_MAX_ATTEMPTS:
+            entry.status = NotificationOutbox.STATUS_FAILED
+            logger.error("Giving up on notification for order %s: %s", entry.order_id, entry.last_error)
+        else:
+            entry.next_attempt_at = timezone.now() + backoff_delay(entry.attempts)
+    elif entry.sms_done and entry.email_done:
+        entry.status = NotificationOutbox.STATUS_SENT
+        entry.sent_at = timezone.now()
+        entry.last_error = "; ".join(notes)
+        sent = True
+    else:
+        # Only the digest email is left; release the lease so it is due for it.
+        entry.next_attempt_at = timezone.now()
+    return sent
+
+def lease_due(due, batch_size, *ordering):
+    """Lease up to ``batch_size`` entries of the ``due`` queryset and return
+    the ids actually leased.
+
+    The lease is a conditional update on ``due``, so of two workers racing
+    for an entry only one moves it forward; ``select_for_update`` spares the
+    race where the database has row locks, but SQLite ignores it. When fewer
+    rows moved than were picked, this worker's exact lease expiry tells which
+    ones it holds.
+    """
+    with transaction.atomic():
+        ids = list(due.select_for_update(skip_locked=True).order_by(*ordering).values_list('id', flat=True)[:batch_size])
+        if not ids:
+            return []
+        lease_until = timezone.now() + timedelta(seconds=settings.NOTIFICATION_LEASE_SECONDS)
+        leased = due.filter(id__in=ids).update(next_attempt_at=lease_until)
+    if leased == len(ids):
+        return ids
+    return list(NotificationOutbox.objects.filter(id__in=ids, next_attempt_at=lease_until).values_list('id', flat=True))
+
+def claim_batch(batch_size, exclude_awaiting_digest=False):
+    """Lease up to ``batch_size`` due entries so concurrent workers skip them."""
+    due = NotificationOutbox.objects.filter(status=NotificationOutbox.STATUS_PENDING, next_attempt_at__lte=timezone.now())
+    if exclude_awaiting_digest:
+        # Entries whose SMS is done only wait on the digest email.
+        due = due.filter(sms_done=False)
+    return lease_due(due, batch_size, 'next_attempt_at', 'id')
+
+def process_outbox(batch_size=None, connection=None):
+    """Deliver one batch of due notifications. Returns the number of entries
+    claimed; a digest email is the second step of entries already counted
+    then, so it adds nothing.
+
+    ``connection`` is an email backend connection to reuse; the worker command
+    keeps one open for its lifetime. Without it a connection is opened for
+    this batch only.
+    """
+    batch_size = batch_size or settings.NOTIFICATION_BATCH_SIZE
+    digest = settings.NOTIFICATION_EMAIL_DIGEST
+    if connection is None:
+        connection = get_connection(fail_silently=False)
+        try:
+            return process_outbox(batch_size, connection)
+        finally:
+            connection.close()
+
+    processed = 0
+    ids = claim_batch(batch_size, exclude_awaiting_digest=digest)
+    if ids:
+        entries = (
+            NotificationOutbox.objects.filter(id__in=ids)
+            .select_related('order__customer')
+            .prefetch_related('order__order_items__product')
+            .order_by('id')
+        )
+        sent_order_ids = []
+        for entry in entries:
+            errors = deliver_notification(entry, connection, include_email=not digest)
+            if record_attempt(entry, errors):
+                sent_order_ids.append(entry.order_id)
+        if sent_order_ids:
+            Order.objects.filter(id__in=sent_order_ids).update(notification_sent=True)
+        logger.debug("Processed %d notifications, %d delivered", len(ids), len(sent_order_ids))
+        processed += len(ids)
+
+    if digest:
+        flush_email_digest(connection)
+    return processed
+
+def flush_email_digest(connection, force=False):
+    """Roll the admin emails waiting on the digest into combined messages.
+
+    A digest goes out once ``NOTIFICATION_DIGEST_MAX_ORDERS`` orders are
+    waiting or the oldest has waited ``NOTIFICATION_DIGEST_MAX_SECONDS``. A
+    failed send counts as an attempt for every entry in it, with the same
+    backoff and attempt cap as a single delivery (``apply_attempt``).
+    Returns the number of orders included.
+    """
+    max_orders = settings.NOTIFICATION_DIGEST_MAX_ORDERS
+    waiting = NotificationOutbox.objects.filter(
+        status=NotificationOutbox.STATUS_PENDING, sms_done=True, email_done=False,
+        next_attempt_at__lte=timezone.now(),
+    ).order_by('created_at', 'id')
+    if not force:
+        oldest = waiting.values_list('created_at', flat=True).first()
+        if oldest is None:
+            return 0
+        deadline = timezone.now() - timedelta(seconds=settings.NOTIFICATION_DIGEST_MAX_SECONDS)
+        if oldest > deadline and waiting.count() < max_orders:
+            return 0
+
+    flushed = 0
+    while True:
+        ids = lease_due(waiting, max_orders, 'created_at', 'id')
+        if not ids:
+            break
+        entries = list(
+            NotificationOutbox.objects.filter(id__in=ids)
+            .select_related('order__customer')
+            .prefetch_related('order__order_items__product')
+            .order_by('created_at', 'id')
+        )
+        body = "\n\n".join(build_order_message(entry.order) for entry in entries)
+        try:
+            send_admin_email(connection, f"{len(entries)} New Orders Placed", body)
+        except Exception as e:
+            logger.error("Failed to send order digest to %s: %s", settings.ADMIN_EMAIL, e)
+            for entry in entries:
+                apply_attempt(entry, [f"Digest email to {settings.ADMIN_EMAIL} failed: {e}"])
+            NotificationOutbox.objects.bulk_update(entries, RECORD_FIELDS)
+            break
+        with transaction.atomic():
+            now = timezone.now()
+            NotificationOutbox.objects.filter(id__in=[entry.id for entry in entries]).update(
+                email_done=True, status=NotificationOutbox.STATUS_SENT, sent_at=now, last_error=''
+            )
+            Order.objects.filter(id__in=[entry.order_id for entry in entries]).update(notification_sent=True)
+        logger.info("Order digest for %d orders sent to admin: %s", len(entries), settings.ADMIN_EMAIL)
+        flushed += len(entries)
+        if len(entries) < max_orders:
+            break
+    return flushed
+
+def claim_entry(order_id):
+    """Lease the fresh outbox entry of ``order_id`` for immediate delivery.
+
+    Returns the entry, loaded with what ``build_order_message`` needs, or
+    None when a worker already holds it.
+    """
+    now = timezone.now()
+    lease_until = now + timedelta(seconds=settings.NOTIFICATION_LEASE_SECONDS)
+    claimed = NotificationOutbox.objects.filter(
+        order_id=order_id, status=NotificationOutbox.STATUS_PENDING, attempts=0, next_attempt_at__lte=now
+    ).update(next_attempt_at=lease_until)
+    if not claimed:
+        return None
+    return (
+        NotificationOutbox.objects.select_related('order__customer')
+        .prefetch_related('order__order_items__product')
+        .get(order_id=order_id)
+    )
+
+def finish_entry(entry, errors, notes=()):
+    if record_attempt(entry, errors, notes):
+        Order.objects.filter(id=entry.order_id).update(notification_sent=True)
+
+def send_admin_email_now(subject, body):
+    """Send one admin email over a connection of its own."""
+    connection = get_connection(fail_silently=False, timeout=settings.NOTIFICATION_EMAIL_TIMEOUT)
+    try:
+        send_admin_email(connection, subject, body)
+    finally:
+        connection.close()
+
+class OutcomeUnknown(Exception):
+    """A provider call timed out while running; it may still have succeeded."""
+
+_executor = None
+_executor_lock = threading.Lock()
+
+def _notification_executor():
+    """Pool for the blocking SMS/SMTP clients, capped at
+    ``NOTIFICATION_MAX_THREADS`` so calls left hanging on a slow provider
+    cannot use up the loop's default executor."""
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(max_workers=settings.NOTIFICATION_MAX_THREADS,
+                                           thread_name_prefix='notifications')
+        return _executor
+
+async def _run_with_timeout(timeout, func, *args):
+    """Run ``func`` on the notification pool, waiting at most ``timeout``.
+
+    A call still queued at the timeout is cancelled and raises
+    ``asyncio.TimeoutError``. One already running cannot be stopped and may
+    still get through, so it raises ``OutcomeUnknown``; its thread ends at
+    the client's own socket timeout.
+    """
+    future = _notification_executor().submit(func, *args)
+    try:
+        return await asyncio.wait_for(asyncio.wrap_future(future), timeout)
+    except asyncio.TimeoutError:
+        if future.cancel():
+            raise
+        if future.done():
+            return future.result()
+        raise OutcomeUnknown from None
+
+async def notify_order_now(order_id):
+    """Deliver a new order's SMS and admin email concurrently.
+
+    Each call is bounded by its own timeout (``NOTIFICATION_SMS_TIMEOUT``,
+    ``NOTIFICATION_EMAIL_TIMEOUT``), so a slow provider costs at most its
+    timeout and does not delay the other. The attempt is recorded on the
+    outbox entry like a worker attempt: channels that failed, or timed out
+    before they started, are retried by ``process_notifications``. A call
+    that timed out mid-flight may still have been delivered, so it is noted
+    in ``last_error`` and not retried rather than risk a duplicate SMS or
+    email. Returns the list of errors, or None when the entry was already
+    claimed by a worker.
+    """
+    entry = await sync_to_async(claim_entry)(order_id)
+    if entry is None:
+        return None
+    order = entry.order
+    message = build_order_message(order)
+
+    calls = {}
+    customer_phone = order.customer.phone
+    if not customer_phone:
+        entry.sms_done = True
+    else:
+        calls['sms'] = (
+            f"SMS to {customer_phone}", settings.NOTIFICATION_SMS_TIMEOUT, send_sms, customer_phone, message
+        )
+    admin_email = settings.ADMIN_EMAIL
+    if not admin_email:
+        entry.email_done = True
+    elif not settings.NOTIFICATION_EMAIL_DIGEST:
+        calls['email'] = (
+            f"Email to {admin_email}", settings.NOTIFICATION_EMAIL_TIMEOUT,
+            send_admin_email_now, f"New Order #{order.id} Placed", message,
+        )
+
+    results = await asyncio.gather(
+        *(_run_with_timeout(timeout, func, *args) for _, timeout, func, *args in calls.values()),
+        return_exceptions=True,
+    )
+    errors = []
+    notes = []
+    for (channel, (label, timeout, *_)), result in zip(calls.items(), results):
+        if isinstance(result, OutcomeUnknown):
+            notes.append(f"{label} timed out after {timeout}s in flight, outcome unknown; not retried")
+            setattr(entry, f'{channel}_done', True)
+        elif isinstance(result, asyncio.TimeoutError):
+            errors.append(f"{label} timed out after {timeout}s before it started")
+        elif isinstance(result, Exception):
+            errors.append(f"{label} failed: {result}")
+        elif channel == 'sms' and result is None:
+            # send_sms reports provider errors by returning None.
+            errors.append(f"{label} failed")
+        else:
+            setattr(entry, f'{channel}_done', True)
+    for error in errors:
+        logger.error("Order %s: %s", order.id, error)
+    for note in notes:
+        logger.warning("Order %s: %s", order.id, note)
+
+    await sync_to_async(finish_entry)(entry, errors, notes)
+    return errors
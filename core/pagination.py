@@ -0,0 +1,18 @@
+from django.conf import settings
+from rest_framework.pagination import CursorPagination
+
+
+class IdCursorPagination(CursorPagination):
+    """Keyset pagination on the primary key, newest rows first.
+
+    Cursors encode the last seen key rather than an offset, so page cost does
+    not grow with table size and rows inserted while a client is iterating do
+    not shift the pages it has yet to read.
+    """
+    ordering = '-id'
+    page_size_query_param = 'page_size'
+    max_page_size = settings.API_MAX_PAGE_SIZE
+
+
+class OrderCursorPagination(IdCursorPagination):
+    ordering = ('-time', '-id')
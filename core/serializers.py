@@ -1,5 +1,8 @@
+from django.db import transaction
 from rest_framework import serializers
-from .models import Customer, Category, Product, Order, OrderItem
+from .models import (
+    Customer, Category, CategoryPriceStats, Product, Order, OrderItem, add_to_daily_sales, credit_sales_categories,
+)
 
 class CustomerSerializer(serializers.ModelSerializer):
     class Meta:
@@ -11,6 +14,13 @@ class CustomerSerializer(serializers.ModelSerializer):
             raise serializers.ValidationError("Code is required.")
         return value
 
+class CustomerBatchSerializer(CustomerSerializer):
+    """Row serializer for batch writes; code uniqueness is checked for the
+    whole batch with one query instead of once per row."""
+
+    class Meta(CustomerSerializer.Meta):
+        extra_kwargs = {'code': {'validators': []}}
+
 class CategorySerializer(serializers.ModelSerializer):
     class Meta:
         model = Category
@@ -21,6 +31,14 @@ class CategorySerializer(serializers.ModelSerializer):
             raise serializers.ValidationError("Name is required.")
         return value
 
+class CategoryPriceStatsSerializer(serializers.ModelSerializer):
+    category_name = serializers.CharField(source='category.name', read_only=True)
+    average_price = serializers.DecimalField(max_digits=10, decimal_places=2, read_only=True)
+
+    class Meta:
+        model = CategoryPriceStats
+        fields = ['category', 'category_name', 'product_count', 'price_sum', 'min_price', 'max_price', 'average_price']
+
 class ProductSerializer(serializers.ModelSerializer):
     class Meta:
         model = Product
@@ -31,10 +49,48 @@ class ProductSerializer(serializers.ModelSerializer):
             raise serializers.ValidationError("Name and price are required.")
         return data
 
+class BulkPrimaryKeyRelatedField(serializers.PrimaryKeyRelatedField):
+    """Related field that can resolve the ids of a whole batch in one query."""
+
+    def prefetch(self, pks):
+        valid_pks = set()
+        for pk in pks:
+            if isinstance(pk, bool):
+                continue
+            try:
+                valid_pks.add(int(pk))
+            except (TypeError, ValueError):
+                continue
+        self._prefetched = self.get_queryset().in_bulk(valid_pks)
+
+    def to_internal_value(self, data):
+        instances = getattr(self, '_prefetched', None)
+        if instances is not None and not isinstance(data, bool):
+            try:
+                return instances[int(data)]
+            except (KeyError, TypeError, ValueError):
+                pass
+        # Unknown or malformed ids fall through for the standard error message.
+        return super().to_internal_value(data)
+
+class ProductBatchSerializer(ProductSerializer):
+    """Row serializer for batch writes; categories are prefetched per batch."""
+    category = BulkPrimaryKeyRelatedField(queryset=Category.objects.all())
+
+class OrderItemListSerializer(serializers.ListSerializer):
+    def to_internal_value(self, data):
+        if isinstance(data, list):
+            product_ids = [item.get('product') for item in data if isinstance(item, dict)]
+            self.child.fields['product'].prefetch(product_ids)
+        return super().to_internal_value(data)
+
 class OrderItemSerializer(serializers.ModelSerializer):
+    product = BulkPrimaryKeyRelatedField(queryset=Product.objects.all())
+
     class Meta:
         model = OrderItem
         fields = ['product', 'quantity', 'price']
+        list_serializer_class = OrderItemListSerializer
 
 class OrderSerializer(serializers.ModelSerializer):
     order_items = OrderItemSerializer(many=True, required=True)
@@ -42,6 +98,7 @@ class OrderSerializer(serializers.ModelSerializer):
     class Meta:
         model = Order
         fields = ['id', 'customer', 'total_amount', 'time', 'order_items']
+        read_only_fields = ['time']
 
     def validate(self, data):
         # Ensure order_items is not empty
@@ -56,8 +113,11 @@ class OrderSerializer(serializers.ModelSerializer):
 
     def create(self, validated_data):
         order_items_data = validated_data.pop('order_items')
-        # Create order with calculated total_amount
-        order = Order.objects.create(**validated_data)
-        for item_data in order_items_data:
-            OrderItem.objects.create(order=order, **item_data)
-        return order
\ No newline at end of file
+        # total_amount was already computed in validate(), so the order is written once
+        with transaction.atomic():
+            order = Order.objects.create(**validated_data)
+            order_items = [OrderItem(order=order, **item_data) for item_data in order_items_data]
+            credit_sales_categories(order_items)
+            OrderItem.objects.bulk_create(order_items)
+            add_to_daily_sales(order_items)
+        return order
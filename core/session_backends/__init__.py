@@ -0,0 +1,34 @@
+"""Session engines that only persist a session when its contents change.
+
+Django marks a session as modified on every assignment, even when the value
+written is the same as the one already stored, and ``SessionMiddleware``
+then saves it. These engines compare the session against the snapshot taken
+when it was loaded, so rewriting identical data (or only reading it) does
+not cost a write or a new ``Set-Cookie`` header.
+
+Use them via ``SESSION_ENGINE``, e.g. ``core.session_backends.signed_cookies``.
+"""
+
+
+class CoalescingSessionMixin:
+    _loaded_snapshot = None
+
+    def load(self):
+        data = super().load()
+        self._loaded_snapshot = (self._session_key, self.serializer().dumps(data))
+        return data
+
+    @property
+    def modified(self):
+        if not self._modified:
+            return False
+        if self._loaded_snapshot is None:
+            return True
+        session_key, dumped = self._loaded_snapshot
+        if session_key != self._session_key:
+            return True
+        return self.serializer().dumps(self._session_cache) != dumped
+
+    @modified.setter
+    def modified(self, value):
+        self._modified = value
@@ -1,15 +1,43 @@
-from django.test import TestCase, Client
+from django.test import TestCase, TransactionTestCase, Client, override_settings
+from django.test.utils import CaptureQueriesContext
 from django.urls import reverse
 from django.conf import settings
 from django.core import mail
+from django.core.cache import caches
+from django.core.mail import get_connection
 from django.contrib.auth.models import User
 from rest_framework.test import APIClient
-from core.models import Customer, Category, Product, Order, OrderItem
-from core.utils.sms import send_sms
+from core.models import CatalogVersion, Customer, Category, CategoryPriceStats, DailySales, Product, Order, OrderItem, NotificationOutbox
+from core.notifications import claim_batch, process_outbox, send_admin_email
+from core.views import ReportViewSet, prefix_search
+from core.instrumentation import render_metrics, reset_metrics
+from customer_order_api.log import BatchedWatchedFileHandler, queued_handler, restart_after_fork
+from core.catalog_cache import catalog_cache_stats, reset_catalog_cache_stats
+from core.checks import check_local_jwt_validation
+from core.utils.sms import send_sms, send_bulk_sms
+from core.utils.fake_sms import FakeSMSServer
+from core.utils.fake_oidc import FakeOIDCProvider
+from core.utils.fake_smtp import FakeSMTPServer
+from core.utils.query_budget import constant, per_row, query_budget
 from unittest.mock import patch
+from decimal import Decimal
+from datetime import timedelta
+from unittest import skipUnless
+from base64 import urlsafe_b64encode
+import json
 import logging
-from django.db import transaction
+import os
+import shutil
+import smtplib
+import tempfile
+import threading
+from io import StringIO
+from django.core.management import CommandError, call_command
+from django.db import DatabaseError, connection, connections, transaction
+from customer_order_api.database import read_replica
+from django.db.models import F, QuerySet, Sum
 from django.db.models.signals import post_save
+from django.utils import timezone
 
 logger = logging.getLogger(__name__)
 
@@ -66,7 +94,7 @@ class CustomerOrderTestCase(TestCase):
         self.assertEqual(order.order_items.count(), 1)
         self.assertEqual(order.order_items.first().product, self.product)
 
-    @patch('core.models.send_order_notifications')
+    @patch('core.models.queue_order_notification')
     @patch('core.utils.sms.send_sms')
     def test_order_sms_notification(self, mock_send_sms, mock_send_notifications):
         mock_send_sms.return_value = {"status": "success"}
@@ -90,7 +118,7 @@ class CustomerOrderTestCase(TestCase):
         self.assertIn("New order created!", args[1])
         self.assertIn("White Bread", args[1])
 
-    @patch('core.models.send_order_notifications')
+    @patch('core.models.queue_order_notification')
     def test_order_email_notification(self, mock_send_notifications):
         # Clear outbox at the start of the test
         mail.outbox = []
@@ -120,6 +148,106 @@ class CustomerOrderTestCase(TestCase):
         self.assertEqual(email.to, [settings.ADMIN_EMAIL])
         self.assertIn("White Bread", email.body)
 
+    def test_process_outbox_reuses_one_email_connection(self):
+        for _ in range(3):
+            Order.objects.create(customer=self.customer)
+        with patch('core.notifications.send_sms', return_value={"status": "success"}), \
+                patch('django.core.mail.backends.locmem.EmailBackend.open') as mock_open, \
+                patch('django.core.mail.backends.locmem.EmailBackend.close') as mock_close:
+            connection = get_connection()
+            process_outbox(connection=connection)
+        self.assertTrue(mock_open.called)
+        self.assertEqual(mock_close.call_count, 0)
+        self.assertEqual(NotificationOutbox.objects.filter(status=NotificationOutbox.STATUS_SENT).count(), 4)
+
+    @override_settings(NOTIFICATION_EMAIL_DIGEST=True, NOTIFICATION_DIGEST_MAX_ORDERS=3)
+    def test_email_digest(self):
+        mail.outbox = []
+        with patch('core.notifications.send_sms', return_value={"status": "success"}):
+            process_outbox()
+            # Only one order is waiting and it is not old enough yet.
+            self.assertEqual(len(mail.outbox), 0)
+            self.assertEqual(NotificationOutbox.objects.get(order=self.order).status, NotificationOutbox.STATUS_PENDING)
+            for _ in range(2):
+                Order.objects.create(customer=self.customer)
+            process_outbox()
+        self.assertEqual(len(mail.outbox), 1)
+        self.assertEqual(mail.outbox[0].subject, "3 New Orders Placed")
+        self.assertEqual(Order.objects.filter(notification_sent=True).count(), 3)
+
+    @override_settings(NOTIFICATION_EMAIL_DIGEST=True, NOTIFICATION_DIGEST_MAX_ORDERS=1, NOTIFICATION_MAX_ATTEMPTS=3)
+    def test_failed_email_digest_backs_off_then_gives_up(self):
+        with patch('core.notifications.send_sms', return_value={"status": "success"}), \
+                patch('core.notifications.send_admin_email', side_effect=smtplib.SMTPException("down")) as mock_send:
+            process_outbox()
+            entry = NotificationOutbox.objects.get(order=self.order)
+            self.assertEqual((entry.status, entry.attempts), (NotificationOutbox.STATUS_PENDING, 2))
+            self.assertIn("Digest email", entry.last_error)
+            self.assertGreater(entry.next_attempt_at, timezone.now())
+            # Not retried on every poll while backing off
+            process_outbox()
+            self.assertEqual(mock_send.call_count, 1)
+
+            NotificationOutbox.objects.update(next_attempt_at=timezone.now())
+            process_outbox()
+        self.assertEqual(mock_send.call_count, 2)
+        entry.refresh_from_db()
+        self.assertEqual((entry.status, entry.attempts), (NotificationOutbox.STATUS_FAILED, 3))
+
+    @override_settings(NOTIFICATION_EMAIL_DIGEST=True)
+    def test_process_notifications_counts_digest_orders_once(self):
+        mail.outbox = []
+        out = StringIO()
+        with patch('core.notifications.send_sms', return_value={"status": "success"}):
+            call_command('process_notifications', '--once', '--flush-digest', stdout=out)
+        self.assertEqual(len(mail.outbox), 1)
+        self.assertIn("Processed 1 notifications", out.getvalue())
+
+    def test_claim_batch_skips_entries_another_worker_leased(self):
+        taken = NotificationOutbox.objects.get(order=self.order)
+        other = Order.objects.create(customer=self.customer, total_amount=5.00)
+        original_update = QuerySet.update
+        rival = []
+
+        def rival_leases_first(queryset, **kwargs):
+            # Another worker leases ``taken`` between this one's read and update,
+            # as can happen on SQLite, which has no row locks.
+            if not rival:
+                rival.append(original_update(NotificationOutbox.objects.filter(pk=taken.pk),
+                                             next_attempt_at=timezone.now() + timedelta(minutes=5)))
+            return original_update(queryset, **kwargs)
+
+        with patch.object(QuerySet, 'update', autospec=True, side_effect=rival_leases_first):
+            ids = claim_batch(10)
+        self.assertEqual(ids, [other.notifications.get().pk])
+
+    def test_process_notifications_survives_database_errors(self):
+        out = StringIO()
+        with patch('core.management.commands.process_notifications.process_outbox',
+                   side_effect=[DatabaseError('database is locked'), 1, 0]), \
+                patch('core.management.commands.process_notifications.time.sleep') as mock_sleep, \
+                self.assertLogs('core.management.commands.process_notifications', 'ERROR') as logs:
+            call_command('process_notifications', '--once', stdout=out)
+        self.assertEqual(mock_sleep.call_count, 1)
+        self.assertIn('database is locked', logs.output[0])
+        self.assertIn("Processed 1 notifications", out.getvalue())
+
+    def test_sms_client_reuses_connection(self):
+        with FakeSMSServer() as server, override_settings(AFRICASTALKING_API_URL=server.url):
+            self.assertIsNotNone(send_sms(self.customer.phone, "first"))
+            self.assertIsNotNone(send_sms(self.customer.phone, "second"))
+        self.assertEqual(len(server.requests), 2)
+        self.assertEqual(server.requests[0]['client'], server.requests[1]['client'])
+        self.assertEqual(server.requests[1]['data']['message'], "second")
+
+    def test_send_bulk_sms_is_one_provider_call(self):
+        recipients = ["+254700000001", "+254700000002"]
+        with FakeSMSServer() as server, override_settings(AFRICASTALKING_API_URL=server.url):
+            response = send_bulk_sms(recipients, "Sale today")
+        self.assertEqual(len(server.requests), 1)
+        self.assertEqual(server.requests[0]['data']['to'], ",".join(recipients))
+        self.assertEqual(len(response['SMSMessageData']['Recipients']), 2)
+
     def test_category_average_price_api(self):
         response = self.api_client.get(
             reverse('order-category-average-price', kwargs={'category_id': self.bakery.id})
@@ -127,12 +255,81 @@ class CustomerOrderTestCase(TestCase):
         self.assertEqual(response.status_code, 200)
         self.assertEqual(response.data['average_price'], 5.00)
 
+    def test_category_price_stats_follow_product_changes(self):
+        cake = Product.objects.create(name="Cake", category=self.bakery, price=15.00)
+        stats = CategoryPriceStats.objects.get(category=self.category)
+        self.assertEqual(stats.product_count, 2)
+        self.assertEqual(stats.average_price, Decimal('10.00'))
+        self.assertEqual(stats.min_price, Decimal('5.00'))
+        self.assertEqual(stats.max_price, Decimal('15.00'))
+
+        cake.price = 25.00
+        cake.save()
+        self.assertEqual(CategoryPriceStats.objects.get(category=self.bakery).max_price, Decimal('25.00'))
+        self.assertEqual(CategoryPriceStats.objects.get(category=self.bread).product_count, 1)
+
+        self.product.delete()
+        for category in (self.category, self.bakery):
+            stats = CategoryPriceStats.objects.get(category=category)
+            self.assertEqual(stats.product_count, 1)
+            self.assertEqual(stats.min_price, Decimal('25.00'))
+        stats = CategoryPriceStats.objects.get(category=self.bread)
+        self.assertEqual(stats.product_count, 0)
+        self.assertIsNone(stats.min_price)
+
+    def test_category_price_stats_follow_category_moves(self):
+        pastry = Category.objects.create(name="Pastry")
+        self.bread.parent = pastry
+        self.bread.save()
+        self.assertEqual(CategoryPriceStats.objects.get(category=pastry).product_count, 1)
+        self.assertEqual(CategoryPriceStats.objects.get(category=self.bakery).product_count, 0)
+
+    def test_category_price_stats_api(self):
+        response = self.api_client.get(
+            reverse('category-price-stats') + f'?ids={self.category.id},{self.bread.id}'
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.data), 2)
+        self.assertEqual({row['product_count'] for row in response.data}, {1})
+        response = self.api_client.get(reverse('category-price-stats') + '?ids=a')
+        self.assertEqual(response.status_code, 400)
+
     def test_login_and_navigation(self):
         response = self.client.get(reverse('home'))
         self.assertEqual(response.status_code, 200)
         response = self.client.get(reverse('customers'))
         self.assertEqual(response.status_code, 200)
 
+    def test_list_views_query_count_is_constant(self):
+        def render_lists():
+            counts = {}
+            for name in ('orders', 'customers', 'products', 'categories'):
+                with CaptureQueriesContext(connection) as ctx:
+                    response = self.client.get(reverse(name))
+                self.assertEqual(response.status_code, 200)
+                counts[name] = len(ctx.captured_queries)
+            return counts
+
+        baseline = render_lists()
+        for i in range(5):
+            customer = Customer.objects.create(name=f"Customer {i}", code=f"C{i:03d}")
+            product = Product.objects.create(name=f"Cake {i}", category=self.bakery, price=3.00)
+            Category.objects.create(name=f"Sub {i}", parent=self.bread)
+            order = Order.objects.create(customer=customer)
+            OrderItem.objects.create(order=order, product=product, quantity=1, price=3.00)
+            OrderItem.objects.create(order=order, product=self.product, quantity=1, price=5.00)
+        self.assertEqual(render_lists(), baseline)
+
+    @override_settings(LIST_PAGE_SIZE=2)
+    def test_order_list_view_is_paginated(self):
+        for _ in range(3):
+            Order.objects.create(customer=self.customer)
+        response = self.client.get(reverse('orders'))
+        self.assertEqual(len(response.context['orders']), 2)
+        self.assertContains(response, "Page 1 of 2")
+        response = self.client.get(reverse('orders') + '?page=2')
+        self.assertEqual(len(response.context['orders']), 2)
+
     def test_customer_create_view(self):
         response = self.client.post(
             reverse('customer_add'),
@@ -200,6 +397,33 @@ class CustomerOrderTestCase(TestCase):
         self.assertEqual(order.order_items.count(), 1)
         self.assertEqual(order.order_items.first().quantity, 2)
 
+    def test_order_create_view_post_multiple_products(self):
+        roll = Product.objects.create(name="Roll", category=self.bread, price=1.50)
+        response = self.client.post(
+            reverse('order_add'),
+            {
+                'customer': self.customer.id,
+                'products': [self.product.id, roll.id],
+                f'quantity_{self.product.id}': '2',
+                f'quantity_{roll.id}': '4'
+            }
+        )
+        self.assertEqual(response.status_code, 302)
+        order = Order.objects.filter(customer=self.customer).last()
+        self.assertEqual(order.total_amount, 16.00)
+        self.assertEqual(order.order_items.count(), 2)
+        self.assertEqual(NotificationOutbox.objects.filter(order=order).count(), 1)
+
+    def test_order_create_view_post_unknown_product(self):
+        orders_before = Order.objects.count()
+        response = self.client.post(
+            reverse('order_add'),
+            {'customer': self.customer.id, 'products': [self.product.id, 9999]}
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertContains(response, "Error adding order")
+        self.assertEqual(Order.objects.count(), orders_before)
+
     def test_order_create_view_post_invalid(self):
         response = self.client.post(
             reverse('order_add'),
@@ -268,21 +492,633 @@ class CustomerOrderTestCase(TestCase):
         self.assertEqual(order.order_items.count(), 1)
         self.assertEqual(order.order_items.first().quantity, 2)
 
-    def test_sms_failure(self):
-        with patch('core.utils.sms.send_sms', side_effect=Exception('SMS failed')):
+    def test_api_order_list_is_cursor_paginated(self):
+        for _ in range(4):
+            Order.objects.create(customer=self.customer)
+        seen = []
+        url = reverse('order-list') + '?page_size=2'
+        while url:
+            response = self.api_client.get(url)
+            self.assertEqual(response.status_code, 200)
+            self.assertLessEqual(len(response.data['results']), 2)
+            seen.extend(order['id'] for order in response.data['results'])
+            url = response.data['next']
+        self.assertEqual(sorted(seen), sorted(Order.objects.values_list('id', flat=True)))
+
+    def test_api_page_size_is_capped(self):
+        Customer.objects.create(name="Jane Roe", code="JR001")
+        with patch('core.pagination.IdCursorPagination.max_page_size', 1):
+            response = self.api_client.get(reverse('customer-list') + '?page_size=100')
+        self.assertEqual(len(response.data['results']), 1)
+
+    def test_api_order_list_query_count_is_constant(self):
+        def list_orders():
+            with CaptureQueriesContext(connection) as ctx:
+                response = self.api_client.get(reverse('order-list'))
+            self.assertEqual(response.status_code, 200)
+            return len(ctx.captured_queries)
+
+        baseline = list_orders()
+        for _ in range(5):
             order = Order.objects.create(customer=self.customer)
-            OrderItem.objects.create(order=order, product=self.product, quantity=2, price=5.00)
-            order.total_amount = 10.00
-            order.save()
-            self.assertTrue(order.notification_sent)
+            OrderItem.objects.create(order=order, product=self.product, quantity=1, price=5.00)
+        self.assertEqual(list_orders(), baseline)
 
-    def test_email_failure(self):
-        with patch('django.core.mail.send_mail', side_effect=Exception('Email failed')):
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.api_client.get(reverse('order-detail', kwargs={'pk': self.order.id}))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.data['order_items']), 1)
+        self.assertLessEqual(len(ctx.captured_queries), baseline)
+
+    def test_api_order_create_query_count_is_constant(self):
+        products = [
+            Product.objects.create(name=f"Roll {i}", category=self.bread, price=1.00) for i in range(10)
+        ]
+
+        def create_order(items):
+            payload = {
+                'customer': self.customer.id,
+                'order_items': [{'product': p.id, 'quantity': 1, 'price': 1.00} for p in items],
+            }
+            with CaptureQueriesContext(connection) as ctx:
+                response = self.api_client.post(reverse('order-list'), payload, format='json')
+            self.assertEqual(response.status_code, 201)
+            return len(ctx.captured_queries)
+
+        self.assertEqual(create_order(products[:1]), create_order(products))
+        order = Order.objects.filter(customer=self.customer).last()
+        self.assertEqual(order.order_items.count(), 10)
+        self.assertEqual(order.total_amount, 10.00)
+
+    def test_api_order_create_unknown_product(self):
+        response = self.api_client.post(
+            reverse('order-list'),
+            {'customer': self.customer.id, 'order_items': [{'product': 9999, 'quantity': 1, 'price': 1.00}]},
+            format='json'
+        )
+        self.assertEqual(response.status_code, 400)
+
+    def test_order_creation_queues_notification(self):
+        with patch('core.notifications.send_sms') as mock_send_sms:
             order = Order.objects.create(customer=self.customer)
-            OrderItem.objects.create(order=order, product=self.product, quantity=2, price=5.00)
-            order.total_amount = 10.00
-            order.save()
-            self.assertTrue(order.notification_sent)
+            mock_send_sms.assert_not_called()
+        entry = NotificationOutbox.objects.get(order=order)
+        self.assertEqual(entry.status, NotificationOutbox.STATUS_PENDING)
+        self.assertFalse(order.notification_sent)
+
+    def test_process_outbox_delivers_notifications(self):
+        mail.outbox = []
+        order = Order.objects.create(customer=self.customer, total_amount=10.00)
+        OrderItem.objects.create(order=order, product=self.product, quantity=2, price=5.00)
+        with patch('core.notifications.send_sms', return_value={"status": "success"}) as mock_send_sms:
+            process_outbox()
+        args, kwargs = mock_send_sms.call_args
+        self.assertEqual(args[0], self.customer.phone)
+        self.assertIn("2 x White Bread", args[1])
+        subjects = [email.subject for email in mail.outbox]
+        self.assertIn(f"New Order #{order.id} Placed", subjects)
+        entry = NotificationOutbox.objects.get(order=order)
+        self.assertEqual(entry.status, NotificationOutbox.STATUS_SENT)
+        order.refresh_from_db()
+        self.assertTrue(order.notification_sent)
+
+    def test_sms_failure(self):
+        mail.outbox = []
+        order = Order.objects.create(customer=self.customer)
+        with patch('core.notifications.send_sms', side_effect=Exception('SMS failed')):
+            process_outbox()
+        entry = NotificationOutbox.objects.get(order=order)
+        self.assertEqual(entry.status, NotificationOutbox.STATUS_PENDING)
+        self.assertEqual(entry.attempts, 1)
+        self.assertTrue(entry.email_done)
+        self.assertFalse(entry.sms_done)
+        self.assertGreater(entry.next_attempt_at, timezone.now())
+        order.refresh_from_db()
+        self.assertFalse(order.notification_sent)
+
+        # The retry only resends the channel that failed.
+        emails_sent = len(mail.outbox)
+        NotificationOutbox.objects.filter(id=entry.id).update(next_attempt_at=timezone.now())
+        with patch('core.notifications.send_sms', return_value={"status": "success"}):
+            process_outbox()
+        entry.refresh_from_db()
+        self.assertEqual(entry.status, NotificationOutbox.STATUS_SENT)
+        self.assertEqual(len(mail.outbox), emails_sent)
+        order.refresh_from_db()
+        self.assertTrue(order.notification_sent)
+
+    @override_settings(NOTIFICATION_MAX_ATTEMPTS=1)
+    def test_email_failure(self):
+        order = Order.objects.create(customer=self.customer)
+        with patch('core.notifications.send_sms', return_value={"status": "success"}), \
+                patch('django.core.mail.backends.locmem.EmailBackend.send_messages',
+                      side_effect=Exception('Email failed')):
+            process_outbox()
+        entry = NotificationOutbox.objects.get(order=order)
+        self.assertEqual(entry.status, NotificationOutbox.STATUS_FAILED)
+        self.assertIn('Email failed', entry.last_error)
+        order.refresh_from_db()
+        self.assertFalse(order.notification_sent)
+
+    def test_async_order_create_notifies_immediately(self):
+        mail.outbox = []
+        payload = {'customer': self.customer.id, 'order_items': [{'product': self.product.id, 'quantity': 3, 'price': '5.00'}]}
+        with patch('core.notifications.send_sms', return_value={"status": "success"}) as mock_send_sms:
+            response = self.client.post(reverse('order-create-async'), payload, content_type='application/json')
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(Decimal(response.json()['total_amount']), Decimal('15.00'))
+        order = Order.objects.get(id=response.json()['id'])
+        self.assertTrue(order.notification_sent)
+        self.assertEqual(NotificationOutbox.objects.get(order=order).status, NotificationOutbox.STATUS_SENT)
+        self.assertIn("3 x White Bread", mock_send_sms.call_args[0][1])
+        self.assertEqual([email.subject for email in mail.outbox], [f"New Order #{order.id} Placed"])
+
+        response = self.client.post(reverse('order-create-async'), {'customer': self.customer.id, 'order_items': []},
+                                    content_type='application/json')
+        self.assertEqual(response.status_code, 400)
+
+    def async_order_payload(self):
+        return {'customer': self.customer.id, 'order_items': [{'product': self.product.id, 'quantity': 1, 'price': '5.00'}]}
+
+    @override_settings(NOTIFICATION_SMS_TIMEOUT=30, NOTIFICATION_EMAIL_TIMEOUT=30)
+    def test_async_order_create_sends_concurrently(self):
+        mail.outbox = []
+        sms_started, email_sent = threading.Event(), threading.Event()
+
+        # Each call waits on the other, so they only both finish when they overlap.
+        def sms_after_email(phone, message):
+            sms_started.set()
+            return {"status": "success"} if email_sent.wait(10) else None
+
+        def email_after_sms(connection, subject, body):
+            if not sms_started.wait(10):
+                raise smtplib.SMTPException("SMS never started")
+            send_admin_email(connection, subject, body)
+            email_sent.set()
+
+        with patch('core.notifications.send_sms', side_effect=sms_after_email), \
+                patch('core.notifications.send_admin_email', side_effect=email_after_sms):
+            response = self.client.post(reverse('order-create-async'), self.async_order_payload(),
+                                        content_type='application/json')
+        self.assertEqual(response.status_code, 201)
+        entry = NotificationOutbox.objects.get(order_id=response.json()['id'])
+        self.assertEqual((entry.status, entry.last_error), (NotificationOutbox.STATUS_SENT, ''))
+        self.assertEqual(len(mail.outbox), 1)
+
+    @override_settings(NOTIFICATION_SMS_TIMEOUT=0.05, NOTIFICATION_EMAIL_TIMEOUT=30)
+    def test_async_order_create_does_not_retry_a_timed_out_call(self):
+        mail.outbox = []
+        release = threading.Event()
+        self.addCleanup(release.set)
+
+        def hanging_sms(phone, message):
+            release.wait(10)
+            return {"status": "success"}
+
+        with patch('core.notifications.send_sms', side_effect=hanging_sms) as mock_send_sms:
+            response = self.client.post(reverse('order-create-async'), self.async_order_payload(),
+                                        content_type='application/json')
+            self.assertEqual(response.status_code, 201)
+            entry = NotificationOutbox.objects.get(order_id=response.json()['id'])
+            # The SMS may still go out, so the worker must not send it again.
+            self.assertEqual(entry.status, NotificationOutbox.STATUS_SENT)
+            self.assertTrue(entry.sms_done)
+            self.assertIn('timed out after 0.05s in flight, outcome unknown', entry.last_error)
+        self.assertEqual(mock_send_sms.call_count, 1)
+        self.assertEqual(len(mail.outbox), 1)
+
+    def test_export_orders_csv(self):
+        other = Customer.objects.create(name="Jane Roe", code="JR001", phone="+254700000001")
+        Order.objects.create(customer=other, total_amount=0)
+        response = self.api_client.get(reverse('order-export'), {'output': 'csv'})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['Content-Type'], 'text/csv')
+        self.assertIn('orders.csv', response['Content-Disposition'])
+        lines = b''.join(response.streaming_content).decode().splitlines()
+        self.assertEqual(lines[0].split(',')[:3], ['order_id', 'time', 'customer_id'])
+        self.assertEqual(len(lines), 3)
+        self.assertIn('White Bread', lines[1])
+        self.assertTrue(lines[2].endswith(',,,,'))
+
+    @override_settings(EXPORT_BATCH_SIZE=2)
+    def test_export_orders_ndjson_in_batches(self):
+        for _ in range(4):
+            order = Order.objects.create(customer=self.customer, total_amount=5)
+            OrderItem.objects.create(order=order, product=self.product, quantity=1, price=5)
+        response = self.api_client.get(reverse('order-export'), {'output': 'ndjson'})
+        with CaptureQueriesContext(connection) as queries:
+            rows = [json.loads(line) for line in b''.join(response.streaming_content).splitlines()]
+        self.assertEqual([row['id'] for row in rows], sorted(row['id'] for row in rows))
+        self.assertEqual(len(rows), 5)
+        self.assertEqual(rows[0]['order_items'][0]['product_name'], 'White Bread')
+        # Three batches of orders and their items, plus the final empty batch.
+        self.assertEqual(len(queries), 7)
+
+    def test_export_orders_filters(self):
+        other = Customer.objects.create(name="Jane Roe", code="JR001", phone="+254700000001")
+        old = Order.objects.create(customer=other, total_amount=0)
+        Order.objects.filter(id=old.id).update(time=timezone.now() - timedelta(days=10))
+        url = reverse('order-export')
+
+        response = self.api_client.get(url, {'output': 'ndjson', 'customer': other.id})
+        self.assertEqual([json.loads(line)['id'] for line in b''.join(response.streaming_content).splitlines()], [old.id])
+
+        start = (timezone.now() - timedelta(days=1)).date().isoformat()
+        response = self.api_client.get(url, {'output': 'ndjson', 'start': start})
+        self.assertEqual([json.loads(line)['id'] for line in b''.join(response.streaming_content).splitlines()], [self.order.id])
+
+        self.assertEqual(self.api_client.get(url, {'start': 'yesterday'}).status_code, 400)
+        self.assertEqual(self.api_client.get(url, {'start': '2024-02-30'}).status_code, 400)
+        self.assertEqual(self.api_client.get(url, {'end': '2024-02-30T10:00:00'}).status_code, 400)
+        self.assertEqual(self.api_client.get(url, {'output': 'xml'}).status_code, 400)
+
+    def test_import_orders_ndjson(self):
+        lines = [
+            {'customer': 'JD001', 'time': '2024-01-02T10:00:00Z',
+             'order_items': [{'product': self.product.id, 'quantity': 3, 'price': '4.50'}]},
+            {'customer': 'NOPE', 'order_items': [{'product': self.product.id, 'quantity': 1}]},
+            {'customer': 'JD001', 'order_items': [{'product': self.product.id, 'quantity': 0}]},
+            {'customer': 'JD001', 'order_items': [{'product': self.product.id}]},
+        ]
+        body = '\n'.join(json.dumps(line) for line in lines) + '\nnot json\n'
+        response = self.api_client.post(
+            reverse('order-import'), body, content_type='application/x-ndjson'
+        )
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(response.data['created'], 2)
+        self.assertEqual([error['line'] for error in response.data['errors']], [2, 3, 5])
+        self.assertIn('customer', response.data['errors'][0]['errors'])
+        self.assertIn('quantity', response.data['errors'][1]['errors']['order_items'][0])
+
+        imported = Order.objects.exclude(id=self.order.id).order_by('id')
+        self.assertEqual(imported[0].time.isoformat(), '2024-01-02T10:00:00+00:00')
+        self.assertEqual(imported[0].total_amount, Decimal('13.50'))
+        # Missing prices default to the product's current price.
+        self.assertEqual(imported[1].total_amount, Decimal('5.00'))
+        self.assertEqual(NotificationOutbox.objects.filter(order__in=imported).count(), 2)
+
+    def test_import_orders_csv_round_trip_without_notifications(self):
+        export = self.api_client.get(reverse('order-export'), {'output': 'csv'})
+        body = b''.join(export.streaming_content)
+        response = self.api_client.post(
+            reverse('order-import') + '?notify=false', body, content_type='text/csv'
+        )
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(response.data, {'created': 1, 'errors': []})
+        imported = Order.objects.exclude(id=self.order.id).get()
+        self.assertEqual(imported.time, self.order.time)
+        self.assertEqual(imported.customer, self.customer)
+        self.assertEqual(imported.order_items.get().quantity, 2)
+        self.assertTrue(imported.notification_sent)
+        self.assertFalse(NotificationOutbox.objects.filter(order=imported).exists())
+
+    def test_import_orders_uses_set_based_lookups(self):
+        def payload(count):
+            return [
+                {'customer': 'JD001', 'order_items': [{'product': self.product.id, 'quantity': 1}] * 2}
+                for _ in range(count)
+            ]
+
+        with CaptureQueriesContext(connection) as small:
+            self.api_client.post(reverse('order-import'), payload(2), format='json')
+        with CaptureQueriesContext(connection) as large:
+            response = self.api_client.post(reverse('order-import'), payload(50), format='json')
+        self.assertEqual(response.data['created'], 50)
+        self.assertEqual(len(large), len(small))
+        self.assertEqual(OrderItem.objects.exclude(order=self.order).count(), 104)
+
+    def test_import_orders_command(self):
+        with tempfile.NamedTemporaryFile('w', suffix='.ndjson', delete=False) as handle:
+            for _ in range(5):
+                handle.write(json.dumps({'customer': 'JD001', 'order_items': [{'product': self.product.id}]}) + '\n')
+        self.addCleanup(os.remove, handle.name)
+        out = StringIO()
+        call_command('import_orders', handle.name, '--chunk-size', '2', '--no-notify', stdout=out)
+        self.assertIn('Imported 5 orders, skipped 0', out.getvalue())
+        self.assertEqual(Order.objects.filter(notification_sent=True).count(), 5)
+
+    def test_batch_create_customers(self):
+        rows = [
+            {'name': 'Jane Roe', 'code': 'JR001', 'phone': '+254700000001'},
+            {'name': 'Duplicate', 'code': 'JD001'},
+            {'name': 'No Code'},
+            {'name': 'Jane Again', 'code': 'JR001'},
+            {'name': 'Sam Poe', 'code': 'SP001'},
+        ]
+        response = self.api_client.post(reverse('customer-list'), rows, format='json')
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual((response.data['created'], response.data['updated'], response.data['errors']), (2, 0, 3))
+        statuses = [result['status'] for result in response.data['results']]
+        self.assertEqual(statuses, ['created', 'error', 'error', 'error', 'created'])
+        self.assertIn('code', response.data['results'][1]['errors'])
+        self.assertEqual(Customer.objects.get(code='SP001').id, response.data['results'][4]['id'])
+        self.assertEqual(Customer.objects.get(code='JD001').name, 'John Doe')
+
+    def test_batch_upsert_customers_by_code(self):
+        rows = [{'name': 'Jane Roe', 'code': 'JR%03d' % i} for i in range(20)]
+        rows.append({'name': 'John Updated', 'code': 'JD001', 'phone': '+254700000009'})
+        with CaptureQueriesContext(connection) as queries:
+            response = self.api_client.post(reverse('customer-upsert'), rows, format='json')
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual((response.data['created'], response.data['updated']), (20, 1))
+        # Key lookup, bulk insert and bulk update; not one query per row.
+        self.assertLess(len(queries), 10)
+        self.customer.refresh_from_db()
+        self.assertEqual((self.customer.name, self.customer.phone), ('John Updated', '+254700000009'))
+        self.assertEqual(self.customer.email, 'wenslause300@gmail.com')
+
+        response = self.api_client.post(reverse('customer-upsert'), [{'code': 'JD001'}], format='json')
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('name', response.data['results'][0]['errors'])
+
+    def test_batch_upsert_products_updates_price_stats(self):
+        rows = [
+            {'name': 'Rye Bread', 'category': self.bread.id, 'price': '9.00'},
+            {'id': self.product.id, 'name': 'White Bread', 'category': self.bread.id, 'price': '7.00'},
+            {'id': 999999, 'name': 'Ghost', 'category': self.bread.id, 'price': '1.00'},
+            {'name': 'Lost', 'category': 999999, 'price': '1.00'},
+        ]
+        response = self.api_client.post(reverse('product-upsert'), rows, format='json')
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual([result['status'] for result in response.data['results']],
+                         ['created', 'updated', 'error', 'error'])
+        self.assertIn('category', response.data['results'][3]['errors'])
+        self.product.refresh_from_db()
+        self.assertEqual(self.product.price, Decimal('7.00'))
+
+        for category in (self.bread, self.bakery, self.category):
+            stats = CategoryPriceStats.objects.get(category=category)
+            self.assertEqual((stats.product_count, stats.min_price, stats.max_price),
+                             (2, Decimal('7.00'), Decimal('9.00')))
+
+    @override_settings(API_BATCH_MAX_ROWS=2)
+    def test_batch_size_is_capped(self):
+        rows = [{'name': 'Rye Bread', 'category': self.bread.id, 'price': '9.00'}] * 3
+        response = self.api_client.post(reverse('product-list'), rows, format='json')
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(Product.objects.count(), 1)
+
+    def daily_sales(self):
+        return sorted(DailySales.objects.values_list('day', 'customer_id', 'category_id', 'order_count', 'quantity', 'revenue'))
+
+    def test_daily_sales_follow_order_writes(self):
+        today = timezone.localdate()
+        rye = Product.objects.create(name="Rye Bread", category=self.bread, price=7.00)
+        cake = Product.objects.create(name="Cake", category=self.bakery, price=20.00)
+        self.api_client.post(reverse('order-list'), {
+            'customer': self.customer.id,
+            'order_items': [
+                {'product': self.product.id, 'quantity': 1, 'price': '5.00'},
+                {'product': rye.id, 'quantity': 1, 'price': '7.00'},
+                {'product': cake.id, 'quantity': 1, 'price': '20.00'},
+            ],
+        }, format='json')
+        self.assertEqual(self.daily_sales(), [
+            (today, self.customer.id, self.bakery.id, 1, 1, Decimal('20.00')),
+            (today, self.customer.id, self.bread.id, 2, 4, Decimal('22.00')),
+        ])
+
+        self.order_item.quantity = 3
+        self.order_item.save()
+        OrderItem.objects.filter(product=cake).get().delete()
+        expected = [
+            (today, self.customer.id, self.bakery.id, 0, 0, Decimal('0.00')),
+            (today, self.customer.id, self.bread.id, 2, 5, Decimal('27.00')),
+        ]
+        self.assertEqual(self.daily_sales(), expected)
+
+        out = StringIO()
+        call_command('rebuild_rollups', stdout=out)
+        self.assertIn('Rebuilt 1 daily sales rows', out.getvalue())
+        self.assertEqual(self.daily_sales(), expected[1:])
+
+        # Deleting a customer cascades to their rollup rows.
+        self.customer.delete()
+        self.assertFalse(DailySales.objects.exists())
+
+    def test_daily_sales_stay_with_the_credited_category(self):
+        today = timezone.localdate()
+        response = self.api_client.post(reverse('order-list'), {
+            'customer': self.customer.id,
+            'order_items': [{'product': self.product.id, 'quantity': 1, 'price': '5.00'}],
+        }, format='json')
+        order = Order.objects.get(pk=response.data['id'])
+        self.assertEqual(order.order_items.get().category, self.bread)
+
+        # Sales already counted stay under Bread when the product moves.
+        self.product.category = self.bakery
+        self.product.save()
+        self.order_item.quantity = 3
+        self.order_item.save()
+        self.assertEqual(self.daily_sales(), [(today, self.customer.id, self.bread.id, 2, 4, Decimal('20.00'))])
+
+        self.assertEqual(self.api_client.delete(reverse('order-detail', args=[order.id])).status_code, 204)
+        self.order_item.delete()
+        self.assertEqual(self.daily_sales(), [(today, self.customer.id, self.bread.id, 0, 0, Decimal('0.00'))])
+
+        # New items are credited to where the product is now.
+        OrderItem.objects.create(order=self.order, product=self.product, quantity=1, price=5.00)
+        self.assertEqual(self.daily_sales(), [
+            (today, self.customer.id, self.bakery.id, 1, 1, Decimal('5.00')),
+            (today, self.customer.id, self.bread.id, 0, 0, Decimal('0.00')),
+        ])
+
+    def test_daily_sales_after_cascading_deletes(self):
+        today = timezone.localdate()
+        rye = Product.objects.create(name="Rye Bread", category=self.bread, price=7.00)
+        response = self.api_client.post(reverse('order-list'), {
+            'customer': self.customer.id,
+            'order_items': [
+                {'product': self.product.id, 'quantity': 1, 'price': '5.00'},
+                {'product': rye.id, 'quantity': 1, 'price': '7.00'},
+            ],
+        }, format='json')
+        self.assertEqual(self.daily_sales(), [(today, self.customer.id, self.bread.id, 2, 4, Decimal('22.00'))])
+
+        # Both items go in one cascade; the order leaves order_count once.
+        self.assertEqual(self.api_client.delete(reverse('order-detail', args=[response.data['id']])).status_code, 204)
+        self.assertEqual(self.daily_sales(), [(today, self.customer.id, self.bread.id, 1, 2, Decimal('10.00'))])
+
+        # The order still has Bread from another product, so it stays counted.
+        OrderItem.objects.create(order=self.order, product=rye, quantity=1, price=7.00)
+        rye.delete()
+        self.assertEqual(self.daily_sales(), [(today, self.customer.id, self.bread.id, 1, 2, Decimal('10.00'))])
+
+        Order.objects.filter(pk=self.order.pk).delete()
+        self.assertEqual(self.daily_sales(), [(today, self.customer.id, self.bread.id, 0, 0, Decimal('0.00'))])
+
+    def test_daily_sales_for_imported_orders(self):
+        rows = [
+            {'customer': 'JD001', 'time': '2024-01-02T10:00:00Z',
+             'order_items': [{'product': self.product.id, 'quantity': 2}]},
+            {'customer': 'JD001', 'time': '2024-01-02T12:00:00Z',
+             'order_items': [{'product': self.product.id, 'quantity': 1}] * 2},
+        ]
+        self.api_client.post(reverse('order-import') + '?notify=false', rows, format='json')
+        imported = DailySales.objects.get(day='2024-01-02')
+        self.assertEqual((imported.order_count, imported.quantity, imported.revenue), (2, 4, Decimal('20.00')))
+        before = self.daily_sales()
+        call_command('rebuild_rollups', '--since', '2024-01-01', '--until', '2024-01-02', stdout=StringIO())
+        self.assertEqual(self.daily_sales(), before)
+
+    def test_sales_reports(self):
+        other = Customer.objects.create(name="Jane Roe", code="JR001")
+        cake = Product.objects.create(name="Cake", category=self.bakery, price=20.00)
+        rows = [
+            {'customer': 'JR001', 'time': '2024-01-02T10:00:00Z', 'order_items': [{'product': cake.id, 'quantity': 3}]},
+            {'customer': 'JD001', 'time': '2024-02-05T10:00:00Z', 'order_items': [{'product': self.product.id}]},
+        ]
+        self.api_client.post(reverse('order-import') + '?notify=false', rows, format='json')
+
+        with CaptureQueriesContext(connection) as queries:
+            response = self.api_client.get(reverse('report-list'), {'period': 'month', 'end': '2024-12-31'})
+        self.assertEqual(len(queries), 1)
+        self.assertEqual(
+            [(str(row['period']), row['revenue']) for row in response.data],
+            [('2024-01-01', Decimal('60.00')), ('2024-02-01', Decimal('5.00'))],
+        )
+
+        response = self.api_client.get(reverse('report-top'), {'by': 'customer', 'limit': 1})
+        self.assertEqual([row['code'] for row in response.data], ['JR001'])
+
+        response = self.api_client.get(reverse('report-top'), {'by': 'category', 'category': self.bread.id})
+        self.assertEqual([(row['name'], row['revenue']) for row in response.data], [('Bread', Decimal('15.00'))])
+
+        response = self.api_client.get(reverse('report-top'), {'by': 'category', 'level': 1})
+        self.assertEqual([(row['name'], row['revenue']) for row in response.data], [('Bakery', Decimal('75.00'))])
+
+        for params in ({'limit': -1}, {'limit': 0}, {'by': 'category', 'level': -1}):
+            self.assertEqual(self.api_client.get(reverse('report-top'), params).status_code, 400)
+        self.assertEqual(self.api_client.get(reverse('report-list'), {'start': '2024-13-01'}).status_code, 400)
+        self.assertEqual(self.api_client.get(reverse('report-list'), {'period': 'hour'}).status_code, 400)
+
+    def test_roll_up_categories_reads_only_the_needed_ancestors(self):
+        rolls = Category.objects.create(name="Rolls", parent=self.bakery)
+        drinks = Category.objects.create(name="Drinks", parent=self.category)
+        juice = Category.objects.create(name="Juice", parent=Category.objects.create(name="Cold", parent=drinks))
+        other_tree = Category.objects.create(name="Other", parent=Category.objects.create(name="Services"))
+        Category.objects.create(name="Unsold", parent=self.category)
+        rows = [
+            {'category_id': category.id, 'order_count': 1, 'quantity': quantity, 'revenue': Decimal(quantity)}
+            for category, quantity in ((self.bread, 1), (rolls, 2), (juice, 4), (other_tree, 8), (self.category, 16))
+        ]
+        with CaptureQueriesContext(connection) as queries:
+            totals = ReportViewSet.roll_up_categories(rows, 1)
+        self.assertEqual(len(queries), 2)
+        self.assertEqual([(total['category_id'], total['quantity']) for total in totals],
+                         [(self.category.id, 16), (other_tree.id, 8), (drinks.id, 4), (self.bakery.id, 3)])
+
+    def test_catalog_cache_for_api_lists(self):
+        reset_catalog_cache_stats()
+        url = reverse('product-list')
+        self.api_client.get(url)
+        with CaptureQueriesContext(connection) as queries:
+            response = self.api_client.get(url)
+        # Only the CatalogVersion row for the validators
+        self.assertEqual(len(queries), 1)
+        self.assertEqual([row['name'] for row in response.data['results']], ['White Bread'])
+        self.assertEqual(catalog_cache_stats()['product'], {'hits': 1, 'misses': 1})
+
+        self.product.name = 'Brown Bread'
+        self.product.save()
+        response = self.api_client.get(url)
+        self.assertEqual([row['name'] for row in response.data['results']], ['Brown Bread'])
+
+        # Batch writes skip the save signals but still invalidate.
+        self.api_client.post(url, [{'name': 'Rye Bread', 'category': self.bread.id, 'price': '9.00'}], format='json')
+        response = self.api_client.get(url)
+        self.assertEqual(len(response.data['results']), 2)
+        self.assertEqual(catalog_cache_stats()['product'], {'hits': 1, 'misses': 3})
+
+    def test_order_form_does_not_load_the_catalog(self):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(reverse('order_add'))
+        self.assertFalse([query for query in queries if 'core_' in query['sql']])
+        self.assertContains(response, reverse('customer-search'))
+        self.assertNotContains(response, 'John Doe')
+
+    def test_customer_search(self):
+        Customer.objects.create(name="Jane Roe", code="JR001")
+        Customer.objects.create(name="Joan Poe", code="XX001")
+        Customer.objects.create(name="Zed", code="JO777")
+        url = reverse('customer-search')
+
+        response = self.api_client.get(url, {'q': 'jo'})
+        self.assertEqual([row['name'] for row in response.data], ['Joan Poe', 'John Doe', 'Zed'])
+        response = self.api_client.get(url, {'q': 'J', 'limit': 2})
+        self.assertEqual([row['code'] for row in response.data], ['JR001', 'XX001'])
+        self.assertEqual(self.api_client.get(url, {'q': 'x'}).data, [{'id': response.data[1]['id'], 'name': 'Joan Poe', 'code': 'XX001'}])
+
+        # Results are cached until the table changes.
+        with CaptureQueriesContext(connection) as queries:
+            self.api_client.get(url, {'q': 'jo'})
+        self.assertEqual(len(queries), 0)
+        Customer.objects.create(name="Jolene", code="JL001")
+        self.assertEqual(len(self.api_client.get(url, {'q': 'jo'}).data), 4)
+        self.assertEqual(self.api_client.get(url, {'limit': 'many'}).status_code, 400)
+
+    @override_settings(TYPEAHEAD_MAX_LIMIT=2)
+    def test_product_search(self):
+        cake = Product.objects.create(name="Wedding Cake", category=self.bakery, price=50.00)
+        Product.objects.create(name="whole wheat", category=self.bread, price=6.00)
+        Product.objects.create(name="Wholemeal", category=self.bread, price=6.50)
+        url = reverse('product-search')
+
+        response = self.api_client.get(url, {'q': 'w', 'limit': 10})
+        self.assertEqual([row['name'] for row in response.data], ['Wedding Cake', 'White Bread'])
+        response = self.api_client.get(url, {'q': 'WH', 'category': self.bread.id})
+        self.assertEqual([row['name'] for row in response.data], ['White Bread', 'whole wheat'])
+        response = self.api_client.get(url, {'q': 'wed', 'category': self.bakery.id})
+        self.assertEqual(response.data, [{'id': cake.id, 'name': 'Wedding Cake', 'price': '50.00', 'category': self.bakery.id}])
+
+
+    def test_conditional_get_on_catalog_endpoints(self):
+        url = reverse('product-list')
+        response = self.api_client.get(url)
+        etag = response['ETag']
+        self.assertTrue(response.has_header('Last-Modified'))
+
+        with CaptureQueriesContext(connection) as queries:
+            response = self.api_client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+        # Only the CatalogVersion row is read
+        self.assertEqual(len(queries), 1)
+        response = self.api_client.get(
+            reverse('product-detail', kwargs={'pk': self.product.id}), HTTP_IF_NONE_MATCH=etag
+        )
+        self.assertEqual(response.status_code, 304)
+
+        Product.objects.create(name="Rye Bread", category=self.bread, price=7.00)
+        response = self.api_client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
+        self.assertEqual(len(response.data['results']), 2)
+
+        response = self.api_client.get(reverse('category-list'))
+        response = self.api_client.get(
+            reverse('category-list'), HTTP_IF_MODIFIED_SINCE=response['Last-Modified']
+        )
+        self.assertEqual(response.status_code, 304)
+
+    def test_conditional_get_sees_changes_from_other_processes(self):
+        url = reverse('product-list')
+        etag = self.api_client.get(url)['ETag']
+        # A write handled by another worker never touches this process's cache.
+        with patch('core.models.bump_generation'):
+            Product.objects.create(name="Rye Bread", category=self.bread, price=7.00)
+        response = self.api_client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
+        # The body is built afresh for the new ETag, not the cached one.
+        self.assertEqual(len(response.data['results']), 2)
+        etag = response['ETag']
+
+        Product.objects.filter(pk=self.product.pk).update(name='Brown Bread')
+        CatalogVersion.objects.filter(table='product').update(version=F('version') + 1)
+        response = self.api_client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertNotEqual(response['ETag'], etag)
+        self.assertIn('Brown Bread', [row['name'] for row in response.data['results']])
+        self.assertEqual(self.api_client.get(url, HTTP_IF_NONE_MATCH=response['ETag']).status_code, 304)
 
     def tearDown(self):
         settings.TESTING = self.old_testing
@@ -293,6 +1129,567 @@ class CustomerOrderTestCase(TestCase):
         Order.objects.all().delete()
         User.objects.all().delete()
 
+@skipUnless(connection.vendor == 'sqlite', "Query plans are checked with SQLite's EXPLAIN QUERY PLAN")
+class QueryPlanTestCase(TestCase):
+    """The list, notification and report queries must be served by indexes."""
+
+    def assertUsesIndexes(self, queryset):
+        sql, params = queryset.query.sql_with_params()
+        with connection.cursor() as cursor:
+            cursor.execute(f'EXPLAIN QUERY PLAN {sql}', params)
+            plan = [row[3] for row in cursor.fetchall()]
+        for step in plan:
+            full_scan = step.startswith('SCAN') and ' USING ' not in step
+            self.assertFalse(full_scan or 'TEMP B-TREE' in step, f"Unindexed plan {plan} for {sql}")
+
+    def test_order_queries_use_indexes(self):
+        now = timezone.now()
+        self.assertUsesIndexes(Order.objects.select_related('customer').order_by('-time', '-id')[:50])
+        self.assertUsesIndexes(Order.objects.filter(time__lt=now).order_by('-time', '-id')[:50])
+        self.assertUsesIndexes(
+            Order.objects.filter(customer_id=1, time__gte=now - timedelta(days=30), time__lt=now).order_by('-time')
+        )
+        self.assertUsesIndexes(Order.objects.filter(notification_sent=False).order_by('time')[:50])
+        self.assertUsesIndexes(OrderItem.objects.filter(order_id__in=[1, 2]).select_related('product'))
+
+    def test_catalog_and_outbox_queries_use_indexes(self):
+        self.assertUsesIndexes(Customer.objects.order_by('name', 'id')[:50])
+        self.assertUsesIndexes(Product.objects.select_related('category').order_by('name', 'id')[:50])
+        self.assertUsesIndexes(prefix_search(Customer.objects.all(), 'name', 'jo')[:20])
+        self.assertUsesIndexes(prefix_search(Customer.objects.all(), 'code', 'jo')[:20])
+        self.assertUsesIndexes(prefix_search(Product.objects.all(), 'name', 'wh')[:20])
+        self.assertUsesIndexes(
+            NotificationOutbox.objects.filter(
+                status=NotificationOutbox.STATUS_PENDING, next_attempt_at__lte=timezone.now()
+            ).order_by('next_attempt_at', 'id')[:50]
+        )
+
+class SessionCoalescingTestCase(TestCase):
+    def test_unchanged_session_is_not_saved(self):
+        from core.session_backends.db import SessionStore
+        session = SessionStore()
+        session['cart'] = [1, 2]
+        session.save()
+
+        loaded = SessionStore(session.session_key)
+        loaded['cart'] = [1, 2]
+        self.assertFalse(loaded.modified)
+        loaded['cart'] = [1, 2, 3]
+        self.assertTrue(loaded.modified)
+
+    def test_page_view_does_not_resend_session_cookie(self):
+        user = User.objects.create_user(username='reader', password='testpass123')
+        client = Client()
+        client.login(username='reader', password='testpass123')
+        response = client.get(reverse('customers'))
+        self.assertEqual(response.status_code, 200)
+        self.assertNotIn(settings.SESSION_COOKIE_NAME, response.cookies)
+
+class OIDCTokenCacheTestCase(TestCase):
+    def setUp(self):
+        caches[settings.OIDC_CACHE_ALIAS].clear()
+        self.user = User.objects.create_user(username='apiuser', email='api@example.com')
+        self.idp = FakeOIDCProvider().start()
+        self.addCleanup(self.idp.stop)
+        self.api_client = APIClient()
+
+    def get_customers(self, token):
+        self.api_client.credentials(HTTP_AUTHORIZATION=f'Bearer {token}')
+        return self.api_client.get(reverse('customer-list'))
+
+    def test_userinfo_is_cached_per_token(self):
+        token = self.idp.issue_token({'email': 'api@example.com'})
+        with override_settings(**self.idp.settings()):
+            self.assertEqual(self.get_customers(token).status_code, 200)
+            self.assertEqual(self.get_customers(token).status_code, 200)
+        self.assertEqual(self.idp.hits.get('/userinfo'), 1)
+
+    def test_cache_ttl_is_bounded_by_token_expiry(self):
+        token = self.idp.issue_token({'email': 'api@example.com'}, expires_in=0)
+        with override_settings(**self.idp.settings()):
+            self.assertEqual(self.get_customers(token).status_code, 401)
+            self.assertEqual(self.get_customers(token).status_code, 401)
+        self.assertEqual(self.idp.hits.get('/userinfo'), 2)
+
+    def test_local_jwt_validation_needs_no_userinfo_call(self):
+        token = self.idp.issue_token({'email': 'api@example.com'})
+        other = self.idp.issue_token({'email': 'api@example.com', 'jti': 'second'})
+        with override_settings(OIDC_LOCAL_JWT_VALIDATION=True, **self.idp.settings()):
+            for bearer in (token, token, other):
+                self.assertEqual(self.get_customers(bearer).status_code, 200)
+        self.assertNotIn('/userinfo', self.idp.hits)
+        self.assertEqual(self.idp.hits.get('/.well-known/jwks.json'), 1)
+
+    def test_local_jwt_validation_rejects_bad_tokens(self):
+        expired = self.idp.issue_token({'email': 'api@example.com'}, expires_in=-10)
+        header, payload, signature = self.idp.issue_token({'email': 'api@example.com'}).split('.')
+        forged = '.'.join([header, urlsafe_b64encode(b'{"email": "api@example.com", "exp": 9999999999}').decode().rstrip('='), signature])
+        other_client = self.idp.issue_token({'email': 'api@example.com', 'aud': 'another-client-id'})
+        with override_settings(OIDC_LOCAL_JWT_VALIDATION=True, **self.idp.settings()):
+            self.assertEqual(self.get_customers(expired).status_code, 401)
+            self.assertEqual(self.get_customers(forged).status_code, 401)
+            self.assertEqual(self.get_customers(other_client).status_code, 401)
+
+    def test_local_jwt_validation_requires_an_audience(self):
+        token = self.idp.issue_token({'email': 'api@example.com'})
+        with override_settings(**dict(self.idp.settings(), OIDC_LOCAL_JWT_VALIDATION=True, OIDC_API_AUDIENCE='')):
+            self.assertEqual([error.id for error in check_local_jwt_validation(None)], ['core.E001'])
+            with self.assertLogs('core.authentication', 'ERROR'):
+                self.assertEqual(self.get_customers(token).status_code, 401)
+
+class InstrumentationTestCase(TestCase):
+    def setUp(self):
+        reset_metrics()
+        self.user = User.objects.create_user(username='testuser', password='testpass123')
+        self.api_client = APIClient()
+        self.api_client.force_authenticate(user=self.user)
+        self.customer = Customer.objects.create(name="John Doe", code="JD001", phone="+254769525570")
+
+    @override_settings(SERVER_TIMING=True, METRICS_TOKEN='scrape-me')
+    def test_server_timing_and_metrics(self):
+        response = self.api_client.get(reverse('customer-detail', kwargs={'pk': self.customer.id}))
+        timing = dict(part.strip().split(';', 1) for part in response['Server-Timing'].split(','))
+        self.assertIn('total', timing)
+        self.assertIn('desc="1 queries"', timing['db'])
+
+        metrics = self.client.get(reverse('metrics'), HTTP_AUTHORIZATION='Bearer scrape-me').content.decode()
+        self.assertIn('http_requests_total{method="GET",status="200",view="CustomerViewSet.retrieve"} 1', metrics)
+        self.assertIn('http_request_db_queries_total{view="CustomerViewSet.retrieve"} 1', metrics)
+        self.assertIn('http_request_duration_seconds_bucket{view="CustomerViewSet.retrieve",le="+Inf"} 1', metrics)
+        self.assertIn('# TYPE http_request_duration_seconds histogram', metrics)
+
+    def test_outbound_calls_are_timed(self):
+        with FakeSMSServer() as server, override_settings(AFRICASTALKING_API_URL=server.url):
+            send_sms(self.customer.phone, "Hello")
+        with override_settings(EMAIL_BACKEND='core.instrumentation.TimedEmailBackend',
+                               EMAIL_DELIVERY_BACKEND='django.core.mail.backends.locmem.EmailBackend'):
+            mail.send_mail('Subject', 'Body', 'from@example.com', ['to@example.com'])
+        self.assertEqual(len(mail.outbox), 1)
+        metrics = render_metrics()
+        self.assertIn('external_call_duration_seconds_count{target="sms"} 1', metrics)
+        self.assertIn('external_call_duration_seconds_count{target="email"} 1', metrics)
+
+    @override_settings(SERVER_TIMING=False)
+    def test_server_timing_only_for_staff_without_the_setting(self):
+        url = reverse('customer-detail', kwargs={'pk': self.customer.id})
+        self.assertFalse(self.api_client.get(url).has_header('Server-Timing'))
+        self.assertFalse(self.client.get(url).has_header('Server-Timing'))
+        self.user.is_staff = True
+        self.user.save()
+        self.assertTrue(self.api_client.get(url).has_header('Server-Timing'))
+
+    @override_settings(METRICS_TOKEN='scrape-me')
+    def test_metrics_token(self):
+        self.assertEqual(self.client.get(reverse('metrics')).status_code, 401)
+        response = self.client.get(reverse('metrics'), HTTP_AUTHORIZATION='Bearer scrape-me')
+        self.assertEqual(response.status_code, 200)
+
+    @override_settings(METRICS_TOKEN='')
+    def test_metrics_without_token_only_under_debug(self):
+        self.assertEqual(self.client.get(reverse('metrics')).status_code, 404)
+        with override_settings(DEBUG=True):
+            self.assertEqual(self.client.get(reverse('metrics')).status_code, 200)
+
+class LoggingTestCase(TestCase):
+    def make_queued_logger(self, handler):
+        test_logger = logging.getLogger('core.tests.queued')
+        test_logger.addHandler(handler)
+        test_logger.propagate = False
+        self.addCleanup(test_logger.removeHandler, handler)
+        self.addCleanup(handler.listener.stop)
+        return test_logger
+
+    def test_queued_handler_writes_in_batches(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        path = os.path.join(directory, 'app.log')
+        handler = queued_handler(path, batch_size=50, console=False)
+        test_logger = self.make_queued_logger(handler)
+        for number in range(100):
+            test_logger.warning("record %d", number)
+        handler.listener.stop()
+
+        self.assertEqual(os.listdir(directory), ['app.log'])
+        with open(path) as log_file:
+            self.assertEqual(len(log_file.read().splitlines()), 100)
+
+    def test_file_handler_reopens_after_external_rotation(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        path = os.path.join(directory, 'app.log')
+        file_handler = BatchedWatchedFileHandler(path, delay=True)
+        self.addCleanup(file_handler.close)
+
+        def write_batch(message):
+            file_handler.emit(logging.makeLogRecord({'msg': message}))
+            file_handler.flush()
+
+        write_batch('before')
+        os.rename(path, path + '.1')
+        write_batch('after')
+        with open(path + '.1') as rotated, open(path) as current:
+            self.assertEqual((rotated.read(), current.read()), ('before\n', 'after\n'))
+
+    def test_listener_restarts_in_forked_child(self):
+        handler = queued_handler(console=False)
+        self.make_queued_logger(handler)
+        parent_thread, parent_queue = handler.listener._thread, handler.queue
+        restart_after_fork(handler)
+        self.assertIsNot(handler.listener._thread, parent_thread)
+        self.assertTrue(handler.listener._thread.is_alive())
+        self.assertIsNot(handler.queue, parent_queue)
+        self.assertIs(handler.listener.queue, handler.queue)
+        parent_queue.put_nowait(handler.listener._sentinel)
+        parent_thread.join()
+
+    def test_logout_does_not_log_session_or_headers(self):
+        User.objects.create_user(username='testuser', password='testpass123')
+        self.client.login(username='testuser', password='testpass123')
+        with self.assertLogs('core.views', 'DEBUG') as logs:
+            self.client.get(reverse('logout'), HTTP_X_SECRET='do-not-log')
+        output = '\n'.join(logs.output)
+        self.assertNotIn('_auth_user_id', output)
+        self.assertNotIn('do-not-log', output)
+
+class BenchmarkToolsTestCase(TestCase):
+    def test_seed_benchmark(self):
+        call_command('seed_benchmark', '--customers', '5', '--category-depth', '3', '--category-branching', '2',
+                     '--products', '20', '--orders', '50', '--chunk-size', '20', stdout=StringIO())
+        self.assertEqual(Customer.objects.count(), 5)
+        self.assertEqual(Category.objects.count(), 15)
+        root = Category.objects.get(parent=None)
+        self.assertEqual(root.get_descendant_count(), 14)
+        self.assertEqual(set(Product.objects.values_list('category__level', flat=True)), {3})
+        self.assertEqual(Order.objects.count(), 50)
+        self.assertFalse(Order.objects.filter(notification_sent=False).exists())
+        self.assertFalse(NotificationOutbox.objects.exists())
+        order = Order.objects.prefetch_related('order_items').last()
+        self.assertEqual(order.total_amount, sum(item.quantity * item.price for item in order.order_items.all()))
+        self.assertEqual(DailySales.objects.aggregate(total=Sum('quantity'))['total'],
+                         OrderItem.objects.aggregate(total=Sum('quantity'))['total'])
+        self.assertEqual(CategoryPriceStats.objects.get(category=root).product_count, 20)
+        # New orders get ids after the seeded ones.
+        self.assertEqual(Order.objects.create(customer=Customer.objects.first()).id, 51)
+        with self.assertRaises(CommandError):
+            call_command('seed_benchmark', stdout=StringIO())
+
+    def test_fake_smtp_server_receives_admin_email(self):
+        with FakeSMTPServer() as server, override_settings(**server.settings()):
+            # The test runner swaps EMAIL_BACKEND for locmem, so ask for SMTP directly.
+            connection = get_connection(settings.EMAIL_DELIVERY_BACKEND)
+            send_admin_email(connection, "New Order #1 Placed", "1 x White Bread - 5.00\n.starts with a dot")
+            connection.close()
+        self.assertEqual(len(server.messages), 1)
+        message = server.messages[0]
+        self.assertEqual(message['to'], [f'<{settings.ADMIN_EMAIL}>'])
+        self.assertIn("Subject: New Order #1 Placed", message['data'])
+        self.assertIn("\n.starts with a dot", message['data'])
+
+class QueryBudgetTestCase(TestCase):
+    """Query budgets for every view in core.views, each checked at two
+    dataset sizes (see core.utils.query_budget)."""
+
+    def setUp(self):
+        caches[settings.CATALOG_CACHE_ALIAS].clear()
+        self.user = User.objects.create_user(username='budget', password='budget-pass')
+        self.client.login(username='budget', password='budget-pass')
+        self.api_client = APIClient()
+        self.api_client.force_authenticate(user=self.user)
+        self.root = Category.objects.create(name="All Products")
+
+    def make_catalog(self, rows):
+        """``rows`` customers and ``rows`` products, each in a category of its own."""
+        customers, products = [], []
+        for i in range(rows):
+            customers.append(Customer.objects.create(name=f"Customer {i}", code=f"QB{i:04d}", phone=f"+2547000{i:05d}"))
+            category = Category.objects.create(name=f"Category {i}", parent=self.root)
+            products.append(Product.objects.create(name=f"Product {i}", category=category, price=i + 1))
+        return customers, products
+
+    def make_orders(self, rows):
+        """``rows`` orders from different customers, with two items each."""
+        customers, products = self.make_catalog(rows)
+        orders = []
+        for i, customer in enumerate(customers):
+            order = Order.objects.create(customer=customer, total_amount=10)
+            OrderItem.objects.create(order=order, product=products[i], quantity=1, price=5)
+            OrderItem.objects.create(order=order, product=products[(i + 1) % rows], quantity=1, price=5)
+            orders.append(order)
+        return orders
+
+    def make_chain(self, rows):
+        """A branch ``rows`` categories deep; returns the deepest one."""
+        category = self.root
+        for i in range(rows):
+            category = Category.objects.create(name=f"Level {i}", parent=category)
+        return category
+
+    def order_payload(self, products):
+        return {
+            'customer': Customer.objects.create(name="Buyer", code="BUYER").id,
+            'order_items': [{'product': product.id, 'quantity': 1, 'price': str(product.price)} for product in products],
+        }
+
+    # HTML views
+
+    @query_budget(constant(1))
+    def test_home(self, rows, measure):
+        self.make_orders(rows)
+        with measure():
+            self.assertEqual(self.client.get(reverse('home')).status_code, 200)
+
+    @override_settings(METRICS_TOKEN='scrape-me')
+    @query_budget(constant(1))
+    def test_metrics(self, rows, measure):
+        self.make_orders(rows)
+        with measure():
+            self.assertEqual(self.client.get(reverse('metrics'), HTTP_AUTHORIZATION='Bearer scrape-me').status_code, 200)
+
+    @query_budget(constant(1))
+    def test_logout(self, rows, measure):
+        self.make_orders(rows)
+        # The previous size's logout dropped the session cookie.
+        self.client.login(username='budget', password='budget-pass')
+        with measure():
+            self.assertEqual(self.client.get(reverse('logout')).status_code, 302)
+
+    @query_budget(constant(3))
+    def test_customer_list(self, rows, measure):
+        self.make_catalog(rows)
+        with measure():
+            self.assertContains(self.client.get(reverse('customers')), f"Customer {rows - 1}")
+
+    @query_budget(constant(4))
+    def test_customer_add(self, rows, measure):
+        self.make_catalog(rows)
+        with measure():
+            self.client.get(reverse('customer_add'))
+            response = self.client.post(reverse('customer_add'), {'name': "New", 'code': "NEW01"})
+        self.assertRedirects(response, reverse('customers'), fetch_redirect_response=False)
+
+    @query_budget(constant(3))
+    def test_category_list(self, rows, measure):
+        self.make_chain(rows)
+        with measure():
+            self.assertContains(self.client.get(reverse('categories')), f"Level {rows - 1}")
+
+    @query_budget(constant(12))
+    def test_category_add(self, rows, measure):
+        parent = self.make_chain(rows)
+        with measure():
+            self.client.get(reverse('category_add'))
+            response = self.client.post(reverse('category_add'), {'name': "New", 'parent': parent.id})
+        self.assertRedirects(response, reverse('categories'), fetch_redirect_response=False)
+
+    @query_budget(constant(3))
+    def test_product_list(self, rows, measure):
+        self.make_catalog(rows)
+        with measure():
+            self.assertContains(self.client.get(reverse('products')), f"Product {rows - 1}")
+
+    @query_budget(constant(9))
+    def test_product_add(self, rows, measure):
+        category = self.make_chain(rows)
+        with measure():
+            self.client.get(reverse('product_add'))
+            response = self.client.post(reverse('product_add'), {'name': "New", 'category': category.id, 'price': '3.00'})
+        self.assertRedirects(response, reverse('products'), fetch_redirect_response=False)
+
+    @query_budget(constant(4))
+    def test_order_list(self, rows, measure):
+        self.make_orders(rows)
+        with measure():
+            self.assertContains(self.client.get(reverse('orders')), f"Customer {rows - 1}")
+
+    @query_budget(constant(12))
+    def test_order_add(self, rows, measure):
+        customers, products = self.make_catalog(rows)
+        data = {'customer': customers[0].id, 'products': [product.id for product in products]}
+        with measure():
+            self.client.get(reverse('order_add'))
+            response = self.client.post(reverse('order_add'), data)
+        self.assertRedirects(response, reverse('orders'), fetch_redirect_response=False)
+
+    # REST API
+
+    @query_budget(constant(1))
+    def test_api_customer_list(self, rows, measure):
+        self.make_catalog(rows)
+        with measure():
+            self.assertEqual(len(self.api_client.get(reverse('customer-list')).data['results']), rows)
+
+    @query_budget(constant(2))
+    def test_api_customer_search(self, rows, measure):
+        self.make_catalog(rows)
+        with measure():
+            self.assertEqual(len(self.api_client.get(reverse('customer-search'), {'q': 'cust'}).data), rows)
+
+    @query_budget(constant(5))
+    def test_api_customer_batch_create(self, rows, measure):
+        payload = [{'name': f"New {i}", 'code': f"NEW{i:03d}"} for i in range(rows)]
+        with measure():
+            response = self.api_client.post(reverse('customer-list'), payload, format='json')
+        self.assertEqual(response.status_code, 201)
+
+    @query_budget(constant(6))
+    def test_api_customer_upsert(self, rows, measure):
+        customers, _ = self.make_catalog(rows)
+        payload = [{'name': f"Renamed {i}", 'code': customer.code} for i, customer in enumerate(customers)]
+        payload.append({'name': "New", 'code': "NEW01"})
+        with measure():
+            self.assertEqual(self.api_client.post(reverse('customer-upsert'), payload, format='json').status_code, 201)
+
+    @query_budget(constant(2))
+    def test_api_category_list(self, rows, measure):
+        self.make_chain(rows)
+        with measure():
+            self.assertEqual(self.api_client.get(reverse('category-list')).status_code, 200)
+
+    @query_budget(constant(9))
+    def test_api_category_create(self, rows, measure):
+        parent = self.make_chain(rows)
+        with measure():
+            response = self.api_client.post(reverse('category-list'), {'name': "New", 'parent': parent.id}, format='json')
+        self.assertEqual(response.status_code, 201)
+
+    @query_budget(constant(1))
+    def test_api_category_price_stats(self, rows, measure):
+        self.make_catalog(rows)
+        ids = ','.join(str(pk) for pk in Category.objects.values_list('id', flat=True))
+        with measure():
+            self.assertEqual(len(self.api_client.get(reverse('category-price-stats'), {'ids': ids}).data), rows + 1)
+
+    @query_budget(constant(2))
+    def test_api_product_list(self, rows, measure):
+        self.make_catalog(rows)
+        with measure():
+            self.assertEqual(len(self.api_client.get(reverse('product-list')).data['results']), rows)
+
+    @query_budget(constant(2))
+    def test_api_product_search(self, rows, measure):
+        self.make_catalog(rows)
+        with measure():
+            response = self.api_client.get(reverse('product-search'), {'q': 'prod', 'category': self.root.id})
+        self.assertEqual(len(response.data), rows)
+
+    @query_budget(constant(10))
+    def test_api_product_batch_create(self, rows, measure):
+        categories = [self.make_chain(1) for _ in range(rows)]
+        payload = [{'name': f"New {i}", 'category': category.id, 'price': '2.00'} for i, category in enumerate(categories)]
+        with measure():
+            self.assertEqual(self.api_client.post(reverse('product-list'), payload, format='json').status_code, 201)
+
+    @query_budget(constant(11))
+    def test_api_product_upsert(self, rows, measure):
+        _, products = self.make_catalog(rows)
+        payload = [{'id': product.id, 'name': product.name, 'category': product.category_id, 'price': '9.00'}
+                   for product in products]
+        with measure():
+            self.assertEqual(self.api_client.post(reverse('product-upsert'), payload, format='json').status_code, 200)
+
+    @query_budget(constant(2))
+    def test_api_order_list(self, rows, measure):
+        self.make_orders(rows)
+        with measure():
+            self.assertEqual(len(self.api_client.get(reverse('order-list')).data['results']), rows)
+
+    @query_budget(constant(2))
+    def test_api_order_detail(self, rows, measure):
+        _, products = self.make_catalog(rows)
+        order = Order.objects.create(customer=Customer.objects.first())
+        OrderItem.objects.bulk_create([OrderItem(order=order, product=product, price=1) for product in products])
+        with measure():
+            response = self.api_client.get(reverse('order-detail', args=[order.id]))
+        self.assertEqual(len(response.data['order_items']), rows)
+
+    @query_budget(constant(13))
+    def test_api_order_create(self, rows, measure):
+        _, products = self.make_catalog(rows)
+        with measure():
+            response = self.api_client.post(reverse('order-list'), self.order_payload(products), format='json')
+        self.assertEqual(response.status_code, 201)
+
+    @query_budget(constant(18))
+    def test_api_order_create_async(self, rows, measure):
+        _, products = self.make_catalog(rows)
+        payload = self.order_payload(products)
+        with patch('core.notifications.send_sms', return_value={"status": "success"}), measure():
+            response = self.client.post(reverse('order-create-async'), payload, content_type='application/json')
+        self.assertEqual(response.status_code, 201)
+
+    @query_budget(constant(3))
+    def test_api_order_export(self, rows, measure):
+        self.make_orders(rows)
+        with measure():
+            response = self.api_client.get(reverse('order-export'), {'output': 'ndjson'})
+            lines = b''.join(response.streaming_content).splitlines()
+        self.assertEqual(len(lines), rows)
+
+    @query_budget(constant(11))
+    def test_api_order_import(self, rows, measure):
+        customers, products = self.make_catalog(rows)
+        payload = [
+            {'customer': customer.code, 'order_items': [{'product': product.id, 'quantity': 1}]}
+            for customer, product in zip(customers, products)
+        ]
+        with measure():
+            response = self.api_client.post(reverse('order-import'), payload, format='json')
+        self.assertEqual(response.data['created'], rows)
+
+    @query_budget(constant(1))
+    def test_api_category_average_price(self, rows, measure):
+        self.make_catalog(rows)
+        url = reverse('order-category-average-price', kwargs={'category_id': self.root.id})
+        with measure():
+            self.assertEqual(self.api_client.get(url).data['product_count'], rows)
+
+    @query_budget(constant(5))
+    def test_api_reports(self, rows, measure):
+        for order in self.make_orders(rows):
+            # One day of sales per order
+            Order.objects.filter(id=order.id).update(time=order.time - timedelta(days=order.id))
+        call_command('rebuild_rollups', '--skip-price-stats', stdout=StringIO())
+        with measure():
+            self.assertEqual(len(self.api_client.get(reverse('report-list')).data), rows)
+            by_category = self.api_client.get(reverse('report-top'), {'by': 'category', 'level': 1, 'limit': 50})
+            by_customer = self.api_client.get(reverse('report-top'), {'by': 'customer', 'limit': 50})
+        self.assertEqual((len(by_category.data), len(by_customer.data)), (rows, rows))
+
+    # The facility itself
+
+    def test_budget_catches_per_row_queries(self):
+        def list_names(test_case, rows, measure):
+            orders = self.make_orders(rows)
+            with measure():
+                [order.customer.name for order in Order.objects.filter(id__in=[order.id for order in orders])]
+
+        # The base fits the small size, so only the growth gives it away.
+        with self.assertRaisesMessage(AssertionError, 'grew from 3 to 11 queries'):
+            query_budget(constant(11))(list_names)(self)
+        query_budget(per_row(1))(list_names)(self)
+
+class ReadReplicaRoutingTestCase(TransactionTestCase):
+    databases = {'default', 'read'}
+
+    def test_reads_use_read_connection_only_inside_read_replica(self):
+        Customer.objects.create(name="Reader", code="RD001")
+        self.assertEqual(Customer.objects.all().db, 'default')
+        with read_replica():
+            self.assertEqual(Customer.objects.all().db, 'read')
+            self.assertEqual(Customer.objects.get(code="RD001").name, "Reader")
+            with transaction.atomic():
+                self.assertEqual(Customer.objects.all().db, 'default')
+            Customer.objects.create(name="Writer", code="WR001")
+        self.assertEqual(Customer.objects.count(), 2)
+
+    def test_sqlite_pragmas_are_applied(self):
+        with connections['default'].cursor() as cursor:
+            cursor.execute('PRAGMA busy_timeout')
+            self.assertEqual(cursor.fetchone()[0], 5000)
+        with connections['read'].cursor() as cursor:
+            cursor.execute('PRAGMA query_only')
+            self.assertEqual(cursor.fetchone()[0], 1)
+
 class SimpleTestCase(TestCase):
     def test_basic(self):
         self.assertEqual(1 + 1, 2)
\ No newline at end of file
@@ -7,6 +7,7 @@ router.register(r'customers', views.CustomerViewSet)
 router.register(r'categories', views.CategoryViewSet)
 router.register(r'products', views.ProductViewSet)
 router.register(r'orders', views.OrderViewSet)
+router.register(r'reports', views.ReportViewSet, basename='report')
 
 urlpatterns = [
     path('', views.HomeView.as_view(), name='home'),
@@ -18,7 +19,10 @@ urlpatterns = [
     path('products/add/', views.ProductCreateView.as_view(), name='product_add'),
     path('orders/', views.OrderListView.as_view(), name='orders'),
     path('orders/add/', views.OrderCreateView.as_view(), name='order_add'),
+    # Ahead of the router, whose order detail route would match "async"
+    path('api/orders/async/', views.OrderCreateAsyncView.as_view(), name='order-create-async'),
     path('api/', include(router.urls)),
+    path('metrics', views.MetricsView.as_view(), name='metrics'),
     
     path('logout/', views.oidc_logout, name='logout'),
 ]
\ No newline at end of file
@@ -0,0 +1,109 @@
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from cryptography.hazmat.primitives.asymmetric import rsa
+import josepy as jose
+import json
+import threading
+import time
+
+
+class _FakeOIDCHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    def do_GET(self):
+        server = self.server
+        server.hits[self.path] = server.hits.get(self.path, 0) + 1
+        if self.path == '/.well-known/jwks.json':
+            self._send_json(200, {'keys': [server.public_jwk]})
+        elif self.path == '/userinfo':
+            token = self.headers.get('Authorization', '').partition(' ')[2]
+            claims = server.tokens.get(token)
+            if claims is None or claims.get('exp', float('inf')) <= time.time():
+                self._send_json(401, {}, {
+                    'WWW-Authenticate': 'Bearer error="invalid_token", error_description="Invalid token"'
+                })
+            else:
+                self._send_json(200, claims)
+        else:
+            self._send_json(404, {})
+
+    def _send_json(self, status, payload, headers=None):
+        body = json.dumps(payload).encode()
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+class FakeOIDCProvider:
+    """Local stand-in for the Auth0 userinfo and JWKS endpoints.
+
+    Issues RS256-signed access tokens and counts requests per path, so tests
+    and benchmarks can check how often the API calls out to the provider::
+
+        with FakeOIDCProvider() as idp, override_settings(**idp.settings()):
+            token = idp.issue_token({'email': 'user@example.com'})
+        idp.hits  # {'/userinfo': 1}
+    """
+
+    kid = 'fake-oidc-key'
+    audience = 'https://fake-api/'
+
+    def __init__(self, host='127.0.0.1', port=0):
+        self._private_jwk = jose.JWKRSA(key=rsa.generate_private_key(public_exponent=65537, key_size=2048))
+        public_jwk = self._private_jwk.public_key().to_json()
+        public_jwk.update(kid=self.kid, alg='RS256', use='sig')
+        self._httpd = ThreadingHTTPServer((host, port), _FakeOIDCHandler)
+        self._httpd.public_jwk = public_jwk
+        self._httpd.tokens = {}
+        self._httpd.hits = {}
+        self._thread = None
+
+    @property
+    def url(self):
+        host, port = self._httpd.server_address[:2]
+        return f"http://{host}:{port}"
+
+    @property
+    def hits(self):
+        return self._httpd.hits
+
+    def settings(self):
+        return {
+            'OIDC_OP_USER_ENDPOINT': f"{self.url}/userinfo",
+            'OIDC_OP_JWKS_ENDPOINT': f"{self.url}/.well-known/jwks.json",
+            'OIDC_OP_ISSUER': f"{self.url}/",
+            'OIDC_API_AUDIENCE': self.audience,
+        }
+
+    def issue_token(self, claims, expires_in=3600):
+        """Sign and register an access token carrying ``claims``."""
+        claims = dict({
+            'iss': f"{self.url}/", 'aud': self.audience, 'sub': 'fake|user', 'exp': int(time.time()) + expires_in,
+        }, **claims)
+        token = jose.JWS.sign(
+            json.dumps(claims).encode(), key=self._private_jwk, alg=jose.RS256,
+            protect=frozenset(['alg', 'kid']), kid=self.kid,
+        ).to_compact().decode()
+        self._httpd.tokens[token] = claims
+        return token
+
+    def start(self):
+        self._thread = threading.Thread(target=self._httpd.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._httpd.shutdown()
+        self._httpd.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc_info):
+        self.stop()
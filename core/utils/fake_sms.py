@@ -0,0 +1,72 @@
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs
+import json
+import threading
+
+
+class _FakeSMSHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    def do_POST(self):
+        length = int(self.headers.get('Content-Length', 0))
+        data = {key: values[0] for key, values in parse_qs(self.rfile.read(length).decode()).items()}
+        recipients = data.get('to', '').split(',')
+        self.server.requests.append({'path': self.path, 'data': data, 'client': self.client_address})
+        body = json.dumps({
+            'SMSMessageData': {
+                'Message': f"Sent to {len(recipients)}/{len(recipients)}",
+                'Recipients': [
+                    {'number': number, 'status': 'Success', 'statusCode': 101, 'messageId': f"ATXid_{i}"}
+                    for i, number in enumerate(recipients)
+                ],
+            }
+        }).encode()
+        self.send_response(201)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+class FakeSMSServer:
+    """Local stand-in for the Africa's Talking messaging API.
+
+    Point ``AFRICASTALKING_API_URL`` at ``server.url`` to send SMS here
+    instead of the real provider, e.g. in tests and benchmarks::
+
+        with FakeSMSServer() as server, override_settings(AFRICASTALKING_API_URL=server.url):
+            send_sms('+254700000000', 'hello')
+        server.requests  # [{'path': ..., 'data': ..., 'client': ...}]
+    """
+
+    def __init__(self, host='127.0.0.1', port=0):
+        self._httpd = ThreadingHTTPServer((host, port), _FakeSMSHandler)
+        self._httpd.requests = []
+        self._thread = None
+
+    @property
+    def url(self):
+        host, port = self._httpd.server_address[:2]
+        return f"http://{host}:{port}"
+
+    @property
+    def requests(self):
+        return self._httpd.requests
+
+    def start(self):
+        self._thread = threading.Thread(target=self._httpd.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._httpd.shutdown()
+        self._httpd.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc_info):
+        self.stop()
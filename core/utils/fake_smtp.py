@@ -0,0 +1,106 @@
+from socketserver import StreamRequestHandler, ThreadingTCPServer
+import threading
+
+
+class _FakeSMTPHandler(StreamRequestHandler):
+
+    def handle(self):
+        self._reply('220 fake-smtp ready')
+        envelope = {'from': None, 'to': []}
+        while True:
+            line = self.rfile.readline()
+            if not line:
+                return
+            command = line.decode('utf-8', 'replace').rstrip('\r\n')
+            verb = command.split(' ', 1)[0].upper()
+            if verb == 'EHLO':
+                # AUTH is advertised so backends configured with credentials can log in.
+                self._reply('250-fake-smtp', '250 AUTH PLAIN')
+            elif verb == 'HELO':
+                self._reply('250 fake-smtp')
+            elif verb == 'AUTH':
+                self._reply('235 Authentication successful')
+            elif verb == 'MAIL':
+                envelope = {'from': command.partition(':')[2].strip(), 'to': []}
+                self._reply('250 OK')
+            elif verb == 'RCPT':
+                envelope['to'].append(command.partition(':')[2].strip())
+                self._reply('250 OK')
+            elif verb == 'DATA':
+                self._reply('354 End data with <CR><LF>.<CR><LF>')
+                self.server.messages.append(dict(envelope, data=self._read_data(), client=self.client_address))
+                envelope = {'from': None, 'to': []}
+                self._reply('250 OK')
+            elif verb in ('RSET', 'NOOP'):
+                self._reply('250 OK')
+            elif verb == 'QUIT':
+                self._reply('221 Bye')
+                return
+            else:
+                self._reply('502 Command not implemented')
+
+    def _read_data(self):
+        lines = []
+        while True:
+            line = self.rfile.readline()
+            if not line or line == b'.\r\n':
+                return b''.join(lines).decode('utf-8', 'replace')
+            # Undo dot-stuffing (RFC 5321, 4.5.2).
+            lines.append(line[1:] if line.startswith(b'..') else line)
+
+    def _reply(self, *lines):
+        self.wfile.write(''.join(f'{line}\r\n' for line in lines).encode())
+
+
+class _ThreadingSMTPServer(ThreadingTCPServer):
+    allow_reuse_address = True
+    daemon_threads = True
+
+
+class FakeSMTPServer:
+    """Local SMTP sink that accepts and records every message.
+
+    Point ``EMAIL_HOST``/``EMAIL_PORT`` at it (``server.settings()``) to
+    deliver mail here instead of the real relay, e.g. in benchmarks::
+
+        with FakeSMTPServer() as server, override_settings(**server.settings()):
+            send_mail('subject', 'body', 'from@example.com', ['to@example.com'])
+        server.messages  # [{'from': ..., 'to': [...], 'data': ..., 'client': ...}]
+    """
+
+    def __init__(self, host='127.0.0.1', port=0):
+        self._server = _ThreadingSMTPServer((host, port), _FakeSMTPHandler)
+        self._server.messages = []
+        self._thread = None
+
+    @property
+    def address(self):
+        return self._server.server_address[:2]
+
+    @property
+    def messages(self):
+        return self._server.messages
+
+    def settings(self):
+        host, port = self.address
+        return {
+            'EMAIL_DELIVERY_BACKEND': 'django.core.mail.backends.smtp.EmailBackend',
+            'EMAIL_HOST': host,
+            'EMAIL_PORT': port,
+            'EMAIL_USE_TLS': False,
+        }
+
+    def start(self):
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc_info):
+        self.stop()
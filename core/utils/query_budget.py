@@ -0,0 +1,86 @@
+"""Query-count budgets for views, checked at more than one dataset size.
+
+A budget is a formula in the number of rows a test creates: ``constant(4)``
+allows four queries whatever the size, ``per_row(3, 1)`` three plus one per
+row. ``query_budget`` runs a test method once per size, each time in a
+savepoint that is rolled back afterwards, and fails when the queries counted
+inside ``measure()`` exceed the budget at any size or grow faster with the
+data than the formula allows, which is how a new N+1 shows up::
+
+    class OrderQueryBudgetTests(TestCase):
+        @query_budget(constant(4))
+        def test_order_list(self, rows, measure):
+            make_orders(rows)
+            with measure():
+                self.client.get('/orders/')
+"""
+from contextlib import contextmanager
+from django.db import DEFAULT_DB_ALIAS, connections, transaction
+from django.test.utils import CaptureQueriesContext
+import functools
+
+DEFAULT_SIZES = (2, 10)
+
+class Budget:
+    """``base + rate * rows`` queries."""
+
+    def __init__(self, base, rate=0):
+        self.base = base
+        self.rate = rate
+
+    def allowed(self, rows):
+        return self.base + self.rate * rows
+
+    def __str__(self):
+        if not self.rate:
+            return f"constant ({self.base} queries)"
+        return f"{self.base} + {self.rate} per row"
+
+def constant(queries):
+    """At most ``queries`` queries, however many rows there are."""
+    return Budget(queries)
+
+def per_row(base, rate=1):
+    """At most ``base`` queries plus ``rate`` for every row."""
+    return Budget(base, rate)
+
+def query_budget(budget, sizes=DEFAULT_SIZES, using=DEFAULT_DB_ALIAS):
+    """Run the decorated ``test(self, rows, measure)`` once for each of
+    ``sizes`` and check the queries run inside ``measure()`` against
+    ``budget``."""
+    def decorator(test):
+        @functools.wraps(test)
+        def wrapper(self):
+            counts = {}
+            captured = {}
+            for rows in sizes:
+                contexts = []
+
+                @contextmanager
+                def measure():
+                    with CaptureQueriesContext(connections[using]) as context:
+                        yield context
+                    contexts.append(context)
+
+                with transaction.atomic(using=using):
+                    test(self, rows, measure)
+                    transaction.set_rollback(True, using=using)
+                if not contexts:
+                    self.fail(f"{test.__name__} never entered measure()")
+                counts[rows] = sum(len(context) for context in contexts)
+                captured[rows] = [query['sql'] for context in contexts for query in context.captured_queries]
+
+            problems = [
+                f"{counts[rows]} queries with {rows} rows" for rows in sizes if counts[rows] > budget.allowed(rows)
+            ]
+            smallest, largest = min(sizes), max(sizes)
+            if counts[largest] - counts[smallest] > budget.rate * (largest - smallest):
+                problems.append(f"grew from {counts[smallest]} to {counts[largest]} queries")
+            if problems:
+                queries = '\n'.join(f"{index}. {sql}" for index, sql in enumerate(captured[largest], start=1))
+                self.fail(
+                    f"{test.__name__} is over its query budget, {budget}: {'; '.join(problems)}.\n"
+                    f"Queries with {largest} rows:\n{queries}"
+                )
+        return wrapper
+    return decorator
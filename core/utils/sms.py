@@ -1,20 +1,87 @@
 from django.conf import settings
-import africastalking
+from django.core.signals import setting_changed
+from django.dispatch import receiver
+from africastalking.SMS import SMSService
+from africastalking.Service import AfricasTalkingException
+from requests.adapters import HTTPAdapter
+from core.instrumentation import track_external
+import requests
+import threading
 import logging
 
 logger = logging.getLogger(__name__)
 
-def send_sms(phone_number, message):
-    """Send SMS using Africa's Talking API."""
-    try:
-        africastalking.initialize(
-            username=settings.AFRICASTALKING_USERNAME,
-            api_key=settings.AFRICASTALKING_API_KEY
+_client = None
+_client_lock = threading.Lock()
+
+class PooledSMSService(SMSService):
+    """Africa's Talking SMS service that sends through a shared keep-alive session.
+
+    The stock SDK calls ``requests.post`` for every message, which opens a new
+    connection (and TLS handshake) each time and has no timeout.
+    """
+
+    def __init__(self, username, api_key, session, timeout, base_url=None):
+        self._session = session
+        self._timeout = timeout
+        super().__init__(username, api_key)
+        if base_url:
+            self._baseUrl = base_url.rstrip('/')
+
+    def _make_request(self, url, method, headers, data, params, callback=None):
+        response = self._session.request(
+            method, url, headers=headers, data=data, params=params, timeout=self._timeout
         )
-        sms = africastalking.SMS
-        response = sms.send(message, [phone_number])
-        logger.info(f"SMS sent to {phone_number}: {response}")
+        if not 200 <= response.status_code < 300:
+            raise AfricasTalkingException(response.text)
+        if response.headers.get('content-type', '').startswith('application/json'):
+            return response.json()
+        return response.text
+
+def get_sms_client():
+    """Return the process-wide SMS client, creating it on first use."""
+    global _client
+    if _client is None:
+        with _client_lock:
+            if _client is None:
+                session = requests.Session()
+                adapter = HTTPAdapter(pool_connections=1, pool_maxsize=settings.SMS_POOL_SIZE)
+                session.mount('https://', adapter)
+                session.mount('http://', adapter)
+                _client = PooledSMSService(
+                    settings.AFRICASTALKING_USERNAME,
+                    settings.AFRICASTALKING_API_KEY,
+                    session=session,
+                    timeout=(settings.SMS_CONNECT_TIMEOUT, settings.SMS_READ_TIMEOUT),
+                    base_url=settings.AFRICASTALKING_API_URL,
+                )
+    return _client
+
+def reset_sms_client():
+    """Drop the cached client so the next send picks up current settings."""
+    global _client
+    with _client_lock:
+        if _client is not None:
+            _client._session.close()
+        _client = None
+
+@receiver(setting_changed)
+def _reset_on_setting_change(setting, **kwargs):
+    if setting.startswith(('AFRICASTALKING_', 'SMS_')):
+        reset_sms_client()
+
+def send_bulk_sms(phone_numbers, message):
+    """Send one message to many recipients in a single provider call."""
+    phone_numbers = list(phone_numbers)
+    try:
+        with track_external('sms'):
+            response = get_sms_client().send(message, phone_numbers)
+        logger.info("SMS sent to %s: %s", ', '.join(phone_numbers), response)
         return response
     except Exception as e:
-        logger.error(f"Failed to send SMS to {phone_number}: {e}")
-        return None
\ No newline at end of file
+        logger.error("Failed to send SMS to %s: %s", ', '.join(phone_numbers), e)
+        return None
+
+def send_sms(phone_number, message):
+    """Send SMS using Africa's Talking API."""
+    return send_bulk_sms([phone_number], message)
@@ -5,13 +5,45 @@ from django.contrib import messages
 from rest_framework import viewsets
 from rest_framework.permissions import IsAuthenticated
 from rest_framework.decorators import action
+from rest_framework.exceptions import ValidationError
 from rest_framework.response import Response
-from .models import Customer, Category, Product, Order, OrderItem
-from .serializers import CustomerSerializer, CategorySerializer, ProductSerializer, OrderSerializer
-from django.db.models import Avg
+from .models import (
+    Customer, Category, CategoryPriceStats, DailySales, Product, Order, OrderItem,
+    add_to_daily_sales, catalog_change_marker, credit_sales_categories, mark_catalog_changed,
+    refresh_category_lineage_stats, refresh_category_stats,
+)
+from .serializers import (
+    CustomerSerializer, CustomerBatchSerializer, CategorySerializer, CategoryPriceStatsSerializer,
+    ProductSerializer, ProductBatchSerializer, OrderSerializer
+)
+from .pagination import OrderCursorPagination
+from .catalog_cache import cached_catalog
+from .instrumentation import render_metrics
+from .notifications import notify_order_now
+from .exports import EXPORT_FORMATS
+from .imports import IMPORT_FORMATS, import_orders, parse_json
+from customer_order_api.database import read_replica
+from asgiref.sync import sync_to_async
+from django.core.exceptions import ValidationError as DjangoValidationError
+from django.db import transaction
+from django.db.models import Prefetch, Q, Sum
+from django.db.models.functions import Lower, TruncDay, TruncMonth, TruncWeek
 from django.contrib.auth import logout
+from django.core.paginator import Paginator
+from django.http import HttpResponse, StreamingHttpResponse
+from django.utils import timezone
+from django.utils.cache import get_conditional_response
+from django.utils.crypto import constant_time_compare
+from django.utils.http import http_date
+from django.utils.dateparse import parse_date, parse_datetime
+from bisect import bisect_right
+from datetime import datetime, time
 from django.conf import settings
+from django.utils.decorators import method_decorator
 from django.views.decorators.csrf import csrf_exempt
+import codecs
+import copy
+import csv
 import urllib.parse
 import logging
 import uuid
@@ -21,8 +53,7 @@ logger = logging.getLogger(__name__)
 @csrf_exempt
 def oidc_logout(request):
     """Custom OIDC logout function to clear session and redirect to Auth0 logout."""
-    logger.debug(f"Logout initiated. Session before: {dict(request.session.items())}")
-    logger.debug(f"Request headers: {dict(request.headers)}")
+    logger.debug("Logout initiated for user %s", request.user.pk)
     
     try:
         # Check if logout has already been processed
@@ -38,32 +69,118 @@ def oidc_logout(request):
         # Clear session
         logout(request)
         request.session.flush()
-        logger.debug(f"Session after logout: {dict(request.session.items())}")
         
         # Construct Auth0 logout URL
         logout_url = settings.OIDC_OP_LOGOUT_URL
         return_to = urllib.parse.quote(settings.LOGOUT_REDIRECT_URL)
         full_logout_url = f"{logout_url}?client_id={settings.OIDC_RP_CLIENT_ID}&returnTo={return_to}"
-        logger.info(f"Redirecting to Auth0 logout: {full_logout_url}")
+        logger.info("Redirecting to Auth0 logout: %s", full_logout_url)
         return redirect(full_logout_url)
     except Exception as e:
-        logger.error(f"Logout error: {str(e)}")
+        logger.error("Logout error: %s", e)
         messages.error(request, "Error during logout. Session cleared locally.")
         # Ensure session is cleared even if Auth0 fails
         logout(request)
         request.session.flush()
         return redirect('home')
 
+class ReadReplicaMixin:
+    """Serve GET/HEAD requests from the read-only database connection."""
+
+    def dispatch(self, request, *args, **kwargs):
+        if request.method in ('GET', 'HEAD'):
+            with read_replica():
+                return super().dispatch(request, *args, **kwargs)
+        return super().dispatch(request, *args, **kwargs)
+
+def paginate(request, queryset):
+    """Return the requested page of ``queryset`` for the HTML list views."""
+    paginator = Paginator(queryset, settings.LIST_PAGE_SIZE)
+    return paginator.get_page(request.GET.get('page'))
+
+def catalog_list(table, queryset):
+    """``list(queryset)`` through the catalog cache, for the form views."""
+    return cached_catalog(table, str(queryset.query), lambda: list(queryset))
+
+def prefix_search(queryset, field, prefix):
+    """Case-insensitive prefix match on ``field``, written as a range over
+    ``Lower(field)`` so it is answered from that expression index."""
+    key = f'{field}_key'
+    queryset = queryset.annotate(**{key: Lower(field)})
+    if prefix:
+        prefix = prefix.lower()
+        queryset = queryset.filter(**{f'{key}__gte': prefix, f'{key}__lt': prefix + '\U0010ffff'})
+    return queryset.order_by(key, 'id')
+
+def typeahead_limit(request):
+    limit = int(request.query_params.get('limit') or settings.TYPEAHEAD_LIMIT)
+    if limit < 1:
+        raise ValueError(limit)
+    return min(limit, settings.TYPEAHEAD_MAX_LIMIT)
+
+class CatalogCacheMixin:
+    """Serve API list pages from the catalog cache until the table changes."""
+
+    def list(self, request, *args, **kwargs):
+        build = super().list
+        data = cached_catalog(
+            self.queryset.model._meta.model_name,
+            f'api:{request.build_absolute_uri()}',
+            lambda: build(request, *args, **kwargs).data,
+            version=getattr(self, 'catalog_etag', None),
+        )
+        return Response(data)
+
+class ConditionalCatalogMixin:
+    """ETag/Last-Modified on API reads from the table's ``CatalogVersion``.
+
+    Unchanged polls get a 304 after one primary-key read, before any row is
+    read or serialized. ``CatalogCacheMixin`` keys the body on the same
+    ETag, so a body and its validators always match.
+    """
+
+    def conditional(self, handler, request, *args, **kwargs):
+        etag, last_modified = catalog_change_marker(self.queryset.model._meta.model_name)
+        self.catalog_etag = etag
+        response = get_conditional_response(request, etag=etag, last_modified=last_modified)
+        if response is None:
+            response = handler(request, *args, **kwargs)
+            if response.status_code == 200:
+                response['ETag'] = etag
+                response['Last-Modified'] = http_date(last_modified)
+        return response
+
+    def list(self, request, *args, **kwargs):
+        return self.conditional(super().list, request, *args, **kwargs)
+
+    def retrieve(self, request, *args, **kwargs):
+        return self.conditional(super().retrieve, request, *args, **kwargs)
+
 class HomeView(View):
     def get(self, request):
         if not request.user.is_authenticated:
-            logger.debug(f"Unauthenticated user accessing homepage, redirecting to login. Session: {dict(request.session.items())}")
+            logger.debug("Unauthenticated user accessing homepage, redirecting to login")
             return redirect(settings.LOGIN_URL)
         return render(request, 'home.html')
 
-class CustomerListView(LoginRequiredMixin, View):
+class MetricsView(View):
+    """Prometheus scrape endpoint for the figures from core.instrumentation.
+
+    Needs ``Authorization: Bearer <METRICS_TOKEN>``; without a token
+    configured it is only served under DEBUG.
+    """
+
     def get(self, request):
-        customers = Customer.objects.all()
+        token = settings.METRICS_TOKEN
+        if not token and not settings.DEBUG:
+            return HttpResponse(status=404)
+        if token and not constant_time_compare(request.headers.get('Authorization', ''), f'Bearer {token}'):
+            return HttpResponse(status=401)
+        return HttpResponse(render_metrics(), content_type='text/plain; version=0.0.4; charset=utf-8')
+
+class CustomerListView(ReadReplicaMixin, LoginRequiredMixin, View):
+    def get(self, request):
+        customers = paginate(request, Customer.objects.order_by('name', 'id'))
         return render(request, 'customers.html', {'customers': customers})
 
 class CustomerCreateView(LoginRequiredMixin, View):
@@ -85,14 +202,14 @@ class CustomerCreateView(LoginRequiredMixin, View):
             messages.error(request, f'Error adding customer: {str(e)}')
             return render(request, 'customer_form.html')
 
-class CategoryListView(LoginRequiredMixin, View):
+class CategoryListView(ReadReplicaMixin, LoginRequiredMixin, View):
     def get(self, request):
-        categories = Category.objects.all()
+        categories = paginate(request, Category.objects.select_related('parent'))
         return render(request, 'categories.html', {'categories': categories})
 
 class CategoryCreateView(LoginRequiredMixin, View):
     def get(self, request):
-        categories = Category.objects.all()
+        categories = catalog_list('category', Category.objects.all())
         return render(request, 'category_form.html', {'categories': categories})
 
     def post(self, request):
@@ -107,16 +224,16 @@ class CategoryCreateView(LoginRequiredMixin, View):
             return redirect('categories')
         except Exception as e:
             messages.error(request, f'Error adding category: {str(e)}')
-            return render(request, 'category_form.html', {'categories': Category.objects.all()})
+            return render(request, 'category_form.html', {'categories': catalog_list('category', Category.objects.all())})
 
-class ProductListView(LoginRequiredMixin, View):
+class ProductListView(ReadReplicaMixin, LoginRequiredMixin, View):
     def get(self, request):
-        products = Product.objects.all()
+        products = paginate(request, Product.objects.select_related('category').order_by('name', 'id'))
         return render(request, 'products.html', {'products': products})
 
 class ProductCreateView(LoginRequiredMixin, View):
     def get(self, request):
-        categories = Category.objects.all()
+        categories = catalog_list('category', Category.objects.all())
         return render(request, 'product_form.html', {'categories': categories})
 
     def post(self, request):
@@ -133,18 +250,22 @@ class ProductCreateView(LoginRequiredMixin, View):
             return redirect('products')
         except Exception as e:
             messages.error(request, f'Error adding product: {str(e)}')
-            return render(request, 'product_form.html', {'categories': Category.objects.all()})
+            return render(request, 'product_form.html', {'categories': catalog_list('category', Category.objects.all())})
 
-class OrderListView(LoginRequiredMixin, View):
+class OrderListView(ReadReplicaMixin, LoginRequiredMixin, View):
     def get(self, request):
-        orders = Order.objects.all()
+        orders = paginate(
+            request,
+            Order.objects.select_related('customer').prefetch_related(
+                Prefetch('order_items', queryset=OrderItem.objects.select_related('product'))
+            ).order_by('-time', '-id')
+        )
         return render(request, 'orders.html', {'orders': orders})
 
 class OrderCreateView(LoginRequiredMixin, View):
     def get(self, request):
-        customers = Customer.objects.all()
-        products = Product.objects.all()
-        return render(request, 'order_form.html', {'customers': customers, 'products': products})
+        # Customers and products are looked up on demand through the search endpoints.
+        return render(request, 'order_form.html')
 
     def post(self, request):
         customer_id = request.POST.get('customer')
@@ -153,46 +274,166 @@ class OrderCreateView(LoginRequiredMixin, View):
             if not customer_id or not product_ids:
                 raise ValueError("Customer and products are required.")
             customer = Customer.objects.get(id=customer_id)
-            order = Order.objects.create(customer=customer)
+            products = Product.objects.in_bulk(product_ids)
+            order_items = []
             total_amount = 0
             for product_id in product_ids:
-                product = Product.objects.get(id=product_id)
+                product = products.get(int(product_id))
+                if product is None:
+                    raise Product.DoesNotExist(f"Product {product_id} does not exist.")
                 quantity_key = f'quantity_{product_id}'
                 quantity = int(request.POST.get(quantity_key, 1))
                 if quantity <= 0:
                     raise ValueError("Quantity must be positive.")
                 price = product.price
-                OrderItem.objects.create(
-                    order=order,
-                    product=product,
-                    quantity=quantity,
-                    price=price
-                )
+                order_items.append(OrderItem(product=product, quantity=quantity, price=price))
                 total_amount += quantity * price
-            order.total_amount = total_amount
-            order.save()
+            # The order is saved once with its final total, so post_save never sees a partial order
+            with transaction.atomic():
+                order = Order.objects.create(customer=customer, total_amount=total_amount)
+                for item in order_items:
+                    item.order = order
+                credit_sales_categories(order_items)
+                OrderItem.objects.bulk_create(order_items)
+                add_to_daily_sales(order_items)
             messages.success(request, 'Order added successfully!')
             return redirect('orders')
         except Exception as e:
             messages.error(request, f'Error adding order: {str(e)}')
-            return render(request, 'order_form.html', {
-                'customers': Customer.objects.all(),
-                'products': Product.objects.all(),
-                'error': str(e)
-            })
+            return render(request, 'order_form.html', {'error': str(e)})
 
-class CustomerViewSet(viewsets.ModelViewSet):
-    queryset = Customer.objects.all()
-    serializer_class = CustomerSerializer
-    permission_classes = [IsAuthenticated]
+class BatchWriteMixin:
+    """List payloads for ``create`` plus a ``POST <list>/upsert/`` action.
+
+    Each row is validated on its own against ``batch_serializer_class`` and an
+    invalid row is reported by index without failing the rest. Existing rows
+    are matched on ``batch_key`` with one query, and the valid rows are written
+    with ``bulk_create``/``bulk_update`` in a single transaction.
+    """
+    batch_serializer_class = None
+    batch_key = 'id'
+
+    def prepare_batch_serializer(self, serializer, rows):
+        """Hook to prefetch related objects for every row at once."""
+
+    def after_batch_write(self, created, updated):
+        """Hook for work the skipped model signals would have done.
+
+        ``updated`` holds ``(before, after)`` instance pairs."""
 
     def create(self, request, *args, **kwargs):
+        if isinstance(request.data, list):
+            return self.batch_write(request.data, upsert=False)
         try:
             return super().create(request, *args, **kwargs)
         except Exception as e:
             return Response({'error': str(e)}, status=400)
 
-class CategoryViewSet(viewsets.ModelViewSet):
+    @action(detail=False, methods=['post'])
+    def upsert(self, request):
+        if not isinstance(request.data, list):
+            return Response({'error': 'Expected a list of objects'}, status=400)
+        return self.batch_write(request.data, upsert=True)
+
+    def batch_write(self, rows, upsert):
+        if len(rows) > settings.API_BATCH_MAX_ROWS:
+            return Response({'error': f'At most {settings.API_BATCH_MAX_ROWS} rows per request'}, status=400)
+        model = self.queryset.model
+        key_field = model._meta.get_field(self.batch_key)
+        serializer = self.batch_serializer_class(context=self.get_serializer_context())
+        self.prepare_batch_serializer(serializer, rows)
+
+        keys = []
+        for row in rows:
+            try:
+                keys.append(key_field.to_python(row.get(self.batch_key)) if isinstance(row, dict) else None)
+            except DjangoValidationError:
+                keys.append(None)
+        existing = model.objects.in_bulk({key for key in keys if key is not None}, field_name=self.batch_key)
+
+        results, created, updated, update_fields, seen = [], [], [], set(), set()
+        for index, (row, key) in enumerate(zip(rows, keys)):
+            instance = existing.get(key)
+            errors = None
+            if not isinstance(row, dict):
+                errors = {'non_field_errors': ['Expected an object.']}
+            elif key is not None and key in seen:
+                errors = {self.batch_key: [f'Duplicate {self.batch_key} in this batch.']}
+            elif instance is not None and not upsert:
+                errors = {self.batch_key: [f'{model._meta.verbose_name} with this {self.batch_key} already exists.']}
+            elif key_field.primary_key and row.get(self.batch_key) is not None and instance is None:
+                errors = {self.batch_key: [f'{model._meta.verbose_name} {row[self.batch_key]} does not exist.']}
+            if errors is None:
+                try:
+                    data = serializer.run_validation(row)
+                except ValidationError as e:
+                    errors = e.detail
+            if errors is not None:
+                results.append({'index': index, 'status': 'error', 'errors': errors})
+                continue
+            seen.add(key)
+            if instance is None:
+                obj = model(**data)
+                created.append(obj)
+                results.append({'index': index, 'status': 'created', 'object': obj})
+            else:
+                before = copy.copy(instance)
+                for attr, value in data.items():
+                    setattr(instance, attr, value)
+                update_fields.update(data)
+                updated.append((before, instance))
+                results.append({'index': index, 'status': 'updated', 'object': instance})
+
+        if created or updated:
+            with transaction.atomic():
+                model.objects.bulk_create(created)
+                if updated:
+                    model.objects.bulk_update([obj for _, obj in updated], sorted(update_fields))
+                self.after_batch_write(created, updated)
+                # bulk writes skip the save signals that mark the catalog as changed
+                mark_catalog_changed(model._meta.model_name)
+        for result in results:
+            obj = result.pop('object', None)
+            if obj is not None:
+                result['id'] = obj.pk
+        return Response({
+            'created': len(created),
+            'updated': len(updated),
+            'errors': len(rows) - len(created) - len(updated),
+            'results': results,
+        }, status=(201 if created else 200) if created or updated else 400)
+
+class CustomerViewSet(ReadReplicaMixin, CatalogCacheMixin, BatchWriteMixin, viewsets.ModelViewSet):
+    queryset = Customer.objects.all()
+    serializer_class = CustomerSerializer
+    batch_serializer_class = CustomerBatchSerializer
+    batch_key = 'code'
+    permission_classes = [IsAuthenticated]
+
+    @action(detail=False, methods=['get'])
+    def search(self, request):
+        """Typeahead: customers whose name or code starts with ``q``."""
+        try:
+            limit = typeahead_limit(request)
+        except ValueError:
+            return Response({'error': 'limit must be a positive integer'}, status=400)
+        prefix = request.query_params.get('q', '').strip()
+
+        def build():
+            customers = Customer.objects.only('id', 'name', 'code')
+            matches = list(prefix_search(customers, 'name', prefix)[:limit])
+            if prefix:
+                seen = {customer.id for customer in matches}
+                matches += [
+                    customer for customer in prefix_search(customers, 'code', prefix)[:limit]
+                    if customer.id not in seen
+                ]
+                matches = sorted(matches, key=lambda customer: (customer.name.lower(), customer.id))[:limit]
+            return [{'id': customer.id, 'name': customer.name, 'code': customer.code} for customer in matches]
+
+        return Response(cached_catalog('customer', f'search:{prefix.lower()}:{limit}', build))
+
+class CategoryViewSet(ReadReplicaMixin, ConditionalCatalogMixin, CatalogCacheMixin, viewsets.ModelViewSet):
     queryset = Category.objects.all()
     serializer_class = CategorySerializer
     permission_classes = [IsAuthenticated]
@@ -203,21 +444,76 @@ class CategoryViewSet(viewsets.ModelViewSet):
         except Exception as e:
             return Response({'error': str(e)}, status=400)
 
-class ProductViewSet(viewsets.ModelViewSet):
+    @action(detail=False, methods=['get'], url_path='price-stats')
+    def price_stats(self, request):
+        """Subtree price statistics for ``?ids=1,2,3`` in a single query."""
+        try:
+            category_ids = [int(pk) for pk in request.query_params.get('ids', '').split(',') if pk]
+        except ValueError:
+            return Response({'error': 'ids must be a comma-separated list of integers'}, status=400)
+        if not category_ids:
+            return Response({'error': 'ids is required'}, status=400)
+        if len(category_ids) > settings.API_MAX_PAGE_SIZE:
+            return Response({'error': f'At most {settings.API_MAX_PAGE_SIZE} ids per request'}, status=400)
+        stats = CategoryPriceStats.objects.select_related('category').filter(category_id__in=category_ids)
+        return Response(CategoryPriceStatsSerializer(stats, many=True).data)
+
+class ProductViewSet(ReadReplicaMixin, ConditionalCatalogMixin, CatalogCacheMixin, BatchWriteMixin, viewsets.ModelViewSet):
     queryset = Product.objects.all()
     serializer_class = ProductSerializer
+    batch_serializer_class = ProductBatchSerializer
     permission_classes = [IsAuthenticated]
 
-    def create(self, request, *args, **kwargs):
+    @action(detail=False, methods=['get'])
+    def search(self, request):
+        """Typeahead: products whose name starts with ``q``, optionally within
+        ``category`` and its subcategories."""
         try:
-            return super().create(request, *args, **kwargs)
-        except Exception as e:
-            return Response({'error': str(e)}, status=400)
+            limit = typeahead_limit(request)
+        except ValueError:
+            return Response({'error': 'limit must be a positive integer'}, status=400)
+        prefix = request.query_params.get('q', '').strip()
+        category_id = request.query_params.get('category')
+        if category_id and not category_id.isdigit():
+            return Response({'error': 'category must be an id'}, status=400)
+
+        def build():
+            products = prefix_search(Product.objects.only('id', 'name', 'price', 'category_id'), 'name', prefix)
+            if category_id:
+                category = Category.objects.filter(pk=category_id).first()
+                if category is None:
+                    return []
+                products = products.filter(
+                    category__tree_id=category.tree_id,
+                    category__lft__gte=category.lft,
+                    category__rght__lte=category.rght,
+                )
+            return [
+                {'id': product.id, 'name': product.name, 'price': str(product.price), 'category': product.category_id}
+                for product in products[:limit]
+            ]
+
+        return Response(cached_catalog(('product', 'category'), f'search:{prefix.lower()}:{category_id}:{limit}', build))
 
-class OrderViewSet(viewsets.ModelViewSet):
-    queryset = Order.objects.all()
+    def prepare_batch_serializer(self, serializer, rows):
+        serializer.fields['category'].prefetch(row.get('category') for row in rows if isinstance(row, dict))
+
+    def after_batch_write(self, created, updated):
+        # bulk writes skip the signals that keep CategoryPriceStats current
+        categories = {product.category_id for product in created}
+        for before, after in updated:
+            if (before.category_id, before.price) != (after.category_id, after.price):
+                categories.update((before.category_id, after.category_id))
+        if categories:
+            refresh_category_lineage_stats(categories)
+
+class OrderViewSet(ReadReplicaMixin, viewsets.ModelViewSet):
+    queryset = Order.objects.select_related('customer').prefetch_related(
+        Prefetch('order_items', queryset=OrderItem.objects.select_related('product'))
+    )
     serializer_class = OrderSerializer
     permission_classes = [IsAuthenticated]
+    pagination_class = OrderCursorPagination
 
     def create(self, request, *args, **kwargs):
         try:
@@ -228,18 +524,249 @@ class OrderViewSet(viewsets.ModelViewSet):
         except Exception as e:
             return Response({'error': str(e)}, status=400)
 
-    def perform_create(self, serializer):
-        order = serializer.save()
-        total_amount = sum(item.quantity * item.price for item in order.order_items.all())
-        order.total_amount = total_amount
-        order.save()
+    @action(detail=False, methods=['get'], url_path='export')
+    def export(self, request):
+        """Stream orders with their items as CSV or NDJSON.
+
+        Query params: ``output`` (csv|ndjson), ``start``/``end`` (ISO date or
+        datetime, end exclusive) and ``customer`` (id).
+        """
+        output = request.query_params.get('output', 'csv')
+        if output not in EXPORT_FORMATS:
+            return Response({'error': f"output must be one of: {', '.join(EXPORT_FORMATS)}"}, status=400)
+        orders = Order.objects.all()
+        for param, lookup in (('start', 'time__gte'), ('end', 'time__lt')):
+            value = request.query_params.get(param)
+            if not value:
+                continue
+            try:
+                moment = parse_datetime(value)
+                if moment is None:
+                    day = parse_date(value)
+                    moment = datetime.combine(day, time.min) if day else None
+            except ValueError:
+                # Well formed but not a real date, e.g. 2024-02-30
+                moment = None
+            if moment is None:
+                return Response({'error': f"{param} must be an ISO date or datetime"}, status=400)
+            if timezone.is_naive(moment):
+                moment = timezone.make_aware(moment)
+            orders = orders.filter(**{lookup: moment})
+        customer_id = request.query_params.get('customer')
+        if customer_id:
+            if not customer_id.isdigit():
+                return Response({'error': 'customer must be an id'}, status=400)
+            orders = orders.filter(customer_id=customer_id)
+
+        stream, content_type, extension = EXPORT_FORMATS[output]
+        response = StreamingHttpResponse(stream(orders), content_type=content_type)
+        response['Content-Disposition'] = f'attachment; filename="orders.{extension}"'
+        return response
+
+    @action(detail=False, methods=['post'], url_path='import', url_name='import')
+    def bulk_import(self, request):
+        """Bulk import orders from NDJSON, CSV or a JSON list.
+
+        The body format follows the Content-Type (``application/x-ndjson``,
+        ``text/csv`` or ``application/json``); ``?notify=false`` skips the
+        customer/admin notifications. Invalid orders are reported by line and
+        do not stop the rest of the import.
+        """
+        notify = request.query_params.get('notify', 'true').lower() not in ('false', '0', 'no')
+        content_type = request.content_type.split(';')[0].strip()
+        if content_type in ('text/csv', 'application/x-ndjson'):
+            parse = IMPORT_FORMATS['csv' if content_type == 'text/csv' else 'ndjson']
+            stream = request.stream
+            records = parse(codecs.getreader('utf-8')(stream)) if stream is not None else []
+        else:
+            data = request.data
+            if not isinstance(data, list):
+                return Response({'error': 'Expected a list of orders'}, status=400)
+            records = parse_json(data)
+        try:
+            result = import_orders(records, notify=notify)
+        except (UnicodeDecodeError, csv.Error) as e:
+            return Response({'error': f'Could not read the upload: {e}'}, status=400)
+        return Response(result, status=201 if result['created'] else 400)
 
     @action(detail=False, methods=['get'], url_path='category-average-price/(?P<category_id>\d+)')
     def category_average_price(self, request, category_id=None):
         try:
-            category = Category.objects.get(id=category_id)
-            descendants = category.get_descendants(include_self=True)
-            avg_price = Product.objects.filter(category__in=descendants).aggregate(Avg('price'))['price__avg']
-            return Response({'category': category.name, 'average_price': avg_price or 0})
-        except Category.DoesNotExist:
-            return Response({'error': 'Category not found'}, status=404)
\ No newline at end of file
+            stats = CategoryPriceStats.objects.select_related('category').get(category_id=category_id)
+        except CategoryPriceStats.DoesNotExist:
+            if not Category.objects.filter(id=category_id).exists():
+                return Response({'error': 'Category not found'}, status=404)
+            refresh_category_stats([category_id])
+            stats = CategoryPriceStats.objects.select_related('category').get(category_id=category_id)
+        return Response({
+            'category': stats.category.name,
+            'average_price': stats.average_price or 0,
+            'product_count': stats.product_count,
+            'min_price': stats.min_price,
+            'max_price': stats.max_price,
+        })
+
+@method_decorator(csrf_exempt, name='dispatch')
+class OrderCreateAsyncView(View):
+    """``POST /api/orders/async/``: create an order and notify right away.
+
+    The order is written by ``OrderViewSet.create`` (same authentication,
+    validation and response), then the SMS and admin email go out
+    concurrently through ``notify_order_now`` before the response is sent.
+    The provider calls block, so they run on a pool of
+    ``NOTIFICATION_MAX_THREADS`` threads per process; further calls queue
+    for a thread, and the queueing counts against their timeout. CSRF is
+    left to DRF's session authentication, as for the other API views.
+    """
+
+    create_order = staticmethod(OrderViewSet.as_view({'post': 'create'}))
+
+    async def post(self, request):
+        response = await sync_to_async(self.create_order)(request)
+        if response.status_code == 201:
+            await notify_order_now(response.data['id'])
+        return response
+
+class ReportViewSet(ReadReplicaMixin, viewsets.ViewSet):
+    """Sales reports answered from the DailySales rollup.
+
+    Both endpoints accept ``start``/``end`` (inclusive dates), ``customer``
+    (id) and ``category`` (id, including its subcategories). ``order_count``
+    counts an order once for every category it has items in.
+    """
+    permission_classes = [IsAuthenticated]
+    periods = {'day': TruncDay, 'week': TruncWeek, 'month': TruncMonth}
+
+    def filter_sales(self, params):
+        """Return ``(queryset, error)`` for the common filters."""
+        sales = DailySales.objects.all()
+        for param, lookup in (('start', 'day__gte'), ('end', 'day__lte')):
+            value = params.get(param)
+            if not value:
+                continue
+            try:
+                day = parse_date(value)
+            except ValueError:
+                day = None
+            if day is None:
+                return None, f"{param} must be a date (YYYY-MM-DD)"
+            sales = sales.filter(**{lookup: day})
+        customer_id = params.get('customer')
+        if customer_id:
+            if not customer_id.isdigit():
+                return None, 'customer must be an id'
+            sales = sales.filter(customer_id=customer_id)
+        category_id = params.get('category')
+        if category_id:
+            category = Category.objects.filter(pk=category_id).first() if category_id.isdigit() else None
+            if category is None:
+                return None, 'category not found'
+            sales = sales.filter(
+                category__tree_id=category.tree_id,
+                category__lft__gte=category.lft,
+                category__rght__lte=category.rght,
+            )
+        return sales, None
+
+    @staticmethod
+    def totals():
+        return {'order_count': Sum('order_count'), 'quantity': Sum('quantity'), 'revenue': Sum('revenue')}
+
+    def list(self, request):
+        """Time series of sales per ``period`` (day, week or month)."""
+        period = request.query_params.get('period', 'day')
+        if period not in self.periods:
+            return Response({'error': f"period must be one of: {', '.join(self.periods)}"}, status=400)
+        sales, error = self.filter_sales(request.query_params)
+        if error:
+            return Response({'error': error}, status=400)
+        series = sales.annotate(
+            period=self.periods[period]('day')
+        ).values('period').annotate(**self.totals()).order_by('period')
+        return Response(list(series))
+
+    @action(detail=False, methods=['get'])
+    def top(self, request):
+        """Top ``limit`` customers or categories by revenue (``by=customer|category``).
+
+        With ``by=category&level=N`` leaf categories are rolled up into their
+        ancestor at tree depth ``N`` (0 is the root).
+        """
+        by = request.query_params.get('by', 'customer')
+        if by not in ('customer', 'category'):
+            return Response({'error': 'by must be customer or category'}, status=400)
+        try:
+            limit = min(int(request.query_params.get('limit', 10)), settings.API_MAX_PAGE_SIZE)
+            level = request.query_params.get('level')
+            level = int(level) if level not in (None, '') else None
+        except ValueError:
+            return Response({'error': 'limit and level must be integers'}, status=400)
+        if limit < 1 or (level is not None and level < 0):
+            return Response({'error': 'limit must be at least 1 and level at least 0'}, status=400)
+        sales, error = self.filter_sales(request.query_params)
+        if error:
+            return Response({'error': error}, status=400)
+
+        if by == 'customer':
+            rows = sales.values('customer_id', 'customer__code', 'customer__name').annotate(
+                **self.totals()
+            ).order_by('-revenue')[:limit]
+            return Response([
+                {'customer': row['customer_id'], 'code': row['customer__code'], 'name': row['customer__name'],
+                 'order_count': row['order_count'], 'quantity': row['quantity'], 'revenue': row['revenue']}
+                for row in rows
+            ])
+
+        rows = sales.values('category_id').annotate(**self.totals())
+        if level is None:
+            rows = list(rows.order_by('-revenue')[:limit])
+        else:
+            rows = self.roll_up_categories(rows, level)[:limit]
+        names = dict(Category.objects.filter(id__in=[row['category_id'] for row in rows]).values_list('id', 'name'))
+        return Response([
+            {'category': row['category_id'], 'name': names.get(row['category_id']),
+             'order_count': row['order_count'], 'quantity': row['quantity'], 'revenue': row['revenue']}
+            for row in rows
+        ])
+
+    @staticmethod
+    def roll_up_categories(rows, level):
+        """Sum per-category totals into each category's ancestor at ``level``.
+
+        Only the rows' categories and the ancestors at ``level`` spanning
+        them (one lft/rght-bounded query per request) are read; a category's
+        ancestor is found by bisecting its tree's ancestors on ``lft``.
+        """
+        rows = list(rows)
+        categories = {
+            category['id']: category
+            for category in Category.objects.filter(id__in=[row['category_id'] for row in rows])
+            .values('id', 'tree_id', 'lft', 'rght', 'level')
+        }
+        spans = {}
+        for category in categories.values():
+            if category['level'] > level:
+                low, high = spans.get(category['tree_id'], (category['lft'], category['rght']))
+                spans[category['tree_id']] = (min(low, category['lft']), max(high, category['rght']))
+        ancestors = {}
+        if spans:
+            bounds = Q()
+            for tree_id, (low, high) in spans.items():
+                bounds |= Q(tree_id=tree_id, lft__lte=high, rght__gte=low)
+            for ancestor in Category.objects.filter(bounds, level=level).values('id', 'tree_id', 'lft').order_by('lft'):
+                ancestors.setdefault(ancestor['tree_id'], []).append(ancestor)
+        lefts = {tree_id: [ancestor['lft'] for ancestor in tree] for tree_id, tree in ancestors.items()}
+
+        totals = {}
+        for row in rows:
+            category = categories[row['category_id']]
+            target = category['id']
+            if category['level'] > level:
+                # Ancestors at one level are disjoint, so the last one starting
+                # at or before the category contains it.
+                tree_id = category['tree_id']
+                target = ancestors[tree_id][bisect_right(lefts[tree_id], category['lft']) - 1]['id']
+            total = totals.setdefault(target, {'category_id': target, 'order_count': 0, 'quantity': 0, 'revenue': 0})
+            for field in ('order_count', 'quantity', 'revenue'):
+                total[field] += row[field]
+        return sorted(totals.values(), key=lambda total: total['revenue'], reverse=True)
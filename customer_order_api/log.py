@@ -0,0 +1,110 @@
+"""Non-blocking log output.
+
+``queued_handler`` is a ``logging.config`` handler factory. Request threads
+only put records on an in-memory queue; a ``BatchingQueueListener`` thread
+formats them and writes them to the console and, optionally, a file,
+flushing once per batch instead of once per record.
+
+The file is only ever appended to, so several processes (gunicorn workers,
+the runserver reloader) can share it. It is not rotated here: rotate it
+externally (e.g. logrotate) and the handler reopens it once it has moved.
+"""
+from logging.handlers import QueueHandler, QueueListener, WatchedFileHandler
+import atexit
+import logging
+import os
+import queue
+import weakref
+
+class BatchedWatchedFileHandler(WatchedFileHandler):
+    """Appending file handler that leaves flushing to its caller and checks
+    for external rotation once per batch rather than once per record."""
+
+    def __init__(self, filename, **kwargs):
+        super().__init__(filename, **kwargs)
+        self._rotation_checked = False
+
+    def emit(self, record):
+        try:
+            if not self._rotation_checked:
+                self.reopenIfNeeded()
+                self._rotation_checked = True
+            if self.stream is None:
+                self.stream = self._open()
+                self._statstream()
+            self.stream.write(self.format(record) + self.terminator)
+        except RecursionError:
+            raise
+        except Exception:
+            self.handleError(record)
+
+    def flush(self):
+        super().flush()
+        self._rotation_checked = False
+
+class BatchingQueueListener(QueueListener):
+    """Drains up to ``batch_size`` queued records at a time, then flushes."""
+
+    def __init__(self, log_queue, *handlers, batch_size=256, respect_handler_level=True):
+        super().__init__(log_queue, *handlers, respect_handler_level=respect_handler_level)
+        self.batch_size = batch_size
+
+    def stop(self):
+        # Also registered with atexit, so it may run after an explicit stop.
+        if self._thread is not None:
+            super().stop()
+
+    def _monitor(self):
+        while True:
+            stop = False
+            batch = [self.dequeue(True)]
+            while len(batch) < self.batch_size:
+                try:
+                    batch.append(self.dequeue(False))
+                except queue.Empty:
+                    break
+            for record in batch:
+                if record is self._sentinel:
+                    stop = True
+                    continue
+                self.handle(record)
+            for handler in self.handlers:
+                handler.flush()
+            if stop:
+                return
+
+def restart_after_fork(handler):
+    """Give a forked child (e.g. a gunicorn worker under ``--preload``) a
+    listener thread of its own; threads do not survive ``fork``. The queue
+    is replaced too, as the parent may have held its lock while forking."""
+    listener = handler.listener
+    if listener._thread is None:
+        return
+    handler.queue = listener.queue = queue.SimpleQueue()
+    listener._thread = None
+    listener.start()
+
+def queued_handler(filename=None, batch_size=256, file_format='%(asctime)s %(levelname)s %(name)s %(message)s',
+                   console=True, console_level='INFO'):
+    """Return a ``QueueHandler`` feeding the console (stderr) and, when
+    ``filename`` is given, an appended file from a background listener
+    thread."""
+    handlers = []
+    if filename:
+        file_handler = BatchedWatchedFileHandler(filename, delay=True)
+        file_handler.setFormatter(logging.Formatter(file_format))
+        handlers.append(file_handler)
+    if console:
+        console_handler = logging.StreamHandler()
+        console_handler.setLevel(console_level)
+        handlers.append(console_handler)
+
+    log_queue = queue.SimpleQueue()
+    listener = BatchingQueueListener(log_queue, *handlers, batch_size=batch_size)
+    listener.start()
+    atexit.register(listener.stop)
+    handler = QueueHandler(log_queue)
+    handler.listener = listener
+    handler_ref = weakref.ref(handler)
+    os.register_at_fork(after_in_child=lambda: handler_ref() and restart_after_fork(handler_ref()))
+    return handler
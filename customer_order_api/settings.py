@@ -1,5 +1,7 @@
 from pathlib import Path
 from decouple import config
+import sys
+from .database import sqlite_databases
 
 BASE_DIR = Path(__file__).resolve().parent.parent
 
@@ -21,6 +23,7 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'core.instrumentation.PerformanceMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -50,13 +53,23 @@ TEMPLATES = [
 ]
 
 WSGI_APPLICATION = 'customer_order_api.wsgi.application'
+ASGI_APPLICATION = 'customer_order_api.asgi.application'
 
-DATABASES = {
-    'default': {
-        'ENGINE': 'django.db.backends.sqlite3',
-        'NAME': BASE_DIR / 'db.sqlite3',
+SQLITE_PATH = config('SQLITE_PATH', default=str(BASE_DIR / 'db.sqlite3'))
+if config('SQLITE_TUNING', default=True, cast=bool):
+    DATABASES = sqlite_databases(
+        SQLITE_PATH,
+        conn_max_age=config('CONN_MAX_AGE', default=600, cast=int),
+        read_replica=config('SQLITE_READ_REPLICA', default=True, cast=bool),
+    )
+else:
+    DATABASES = {
+        'default': {
+            'ENGINE': 'django.db.backends.sqlite3',
+            'NAME': SQLITE_PATH,
+        }
     }
-}
+DATABASE_ROUTERS = ['customer_order_api.database.ReadReplicaRouter']
 
 AUTH_PASSWORD_VALIDATORS = [
     {'NAME': 'django.contrib.auth.password_validation.UserAttributeSimilarityValidator'},
@@ -76,41 +89,62 @@ STATIC_ROOT = BASE_DIR / 'staticfiles'
 
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    },
+    'oidc': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'oidc',
+        'OPTIONS': {'MAX_ENTRIES': config('OIDC_TOKEN_CACHE_MAX_ENTRIES', default=10000, cast=int)},
+    },
+    # Customer/category/product reads (core.catalog_cache). Use a shared backend
+    # such as django.core.cache.backends.filebased.FileBasedCache or
+    # django.core.cache.backends.redis.RedisCache when running several workers,
+    # so every worker sees the generation bumps.
+    'catalog': {
+        'BACKEND': config('CATALOG_CACHE_BACKEND', default='django.core.cache.backends.locmem.LocMemCache'),
+        'LOCATION': config('CATALOG_CACHE_LOCATION', default='catalog'),
+        'OPTIONS': {'MAX_ENTRIES': config('CATALOG_CACHE_MAX_ENTRIES', default=5000, cast=int)},
+    },
+}
+
+CATALOG_CACHE_ALIAS = 'catalog'
+# Seconds a catalog entry lives; changes invalidate it sooner via the generation key
+CATALOG_CACHE_TIMEOUT = config('CATALOG_CACHE_TIMEOUT', default=300, cast=int)
+
+# Logging goes through a queue: request threads only enqueue records and a
+# background thread writes them in batches (customer_order_api.log).
+# LOG_PROFILE picks per-logger levels; 'prod' keeps only warnings from Django
+# and the OIDC client.
+RUNNING_TESTS = sys.argv[1:2] == ['test']
+LOG_PROFILE = config('LOG_PROFILE', default='dev' if DEBUG else 'prod')
+LOG_LEVELS = {
+    'dev': {'': 'INFO', 'django': 'INFO', 'django.db.backends': 'INFO', 'mozilla_django_oidc': 'DEBUG', 'core': 'DEBUG'},
+    'prod': {'': 'WARNING', 'django': 'WARNING', 'django.db.backends': 'WARNING', 'mozilla_django_oidc': 'WARNING', 'core': 'INFO'},
+}[LOG_PROFILE]
+# SQL statements are only logged when asked for (and only with DEBUG on)
+if config('LOG_SQL', default=False, cast=bool):
+    LOG_LEVELS['django.db.backends'] = 'DEBUG'
+
 LOGGING = {
     'version': 1,
     'disable_existing_loggers': False,
     'handlers': {
-        'file': {
-            'level': 'DEBUG',
-            'class': 'logging.FileHandler',
-            'filename': BASE_DIR / 'debug.log',
-        },
-        'console': {
-            'level': 'INFO',
-            'class': 'logging.StreamHandler',
+        'queue': {
+            '()': 'customer_order_api.log.queued_handler',
+            # Outside DEBUG (and under manage.py test) logs go to stderr only,
+            # for the process manager to collect. A LOG_FILE is appended to by
+            # every process and must be rotated externally (logrotate); it is
+            # reopened once moved.
+            'filename': config('LOG_FILE', default=str(BASE_DIR / 'debug.log') if DEBUG and not RUNNING_TESTS else ''),
+            'console': config('LOG_CONSOLE', default=True, cast=bool),
         },
     },
+    'root': {'handlers': ['queue'], 'level': LOG_LEVELS['']},
     'loggers': {
-        'mozilla_django_oidc': {
-            'handlers': ['file', 'console'],
-            'level': 'DEBUG',
-            'propagate': True,
-        },
-        'django': {
-            'handlers': ['file', 'console'],
-            'level': 'DEBUG',
-            'propagate': True,
-        },
-        'core': {
-            'handlers': ['file', 'console'],
-            'level': 'DEBUG',
-            'propagate': True,
-        },
-        '': {
-            'handlers': ['file', 'console'],
-            'level': 'INFO',
-            'propagate': True,
-        },
+        name: {'level': level, 'propagate': True}
+        for name, level in LOG_LEVELS.items() if name
     },
 }
 
@@ -124,8 +158,9 @@ OIDC_RP_CLIENT_ID = config('OIDC_RP_CLIENT_ID', default='vYAuFF9NqJUcVFkt0xFmyRx
 OIDC_RP_CLIENT_SECRET = config('OIDC_RP_CLIENT_SECRET', default='R7buwtiSOi5KALVNY4AXszTbMYJmSY8qrXp5FXY0QByW03oZ6GKrg5q_GHr22ceI')
 OIDC_OP_AUTHORIZATION_ENDPOINT = 'https://customerorder.us.auth0.com/authorize'
 OIDC_OP_TOKEN_ENDPOINT = 'https://customerorder.us.auth0.com/oauth/token'
-OIDC_OP_USER_ENDPOINT = 'https://customerorder.us.auth0.com/userinfo'
-OIDC_OP_JWKS_ENDPOINT = 'https://customerorder.us.auth0.com/.well-known/jwks.json'
+# Overridable so benchmarks can point them at core.utils.fake_oidc.FakeOIDCProvider
+OIDC_OP_USER_ENDPOINT = config('OIDC_OP_USER_ENDPOINT', default='https://customerorder.us.auth0.com/userinfo')
+OIDC_OP_JWKS_ENDPOINT = config('OIDC_OP_JWKS_ENDPOINT', default='https://customerorder.us.auth0.com/.well-known/jwks.json')
 OIDC_OP_LOGOUT_URL = 'https://customerorder.us.auth0.com/v2/logout'
 OIDC_RP_SIGN_ALGO = 'RS256'
 OIDC_RP_SCOPES = 'openid profile email'
@@ -134,6 +169,18 @@ LOGOUT_REDIRECT_URL = 'http://localhost:8000'
 OIDC_EXEMPT_URLS = ['/api/']
 OIDC_AUTHENTICATE_CLASS = 'mozilla_django_oidc.views.OIDCAuthenticationRequestView'
 OIDC_CALLBACK_CLASS = 'mozilla_django_oidc.views.OIDCAuthenticationCallbackView'
+OIDC_TIMEOUT = config('OIDC_TIMEOUT', default=10, cast=float)
+
+# API bearer-token verification (core.authentication.CachedOIDCBackend)
+OIDC_DRF_AUTH_BACKEND = 'core.authentication.CachedOIDCBackend'
+OIDC_CACHE_ALIAS = 'oidc'
+OIDC_TOKEN_CACHE_TTL = config('OIDC_TOKEN_CACHE_TTL', default=300, cast=int)
+OIDC_JWKS_CACHE_TTL = config('OIDC_JWKS_CACHE_TTL', default=3600, cast=int)
+# Verify JWT access tokens against the cached JWKS instead of calling userinfo
+OIDC_LOCAL_JWT_VALIDATION = config('OIDC_LOCAL_JWT_VALIDATION', default=False, cast=bool)
+OIDC_OP_ISSUER = config('OIDC_OP_ISSUER', default='https://customerorder.us.auth0.com/')
+# Required with local validation (core.checks): the API identifier access tokens are issued for
+OIDC_API_AUDIENCE = config('OIDC_API_AUDIENCE', default='')
 
 # Authentication settings
 LOGIN_URL = '/oidc/authenticate/'
@@ -143,12 +190,15 @@ USE_AUTH0_LOGOUT = False  # Disable Auth0 logout until configuration is fixed
 
 
 # Session settings
-SESSION_ENGINE = 'django.contrib.sessions.backends.db'
+# Signed-cookie sessions need no server-side storage; the core.session_backends
+# engines only write a session (or re-send its cookie) when its data changed.
+# Use core.session_backends.cache with a shared cache to keep data server-side.
+SESSION_ENGINE = config('SESSION_ENGINE', default='core.session_backends.signed_cookies')
 SESSION_COOKIE_AGE = 1209600  # 2 weeks
-SESSION_COOKIE_SECURE = not DEBUG  # False in DEBUG mode
+SESSION_COOKIE_SECURE = config('SESSION_COOKIE_SECURE', default=not DEBUG, cast=bool)  # False in DEBUG mode
 SESSION_COOKIE_HTTPONLY = True
 SESSION_COOKIE_SAMESITE = 'Lax'
-SESSION_SAVE_EVERY_REQUEST = True
+SESSION_SAVE_EVERY_REQUEST = config('SESSION_SAVE_EVERY_REQUEST', default=False, cast=bool)
 
 REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': [
@@ -158,12 +208,41 @@ REST_FRAMEWORK = {
     'DEFAULT_PERMISSION_CLASSES': [
         'rest_framework.permissions.IsAuthenticated',
     ],
+    'DEFAULT_PAGINATION_CLASS': 'core.pagination.IdCursorPagination',
+    'PAGE_SIZE': config('API_PAGE_SIZE', default=50, cast=int),
 }
+API_MAX_PAGE_SIZE = config('API_MAX_PAGE_SIZE', default=500, cast=int)
+
+# Orders fetched per query by the streaming export
+EXPORT_BATCH_SIZE = config('EXPORT_BATCH_SIZE', default=1000, cast=int)
+
+# Default and maximum number of results from the typeahead search endpoints
+TYPEAHEAD_LIMIT = config('TYPEAHEAD_LIMIT', default=20, cast=int)
+TYPEAHEAD_MAX_LIMIT = config('TYPEAHEAD_MAX_LIMIT', default=50, cast=int)
 
-EMAIL_BACKEND = 'django.core.mail.backends.smtp.EmailBackend'
-EMAIL_HOST = 'smtp.gmail.com'
-EMAIL_PORT = 587
-EMAIL_USE_TLS = True
+# Rows accepted per batch create/upsert request on customers and products
+API_BATCH_MAX_ROWS = config('API_BATCH_MAX_ROWS', default=1000, cast=int)
+
+# Orders validated and written per transaction by the bulk import
+IMPORT_CHUNK_SIZE = config('IMPORT_CHUNK_SIZE', default=1000, cast=int)
+
+# Request timing/query accounting (core.instrumentation). The Server-Timing
+# header it adds goes to everyone with SERVER_TIMING on, otherwise to staff
+# only. /metrics needs this bearer token and is off without one unless DEBUG.
+PERFORMANCE_INSTRUMENTATION = config('PERFORMANCE_INSTRUMENTATION', default=True, cast=bool)
+SERVER_TIMING = config('SERVER_TIMING', default=DEBUG, cast=bool)
+METRICS_TOKEN = config('METRICS_TOKEN', default='')
+
+# Rows per page on the HTML list views
+LIST_PAGE_SIZE = config('LIST_PAGE_SIZE', default=50, cast=int)
+
+# Sends go through the timing wrapper to EMAIL_DELIVERY_BACKEND
+EMAIL_BACKEND = 'core.instrumentation.TimedEmailBackend'
+EMAIL_DELIVERY_BACKEND = config('EMAIL_DELIVERY_BACKEND', default='django.core.mail.backends.smtp.EmailBackend')
+# Overridable so benchmarks can point them at core.utils.fake_smtp.FakeSMTPServer
+EMAIL_HOST = config('EMAIL_HOST', default='smtp.gmail.com')
+EMAIL_PORT = config('EMAIL_PORT', default=587, cast=int)
+EMAIL_USE_TLS = config('EMAIL_USE_TLS', default=True, cast=bool)
 EMAIL_HOST_USER = config('EMAIL_HOST_USER', default='wenbusale383@gmail.com')
 EMAIL_HOST_PASSWORD = config('EMAIL_HOST_PASSWORD', default='zgku hxbz qyyq wuxd')
 DEFAULT_FROM_EMAIL = config('DEFAULT_FROM_EMAIL', default='wenbusale383@gmail.com')
@@ -171,5 +250,28 @@ ADMIN_EMAIL = config('ADMIN_EMAIL', default='wenbusale383@gmail.com')
 
 AFRICASTALKING_USERNAME = config('AFRICASTALKING_USERNAME', default='sandbox')
 AFRICASTALKING_API_KEY = config('AFRICASTALKING_API_KEY', default='atsk_d79fb34dbb23b82fe6c4f326dbf70891423f4f5f9aec67d0645b2767f3e51a82290ecd6a')
+# Overrides the SDK's SMS base URL, e.g. https://api.sandbox.africastalking.com/version1
+# or a local core.utils.fake_sms.FakeSMSServer for tests and benchmarks
+AFRICASTALKING_API_URL = config('AFRICASTALKING_API_URL', default='')
+SMS_CONNECT_TIMEOUT = config('SMS_CONNECT_TIMEOUT', default=3.05, cast=float)
+SMS_READ_TIMEOUT = config('SMS_READ_TIMEOUT', default=10, cast=float)
+SMS_POOL_SIZE = config('SMS_POOL_SIZE', default=10, cast=int)
+
+TESTING = False
 
-TESTING = False
\ No newline at end of file
+# Notification outbox worker (manage.py process_notifications)
+NOTIFICATION_BATCH_SIZE = config('NOTIFICATION_BATCH_SIZE', default=50, cast=int)
+NOTIFICATION_MAX_ATTEMPTS = config('NOTIFICATION_MAX_ATTEMPTS', default=5, cast=int)
+NOTIFICATION_BACKOFF_SECONDS = config('NOTIFICATION_BACKOFF_SECONDS', default=30, cast=int)
+NOTIFICATION_MAX_BACKOFF_SECONDS = config('NOTIFICATION_MAX_BACKOFF_SECONDS', default=3600, cast=int)
+NOTIFICATION_LEASE_SECONDS = config('NOTIFICATION_LEASE_SECONDS', default=300, cast=int)
+NOTIFICATION_POLL_INTERVAL = config('NOTIFICATION_POLL_INTERVAL', default=5, cast=float)
+# Roll admin order emails into one digest per N orders or T seconds
+NOTIFICATION_EMAIL_DIGEST = config('NOTIFICATION_EMAIL_DIGEST', default=False, cast=bool)
+NOTIFICATION_DIGEST_MAX_ORDERS = config('NOTIFICATION_DIGEST_MAX_ORDERS', default=20, cast=int)
+NOTIFICATION_DIGEST_MAX_SECONDS = config('NOTIFICATION_DIGEST_MAX_SECONDS', default=300, cast=int)
+# Per-call deadlines for the immediate sends of the async order endpoint
+NOTIFICATION_SMS_TIMEOUT = config('NOTIFICATION_SMS_TIMEOUT', default=5, cast=float)
+NOTIFICATION_EMAIL_TIMEOUT = config('NOTIFICATION_EMAIL_TIMEOUT', default=10, cast=float)
+# Threads per process for those calls; ones that time out keep theirs until the client gives up
+NOTIFICATION_MAX_THREADS = config('NOTIFICATION_MAX_THREADS', default=8, cast=int)
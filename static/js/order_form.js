@@ -0,0 +1,110 @@
+// Typeahead pickers for the order form: customers and products are fetched
+// from the search endpoints as the user types instead of being rendered
+// into the page.
+document.addEventListener('DOMContentLoaded', function () {
+    function typeahead(input, results, label, onSelect) {
+        var timer = null;
+        var latest = 0;
+
+        function clear() {
+            results.replaceChildren();
+        }
+
+        function search() {
+            var url = new URL(input.dataset.searchUrl, window.location.origin);
+            url.searchParams.set('q', input.value.trim());
+            var request = ++latest;
+            fetch(url, {credentials: 'same-origin', headers: {'Accept': 'application/json'}})
+                .then(function (response) { return response.ok ? response.json() : []; })
+                .then(function (items) {
+                    if (request !== latest) {
+                        return;  // a newer search has been sent
+                    }
+                    clear();
+                    items.forEach(function (item) {
+                        var option = document.createElement('button');
+                        option.type = 'button';
+                        option.className = 'list-group-item list-group-item-action';
+                        option.textContent = label(item);
+                        option.addEventListener('click', function () {
+                            clear();
+                            onSelect(item);
+                        });
+                        results.appendChild(option);
+                    });
+                })
+                .catch(clear);
+        }
+
+        input.addEventListener('input', function () {
+            clearTimeout(timer);
+            timer = setTimeout(search, 200);
+        });
+        input.addEventListener('focus', search);
+        document.addEventListener('click', function (event) {
+            if (event.target !== input && !results.contains(event.target)) {
+                clear();
+            }
+        });
+    }
+
+    var customerInput = document.getElementById('customer_search');
+    var customerField = document.getElementById('customer');
+    customerInput.addEventListener('input', function () {
+        customerField.value = '';
+    });
+    function customerLabel(customer) {
+        return customer.name + ' (' + customer.code + ')';
+    }
+    typeahead(customerInput, document.getElementById('customer_results'), customerLabel, function (customer) {
+        customerField.value = customer.id;
+        customerInput.value = customerLabel(customer);
+    });
+
+    var selected = document.getElementById('selected_products');
+    var productInput = document.getElementById('product_search');
+    function productLabel(product) {
+        return product.name + ' (' + product.price + ')';
+    }
+    typeahead(productInput, document.getElementById('product_results'), productLabel, function (product) {
+        productInput.value = '';
+        if (document.getElementById('product_' + product.id)) {
+            return;
+        }
+        var row = document.createElement('div');
+        row.className = 'form-check d-flex align-items-center gap-2 mb-2';
+
+        var checkbox = document.createElement('input');
+        checkbox.type = 'checkbox';
+        checkbox.name = 'products';
+        checkbox.value = product.id;
+        checkbox.id = 'product_' + product.id;
+        checkbox.className = 'form-check-input';
+        checkbox.checked = true;
+
+        var label = document.createElement('label');
+        label.htmlFor = checkbox.id;
+        label.className = 'form-check-label flex-grow-1';
+        label.textContent = productLabel(product);
+
+        var quantity = document.createElement('input');
+        quantity.type = 'number';
+        quantity.name = 'quantity_' + product.id;
+        quantity.min = '1';
+        quantity.value = '1';
+        quantity.className = 'form-control w-25';
+        quantity.placeholder = 'Quantity';
+
+        row.append(checkbox, label, quantity);
+        selected.appendChild(row);
+    });
+
+    document.getElementById('order-form').addEventListener('submit', function (event) {
+        if (!customerField.value) {
+            event.preventDefault();
+            customerInput.setCustomValidity('Pick a customer from the list.');
+            customerInput.reportValidity();
+            customerInput.setCustomValidity('');
+        }
+    });
+});